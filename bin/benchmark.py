@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## Run a benchmark suite and save its result as JSON, or compare two results.
+#
+#    benchmark.py uph --slots 4 --units 8 -o current.json
+#    benchmark.py micro --count 10000 --sizes 64,65536 socket_data
+#    benchmark.py load --clients 8 --burst-size 500 --command-rate 50
+#    benchmark.py startup --repeat 10 server client
+#    benchmark.py compare baseline.json current.json --threshold 0.05
+#
+#  "compare" exits with status 1 when a metric regressed by more than the
+#  threshold.
+#
+
+from optparse import OptionParser
+from os import path
+import sys, json, logging
+
+bindir = path.dirname(path.abspath(__file__))
+topdir = path.dirname(bindir)
+libdir = path.join(topdir, "lib")
+extdir = path.join(topdir, "ext")
+
+sys.path.insert(0, libdir)
+sys.path.insert(0, extdir)
+
+from benchmark import results
+
+def get_parser(usage):
+    parser = OptionParser(usage=usage)
+    parser.add_option("-o", "--output", action="store", type="string",
+            dest="output", help="Write the result to OUTPUT as JSON.")
+    parser.add_option("-v", "--verbose", action="store_true", dest="verbose")
+    parser.set_defaults(output=None, verbose=False)
+    return parser
+
+def report(result, options):
+    logging.info("{0} on {1}".format(result["suite"], result["commit"]))
+    if options.output:
+        results.save(result, options.output)
+    else:
+        json.dump(result["metrics"], sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+def run_uph(args):
+    parser = get_parser("%prog uph [options]")
+    parser.add_option("-n", "--slots", action="store", type="int",
+            dest="slots", help="Number of simulated slots.")
+    parser.add_option("-u", "--units", action="store", type="int",
+            dest="units", help="Units tested by every slot.")
+    parser.add_option("-t", "--tests", action="store", type="int",
+            dest="tests", help="Tests in the specification.")
+    parser.add_option("-p", "--max-parallel", action="store", type="int",
+            dest="max_parallel", help="Tests of a unit run at once.")
+    parser.add_option("-s", "--scale", action="store", type="float",
+            dest="scale", help="Multiply every simulated latency by SCALE.")
+    parser.add_option("-j", "--jitter", action="store", type="float",
+            dest="jitter", help="Vary every latency by up to this fraction.")
+    parser.add_option("-r", "--rpc-latency", action="store", type="float",
+            dest="rpc_latency", help="Seconds taken by every remote call.")
+    parser.add_option("-w", "--work-dir", action="store", type="string",
+            dest="work_dir", help="Keep the metadata and server log here.")
+    parser.add_option("--command-workers", action="store", type="int",
+            dest="command_workers", help="Server command worker threads.")
+    parser.set_defaults(
+            slots=4,
+            units=4,
+            tests=8,
+            max_parallel=1,
+            scale=1.0,
+            jitter=0.0,
+            rpc_latency=0.0,
+            work_dir=None,
+            command_workers=32,
+            )
+    (options, args) = parser.parse_args(args)
+    setup_logging(options)
+
+    from benchmark.e2e import UnitsPerHourBenchmark
+    benchmark = UnitsPerHourBenchmark(
+            slots=options.slots,
+            units=options.units,
+            tests=options.tests,
+            max_parallel=options.max_parallel,
+            scale=options.scale,
+            jitter=options.jitter,
+            rpc_latency=options.rpc_latency,
+            work_dir=options.work_dir,
+            command_workers=options.command_workers,
+            )
+    report(benchmark.run(), options)
+    return 0
+
+def get_list(value, convert=str):
+    return [convert(item) for item in value.split(",") if item]
+
+def run_micro(args):
+    parser = get_parser("%prog micro [options] [BENCHMARK...]")
+    parser.add_option("-c", "--count", action="store", type="int",
+            dest="count", help="Operations per repetition.")
+    parser.add_option("-r", "--repeat", action="store", type="int",
+            dest="repeat", help="Repetitions; the median is reported.")
+    parser.add_option("-s", "--sizes", action="store", type="string",
+            dest="sizes", help="Comma separated message sizes in bytes.")
+    parser.add_option("-n", "--handlers", action="store", type="string",
+            dest="handlers", help="Comma separated numbers of event "
+            "handlers.")
+    parser.set_defaults(
+            count=10000,
+            repeat=5,
+            sizes="64,1024,65536",
+            handlers="1,8,64",
+            )
+    (options, args) = parser.parse_args(args)
+    setup_logging(options)
+
+    from benchmark import micro
+    report(micro.run(
+            count=options.count,
+            repeat=options.repeat,
+            sizes=get_list(options.sizes, int),
+            handlers=get_list(options.handlers, int),
+            names=args,
+            ), options)
+    return 0
+
+def run_load(args):
+    parser = get_parser("%prog load [options]")
+    parser.add_option("-n", "--clients", action="store", type="int",
+            dest="clients", help="Number of connected clients.")
+    parser.add_option("-b", "--bursts", action="store", type="int",
+            dest="bursts", help="Number of event bursts.")
+    parser.add_option("-e", "--burst-size", action="store", type="int",
+            dest="burst_size", help="Events fired in every burst.")
+    parser.add_option("-i", "--burst-interval", action="store",
+            type="float", dest="burst_interval",
+            help="Seconds from one burst to the next.")
+    parser.add_option("-p", "--payload", action="store", type="int",
+            dest="payload", help="Payload bytes of every event.")
+    parser.add_option("-c", "--command-rate", action="store", type="float",
+            dest="command_rate", help="Sync commands per second per client.")
+    parser.add_option("-l", "--late", action="store", type="float",
+            dest="late", help="Seconds after which an event is late.")
+    parser.set_defaults(
+            clients=4,
+            bursts=10,
+            burst_size=100,
+            burst_interval=0.5,
+            payload=64,
+            command_rate=20,
+            late=1.0,
+            )
+    (options, args) = parser.parse_args(args)
+    setup_logging(options)
+
+    from benchmark.load import LoadBenchmark
+    benchmark = LoadBenchmark(
+            clients=options.clients,
+            bursts=options.bursts,
+            burst_size=options.burst_size,
+            burst_interval=options.burst_interval,
+            payload=options.payload,
+            command_rate=options.command_rate,
+            late=options.late,
+            )
+    report(benchmark.run(), options)
+    return 0
+
+def run_startup(args):
+    parser = get_parser("%prog startup [options] [ENTRY_POINT...]")
+    parser.add_option("-r", "--repeat", action="store", type="int",
+            dest="repeat", help="Fresh interpreters per measurement; the "
+            "median is reported.")
+    parser.add_option("--no-server", action="store_false", dest="server",
+            help="Do not measure how long the server takes to answer.")
+    parser.set_defaults(
+            repeat=5,
+            server=True,
+            )
+    (options, args) = parser.parse_args(args)
+    setup_logging(options)
+
+    from benchmark.startup import StartupBenchmark, ENTRY_POINTS
+    for name in args:
+        if not ENTRY_POINTS.has_key(name):
+            parser.error("unknown entry point '{0}'".format(name))
+    benchmark = StartupBenchmark(
+            repeat=options.repeat,
+            entry_points=args,
+            server=options.server,
+            )
+    report(benchmark.run(), options)
+    return 0
+
+def run_compare(args):
+    parser = OptionParser(usage="%prog compare [options] BASELINE CURRENT")
+    parser.add_option("-t", "--threshold", action="store", type="float",
+            dest="threshold", help="Allowed regression, as a fraction.")
+    parser.set_defaults(threshold=0.05)
+    (options, args) = parser.parse_args(args)
+    if len(args) != 2:
+        parser.error("expected BASELINE and CURRENT result files")
+
+    baseline = results.load(args[0])
+    current = results.load(args[1])
+    if baseline["suite"] != current["suite"]:
+        sys.exit("ERROR: Cannot compare suite '{0}' with '{1}'.".format(
+            baseline["suite"], current["suite"]))
+    if baseline["config"] != current["config"]:
+        sys.stderr.write("WARNING: The results were run with different "
+                "configurations.\n")
+
+    comparison = results.compare(baseline, current, options.threshold)
+    print(results.format_comparison(comparison))
+    if any(entry[4] for entry in comparison):
+        return 1
+    return 0
+
+def setup_logging(options):
+    logging.basicConfig(
+            level = logging.INFO if options.verbose else logging.WARNING)
+
+COMMANDS = {
+        "uph": run_uph,
+        "micro": run_micro,
+        "load": run_load,
+        "startup": run_startup,
+        "compare": run_compare,
+        }
+
+def main():
+    if len(sys.argv) < 2 or not COMMANDS.has_key(sys.argv[1]):
+        sys.exit("usage: {0} {{{1}}} [options]".format(
+            path.basename(sys.argv[0]), ",".join(sorted(COMMANDS))))
+    sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
+
+if __name__ == "__main__":
+    main()
@@ -40,25 +40,20 @@ sys.path.insert(0, extdir)
 
 #-------------------------------------------------------------------------------
 # Configure logging
+#
+# Records are written by a background thread once the options are known; see
+# telemetry.logs.
 
-log_file = path.join(topdir, "pytest_log")
-log_level = logging.DEBUG
-
-logging.basicConfig(
-        level = log_level,
-        format = "%(asctime)s %(threadName)-5s %(levelname)-5s %(module)-5s " + \
-                "%(funcName)-5s %(message)s",
-                datefmt = '%Y%m%d %H:%M:%S',
-        filename = log_file,
-        filemode = 'a',
-        )
+from telemetry import logs
 
-logging.debug("GE Functional Test Init")
+log_file = path.join(topdir, "pytest_log")
 
 #-------------------------------------------------------------------------------
-# Load Functional Test & Associated libraries
-
-from ft.platform import Platform 
+# Functional Test & Associated libraries
+#
+# Each mode imports what it needs: the server loads the platform once it is
+# created (see ft.server), the client loads the GTK user interface and the
+# database engine in init_ui().
 
 #-------------------------------------------------------------------------------
 # Option Parsing
@@ -147,6 +142,87 @@ def parse_options():
             type="string",
             dest="logdb_connection",
         )
+    option_parser.add_option("", "--measurement-dir", 
+            help="Store ExpectTest measurements in the specified directory.",
+            action="store", 
+            type="string",
+            dest="measurement_dir",
+        )
+    option_parser.add_option("", "--journal-dir", 
+            help="Keep per-UUT test journals, used to resume test runs, in "
+                "the specified directory.",
+            action="store", 
+            type="string",
+            dest="journal_dir",
+        )
+    option_parser.add_option("", "--console-dir", 
+            help="Keep the compressed serial console output of every UUT in "
+                "the specified directory.",
+            action="store", 
+            type="string",
+            dest="console_dir",
+        )
+    option_parser.add_option("", "--console-max-bytes", 
+            help="Remove the oldest console captures once they take more "
+                "than this many bytes.",
+            action="store", 
+            type="int",
+            dest="console_max_bytes",
+        )
+    option_parser.add_option("", "--console-max-days", 
+            help="Remove console captures not written for this many days.",
+            action="store", 
+            type="float",
+            dest="console_max_days",
+        )
+    option_parser.add_option("", "--trace", 
+            help="Record timing spans and write them to the specified file "
+                "on exit, as CSV if it ends in '.csv' and as Chrome trace "
+                "JSON otherwise.",
+            action="store", 
+            type="string",
+            dest="trace_file",
+        )
+    option_parser.add_option("", "--metrics-port", 
+            help="Serve live metrics as text on "
+                "http://127.0.0.1:<port>/metrics.",
+            action="store", 
+            type="int",
+            dest="metrics_port",
+        )
+    option_parser.add_option("", "--command-workers", 
+            help="Maximum number of threads running asynchronous commands.",
+            action="store", 
+            type="int",
+            dest="command_workers",
+        )
+    option_parser.add_option("", "--log-file", 
+            help="Write the log to the specified file.",
+            action="store", 
+            type="string",
+            dest="log_file",
+        )
+    option_parser.add_option("", "--log-level", 
+            help="Log at LEVEL, or set the level of one subsystem with "
+                "SUBSYSTEM=LEVEL, such as 'interfaces.adam=INFO'. May be "
+                "given several times.",
+            action="append", 
+            type="string",
+            dest="log_levels",
+        )
+    option_parser.add_option("", "--log-max-bytes", 
+            help="Rotate the log file once it reaches this size; 0 never "
+                "rotates it.",
+            action="store", 
+            type="int",
+            dest="log_max_bytes",
+        )
+    option_parser.add_option("", "--log-backups", 
+            help="Number of rotated log files to keep.",
+            action="store", 
+            type="int",
+            dest="log_backups",
+        )
     option_parser.add_option("-a", "--platform-manifest", 
             help="Use the specified platform manifest file.",
             action="store", 
@@ -171,6 +247,17 @@ def parse_options():
             verbose = False,
             profile = False,
             profile_dir = "profile",
+            measurement_dir = "measurements",
+            journal_dir = "journal",
+            console_dir = "console",
+            console_max_bytes = 1024 * 1024 * 1024,
+            console_max_days = 30,
+            command_workers = 32,
+
+            log_file = log_file,
+            log_levels = None,
+            log_max_bytes = logs.DEFAULT_MAX_BYTES,
+            log_backups = logs.DEFAULT_BACKUP_COUNT,
             )
 
     return option_parser
@@ -190,8 +277,16 @@ def is_server_local(server_info):
     return host == "localhost" or host.startswith("127")
 
 def init_ui(platform_server, client):
-    import ui.funct
     try:
+        #-------------------
+        # Prepare Default Database Engine
+        #
+        # Need to choose database module dynamically.
+        #
+        from emac.orm.achievo import setup_default_engine
+        setup_default_engine()
+
+        import ui.funct
         return platform_server.launch_ui(ui.funct.main, client)
     except Exception:
         import traceback
@@ -203,7 +298,18 @@ def main():
     option_parser = parse_options()
     (options, args) = option_parser.parse_args()
 
+    try:
+        log_levels = logs.parse_levels(options.log_levels or [])
+    except ValueError as e:
+        option_parser.error(str(e))
+    logs.setup(options.log_file, log_levels, options.log_max_bytes,
+            options.log_backups)
+    logging.debug("GE Functional Test Init")
+
     options.profile_dir = path.join(topdir, options.profile_dir)
+    options.measurement_dir = path.join(topdir, options.measurement_dir)
+    options.journal_dir = path.join(topdir, options.journal_dir)
+    options.console_dir = path.join(topdir, options.console_dir)
 
     server_info = (options.platform_server_host, options.platform_server_port)
 
@@ -212,14 +318,6 @@ def main():
         pr = cProfile.Profile()
         pr.enable()
 
-    #-------------------
-    # Prepare Default Database Engine
-    #
-    # Need to choose database module dynamically.
-    #
-    from emac.orm.achievo import setup_default_engine
-    setup_default_engine()
-
     #-------------------
     # Load PlatformServer
     #
@@ -283,7 +381,7 @@ def main():
         f = io.open( profile_file, 'wb')
 
         ps = pstats.Stats(pr, stream=f)
-        ps.sort_stats("file", "cumulative")
+        ps.sort_stats("filename", "cumulative")
         ps.print_stats()
 
 if __name__ == "__main__":
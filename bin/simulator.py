@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## Run a rack of simulated slots until interrupted, printing the serial ports
+#  to put in the platform's config.yaml.
+#
+
+from optparse import OptionParser
+from os import path
+import sys, time, logging
+
+bindir = path.dirname(__file__)
+topdir = path.dirname(bindir)
+libdir = path.join(topdir, "lib")
+extdir = path.join(topdir, "ext")
+
+sys.path.insert(0, libdir)
+sys.path.insert(0, extdir)
+
+import yaml
+
+from simulator import SimulatedRack, Latency, DEFAULT_LATENCY
+
+def parse_options():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--slots", action="store", type="int",
+            dest="slots", help="Number of simulated slots.")
+    parser.add_option("-s", "--scale", action="store", type="float",
+            dest="scale", help="Multiply every simulated latency by SCALE.")
+    parser.add_option("-j", "--jitter", action="store", type="float",
+            dest="jitter", help="Vary every latency by up to this fraction.")
+    parser.add_option("-l", "--login", action="store_true", dest="login",
+            help="Boot the targets to a login prompt.")
+    parser.add_option("-b", "--baud", action="store", type="int",
+            dest="baud", help="Baud rate of the ADAM bus.")
+    parser.add_option("-v", "--verbose", action="store_true", dest="verbose")
+
+    parser.set_defaults(
+            slots=1,
+            scale=1.0,
+            jitter=0.0,
+            login=False,
+            baud=9600,
+            verbose=False,
+            )
+    return parser.parse_args()
+
+def main():
+    (options, args) = parse_options()
+    logging.basicConfig(
+            level = logging.DEBUG if options.verbose else logging.WARNING)
+
+    latency = Latency(options.scale, options.jitter, DEFAULT_LATENCY)
+    rack = SimulatedRack(options.slots, latency, options.baud,
+            login=options.login)
+    with rack:
+        config = {
+                "adam": [rack.get_adam_config()],
+                "slots": [{"control": rack.get_slot_control(i)}
+                    for i in range(options.slots)],
+                }
+        print(yaml.safe_dump(config, default_flow_style=False))
+        sys.stdout.flush()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
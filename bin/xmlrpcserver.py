@@ -1,9 +1,20 @@
 #!/usr/bin/env python
 # vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
 
+## Test agent of the UUT: serves the classes of ft.device.emac_devices over
+#  XML-RPC to the platform.
+#
+#    xmlrpcserver.py [-p PORT] [--resident] [ADDRESS]
+#
+#  scripts/autotest_init.sh starts it with --resident at boot: the agent then
+#  runs in a child process, forked again whenever it dies. The devices are
+#  imported on the first create_instance, so the agent prints READY_MARKER as
+#  soon as it listens.
+#
+
 from optparse import OptionParser
 from os import path
-import inspect, sys, logging, pdb
+import sys, os, time, signal, logging, pdb
 
 bindir = path.dirname(__file__)
 topdir = path.dirname(bindir)
@@ -24,6 +35,7 @@ logging.basicConfig(
     filemode = 'a',
     )
 
+from SocketServer import ThreadingMixIn
 from SimpleXMLRPCServer import (
         SimpleXMLRPCServer,
         SimpleXMLRPCRequestHandler,
@@ -31,10 +43,19 @@ from SimpleXMLRPCServer import (
 
 from interfaces.xmlrpc import (
         EMACXMLRPCInterface,
-        ServerInterface,
+        AGENT_PORT,
+        READY_MARKER,
         )
 
-from ft.device import emac_devices
+## Seconds between two starts of a resident agent that keeps dying.
+#
+RESTART_DELAY = 1.0
+
+## Serve each request on its own thread so that tests the platform runs in
+#  parallel do not queue behind each other.
+#
+class ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
 
 def parse_options():
     parser = OptionParser()
@@ -42,40 +63,54 @@ def parse_options():
     parser.add_option("-P", "--pydebug", action="store_true", dest="pydebug")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose")
     parser.add_option("-q", "--quiet", action="store_false", dest="verbose")
+    parser.add_option("-r", "--resident", action="store_true",
+            dest="resident", help="Restart the agent whenever it dies.")
     
     parser.set_defaults(
-            port=8000,
+            port=AGENT_PORT,
             verbose=False,
             pydebug=False,
+            resident=False,
             )
     return parser.parse_args()
+
+## Fork the agent and fork it again whenever it dies; return in the child.
+#
+#  The parent only ever waits, and stops the agent when it is terminated
+#  itself. Forking reuses the interpreter and modules already loaded, so a
+#  restarted agent listens again at once.
+#
+def supervise():
+    children = []
+
+    def terminate(signum, frame):
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    while True:
+        started = time.time()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            return
+        children[:] = [pid]
+        pid, status = os.waitpid(pid, 0)
+        logging.error("XMLRPC agent {0} died with status {1}, "
+                "restarting".format(pid, status))
+        time.sleep(max(0, RESTART_DELAY - (time.time() - started)))
     
 def main():
     (options, args) = parse_options()
 
-    ip_address = args[0]      
+    # all addresses unless one is given
+    ip_address = args[0] if args else ""
     port = options.port      
     verbose = options.verbose      
-    
-    #-------------------------------------------------------------------------------
-    # dynamically import required modules and append imported names to a list
-    #
-    
-    interface_names = []
-    interfaces = []
-    module = sys.modules[__name__]
-    
-    for name, obj in inspect.getmembers(emac_devices):
-        if inspect.isclass(obj):
-            interface_names.append(name)
-            interfaces.append(obj)
-    
-    temp = __import__('ft.device.emac_devices', globals(), locals(), interface_names,
-            -1)
-    
-    for name, obj in inspect.getmembers(temp):
-        if inspect.isclass(obj):
-            setattr(module, name, obj)
+
+    if options.resident:
+        supervise()
     
     #-------------------------------------------------------------------------------
     # define xmlrpc request handler
@@ -88,18 +123,23 @@ def main():
     # start server, register functions from dynamically imported module list
     #
     
-    server  = SimpleXMLRPCServer(
+    server  = ThreadedXMLRPCServer(
             (ip_address, port),
             requestHandler  = RequestHandler,
             allow_none  = True,
             )
         
-    server.register_instance( EMACXMLRPCInterface(interface_list=interfaces) )
+    server.register_instance(
+            EMACXMLRPCInterface(module="ft.device.emac_devices") )
     
     #-------------------------------------------------------------------------------
     # run server until killed by signal
     #
     
+    sys.stdout.write("{0} on {1}:{2}\n".format(READY_MARKER,
+        ip_address or "*", port))
+    sys.stdout.flush()
+
     if options.pydebug:
         pdb.set_trace()
     server.serve_forever()
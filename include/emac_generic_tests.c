@@ -160,6 +160,8 @@ int test_serial(char *port1, char *port2)
 	if ((fd1 = open(port1, O_RDWR | O_NONBLOCK)) == -1) {
 		printf("FAIL (open: %s)\n", strerror(errno));
 		errno = 0;
+		if (fd2 != 0)
+			close(fd2);
 		return FD_NO_OPEN;
 	}
 
@@ -261,6 +263,7 @@ int test_pwm(char *pwm_dev)
 	printf("PASS\n");
 	fflush(stdout);
 
+	close(pwm);
 	return SUCCESS;
 }
 
@@ -409,6 +412,7 @@ int test_rtc(char *rtc_dev)
 
 	if (settimeofday(&tv_c, NULL) == -1) {
 		printf("FAIL\n Error setting time: %s\n", strerror(errno));
+		close(rtc);
 		return RTC_TOD;
 	}
 	
@@ -450,6 +454,7 @@ int test_485(char *dev)
 	if ((num = write(fd, buff, BUFF_485)) != BUFF_485) {
 		printf("FAIL\n RS-485 test failed to write to port: "
 			"%s: %d\n", strerror(errno), num);
+		close(fd);
 		return FD_NO_WRITE;
 	}
 
@@ -746,6 +751,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	if (ioctl(fd, I2C_SLAVE, addr) < 0) {
 		printf("FAIL\nI2C Address set Fail. Error on ioctl: %s\n",
 				strerror(errno));
+		close(fd);
 		return I2C_NO_DEVICE;
 	}
 
@@ -754,6 +760,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	if (i2c_write_byte(fd, reg) == -1) {
 		printf("FAIL\nI2C Register request failed. Error on ioctl: \
 				%s\n", strerror(errno)); 
+		close(fd);
 		return I2C_NO_WRITE;
 	}
 
@@ -762,6 +769,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	if ((num_bytes != 2) && (num_bytes != 4)) {
 		printf("FAIL\nI2C Invalid expected value: %s\n",
 				expected_value);
+		close(fd);
 		return INVALID_ARG;
 	}
 	
@@ -769,6 +777,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	if (i2c_read_byte(fd, &b) == -1) {
 		printf("FAIL\nI2C Read byte failed. Error on ioctl: %s\n",
 				strerror(errno)); 
+		close(fd);
 		return I2C_NO_READ;
 	}
 	val = (__u16)b;
@@ -778,6 +787,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 		if (i2c_read_byte(fd, &b) == -1) {
 			printf("FAIL\nI2C Read byte failed. Error on ioctl: \
 					%s\n", strerror(errno)); 
+			close(fd);
 			return I2C_NO_READ;
 		}
 		/* Combine with first byte. */
@@ -792,6 +802,7 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	expected = (int) strtol(expected_value, NULL, 16);
 	if (errno) {
 		printf("FAIL\nI2C Invalid expected value %s\n", expected_value);
+		close(fd);
 		return INVALID_ARG;
 	}
 
@@ -799,9 +810,11 @@ int test_i2c_read(char *device, char *i2c_addr, char *i2c_reg, char* expected_va
 	if (expected != actual) {
 		printf("FAIL\nI2C Actual: 0x%X, Expected: 0x%X\n", val,
 				expected);
+		close(fd);
 		return I2C_ACT_V_EXP;
 	}
 
+	close(fd);
 	return SUCCESS;
 }
 
@@ -17,7 +17,7 @@
  * @param addr the slave address to set
  * @return -1 on error 0 on success
  */
-inline int i2c_set_slave(int fd, int addr)
+int i2c_set_slave(int fd, int addr)
 {
 	if (ioctl(fd, I2C_SLAVE, addr) < 0) {
 		fprintf(stderr, "i2c_set_addr: Error on ioctl: %s\n",
@@ -33,7 +33,7 @@ inline int i2c_set_slave(int fd, int addr)
  * @param data the byte to write to the device
  * @return -1 on failure 0 on success
  */
-inline int i2c_write_byte(int fd, __u8 byte)
+int i2c_write_byte(int fd, __u8 byte)
 {
 	i2c_smbus_write_byte(fd, byte);
 	return 0;
@@ -46,7 +46,7 @@ inline int i2c_write_byte(int fd, __u8 byte)
  * @param cmd the data to write to the device
  * @return -1 on failure 0 on success
  */
-inline int i2c_write_cmd(int fd, __u8 reg, __u8 cmd)
+int i2c_write_cmd(int fd, __u8 reg, __u8 cmd)
 {
 	__u8 buff[2];
 
@@ -63,7 +63,7 @@ inline int i2c_write_cmd(int fd, __u8 reg, __u8 cmd)
  * @param val a pointer to the location to store the data
  * @return -1 on failure 0 on success
  */
-inline int i2c_read_byte(int fd, __u8 *val)
+int i2c_read_byte(int fd, __u8 *val)
 {
 	*val = i2c_smbus_read_byte(fd);
 	return 0;
@@ -77,7 +77,7 @@ inline int i2c_read_byte(int fd, __u8 *val)
  * @param reg the register to read from
  * @return -1 on failure 0 on success
  */
-inline int i2c_read_reg(int fd, __u8 *val, __u8 reg)
+int i2c_read_reg(int fd, __u8 *val, __u8 reg)
 {
 	/* write register */
 
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package benchmark
+#
+#  Performance suites run by bin/benchmark.py. Every suite returns a result
+#  dictionary:
+#
+#    {"suite": ..., "commit": ..., "time": ..., "config": {...},
+#     "metrics": {"units_per_hour": 412.3, "stage.nfs_test_boot.p95": ...}}
+#
+#  whose flat "metrics" can be saved as JSON and compared with the result of
+#  another commit; see benchmark.results.
+#
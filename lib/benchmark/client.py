@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package client
+#
+#  Platform server client for the benchmark suites: sync commands, and
+#  streamed commands whose CommandResult event is waited for.
+#
+
+import time, socket, threading, logging
+
+import ft.event
+from ft.command import CommandRecord, Mode
+from ft.server.sockets import PlatformSocketClient
+
+## Collects the CommandResult events fired for streamed commands.
+#
+class ResultWaiter(object):
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.results = dict()
+
+    def notify(self, event):
+        if not isinstance(event, ft.event.CommandResult):
+            return
+        with self.condition:
+            key = (event.command_id, event.command_address)
+            self.results[key] = (event.result, event.message)
+            self.condition.notify_all()
+
+    ## Wait for and return the (result, message) of a streamed command.
+    #
+    #  @return None on timeout.
+    #
+    def wait(self, command_id, address, timeout=None):
+        key = (command_id, address)
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while not self.results.has_key(key):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                self.condition.wait(remaining)
+            return self.results.pop(key)
+
+class BenchmarkClient(object):
+
+    ## Connect to the server at "server_info", retrying for up to
+    #  "connect_timeout" seconds while it starts.
+    #
+    def __init__(self, server_info, connect_timeout=30):
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                self.client = PlatformSocketClient(server_info)
+                break
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.02)
+
+        self.waiter = ResultWaiter()
+        self.client.register_handler(self.waiter)
+        self.client.daemon = True
+        self.client.start()
+
+        # responses are matched to commands by order only
+        self.lock = threading.Lock()
+
+    def run_command(self, record):
+        with self.lock:
+            return self.client.run_command(record)
+
+    ## Run a sync command and return its (result, message).
+    #
+    def call(self, command, recipient_type, address, data=None):
+        return self.run_command(CommandRecord(command, recipient_type,
+            address, data))
+
+    ## Run a streamed command on every address in "addresses" and wait for
+    #  their results.
+    #
+    #  @return A list of (result, message), None for a command that timed
+    #  out.
+    #
+    def stream(self, command, recipient_type, addresses, data=None,
+            timeout=None):
+        if not isinstance(addresses, list):
+            addresses = [addresses]
+        record = CommandRecord(command, recipient_type, addresses, data,
+                Mode.STREAM)
+        self.run_command(record)
+        results = list()
+        for address in addresses:
+            result = self.waiter.wait(record.command_id, address, timeout)
+            if result is None:
+                logging.error("Timed out waiting for {0} on {1}".format(
+                    command, address))
+            results.append(result)
+        return results
+
+    ## Stop the server and disconnect.
+    #
+    def terminate(self):
+        self.client.terminate()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package e2e
+#
+#  End to end units per hour: a platform server and a simulated rack, each in
+#  its own process, driven through the server API the way an operator
+#  would. Every slot tests units one after the other:
+#
+#    set_uut -> nfs_test_boot -> run_all_tests -> clear_uut
+#
+#  after the platform and slots have been configured once. Stage latencies
+#  are measured by the client, from sending the command to its CommandResult
+#  event, so they include queueing in the server.
+#
+
+import os, os.path as path, sys, time, shutil, socket, tempfile, threading
+import logging, optparse, multiprocessing
+
+from ft.command import RecipientType
+from benchmark import fixture
+from benchmark.client import BenchmarkClient
+from benchmark.results import (
+        get_summary,
+        add_summary,
+        get_process_usage,
+        make_result,
+        )
+
+STAGES = ("set_uut", "nfs_test_boot", "run_all_tests", "clear_uut")
+
+## Seconds to wait for a single command to finish.
+#
+DEFAULT_TIMEOUT = 600
+
+def _get_free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def _run_simulator(conn, slots, scale, jitter, rpc_latency):
+    from simulator import (
+            SimulatedRack,
+            Latency,
+            DEFAULT_LATENCY,
+            get_stub_devices,
+            )
+
+    latency = Latency(scale, jitter, DEFAULT_LATENCY)
+    # the targets start their agent at boot, as scripts/autotest_init.sh does
+    rack = SimulatedRack(slots, latency,
+            rpc_devices=get_stub_devices(latency=rpc_latency), agent=True)
+    with rack:
+        conn.send({
+            "adam": rack.get_adam_config(),
+            "slots": [rack.get_slot_control(i) for i in range(slots)],
+            })
+        conn.recv()
+    conn.send(get_process_usage())
+
+def _run_server(options, work_dir, queue):
+    from ft.server.sockets import PlatformServer
+
+    # pexpect reads sys.__stdin__, which multiprocessing closes
+    sys.stdin = sys.__stdin__ = open(os.devnull)
+    # the platform clones its metadata under ./resources
+    os.chdir(work_dir)
+    handler = logging.FileHandler(path.join(work_dir, "server.log"))
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(threadName)s %(levelname)s %(message)s"))
+    logger = logging.getLogger()
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+
+    platform_server = PlatformServer()
+    platform_server.init_server(options)
+    platform_server.init_platform(options)
+    platform_server.detach()
+    platform_server.server.join()
+    queue.put(get_process_usage())
+
+## Error raised when the platform cannot be set up for the benchmark.
+#
+class BenchmarkError(Exception):
+    pass
+
+class UnitsPerHourBenchmark(object):
+
+    ## @param slots Number of simulated slots.
+    #  @param units Number of units tested by each slot.
+    #  @param tests Tests in the specification, each one remote call.
+    #  @param max_parallel Tests of a unit run at the same time.
+    #  @param scale Multiplies the simulated hardware latencies.
+    #  @param rpc_latency Seconds taken by every simulated remote call.
+    #  @param work_dir Directory for the metadata and server log; a
+    #  temporary directory, removed afterwards, by default.
+    #
+    def __init__(self, slots=4, units=4, tests=8, max_parallel=1, scale=1.0,
+            jitter=0.0, rpc_latency=0.0, work_dir=None,
+            timeout=DEFAULT_TIMEOUT, command_workers=32):
+        self.slots = slots
+        self.units = units
+        self.tests = tests
+        self.max_parallel = max_parallel
+        self.scale = scale
+        self.jitter = jitter
+        self.rpc_latency = rpc_latency
+        self.work_dir = work_dir
+        self.timeout = timeout
+        self.command_workers = command_workers
+
+        self.lock = threading.Lock()
+        self.stage_times = dict((stage, list()) for stage in STAGES)
+        self.unit_times = list()
+        self.errors = list()
+
+    def get_config(self):
+        return {
+                "slots": self.slots,
+                "units": self.units,
+                "tests": self.tests,
+                "max_parallel": self.max_parallel,
+                "scale": self.scale,
+                "jitter": self.jitter,
+                "rpc_latency": self.rpc_latency,
+                "command_workers": self.command_workers,
+                }
+
+    def get_server_options(self, work_dir, port):
+        return optparse.Values({
+                "platform_manifest_file": path.join(work_dir,
+                    "manifest.yaml"),
+                "platform_server_host": "127.0.0.1",
+                "platform_server_port": port,
+                "command_workers": self.command_workers,
+                "profile": False,
+                "debug": 0,
+                "measurement_dir": None,
+                "journal_dir": None,
+                "console_dir": None,
+                "trace_file": None,
+                "metrics_port": None,
+                })
+
+    ## Run the benchmark and return its result; see benchmark.results.
+    #
+    def run(self):
+        work_dir = self.work_dir
+        if work_dir is None:
+            work_dir = tempfile.mkdtemp(prefix="ft-benchmark-")
+        try:
+            return self.__run(work_dir)
+        finally:
+            if self.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def __run(self, work_dir):
+        # both processes are forked before this one starts any thread
+        conn, child_conn = multiprocessing.Pipe()
+        simulator = multiprocessing.Process(target=_run_simulator,
+                name="BenchmarkSimulator", args=(child_conn, self.slots,
+                    self.scale, self.jitter, self.rpc_latency))
+        simulator.start()
+        rack = conn.recv()
+        fixture.create_metadata(work_dir, rack["adam"], rack["slots"],
+                self.tests, self.max_parallel)
+
+        port = _get_free_port()
+        queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_run_server,
+                name="BenchmarkServer", args=(self.get_server_options(
+                    work_dir, port), work_dir, queue))
+        server.start()
+
+        usage = dict()
+        try:
+            client = BenchmarkClient(("127.0.0.1", port))
+            try:
+                start = time.time()
+                self.__configure(client)
+                configured = time.time()
+                self.__test_units(client)
+                elapsed = time.time() - configured
+                snapshot = client.call("get_metrics", RecipientType.PLATFORM,
+                        None)[0]
+            finally:
+                client.terminate()
+            usage["server"] = queue.get(True, self.timeout)
+            server.join(self.timeout)
+        finally:
+            if server.is_alive():
+                server.terminate()
+            conn.send("stop")
+            usage["simulator"] = conn.recv()
+            simulator.join()
+        usage["client"] = get_process_usage()
+
+        metrics = self.get_metrics(elapsed, snapshot, usage)
+        metrics["configure_seconds"] = configured - start
+        details = {"errors": self.errors[:20], "server": snapshot}
+        return make_result("units_per_hour", self.get_config(), metrics,
+                details)
+
+    def get_metrics(self, elapsed, snapshot, usage):
+        tested = dict()
+        for labels, value in snapshot.get("ft_uuts_tested_total", []):
+            tested[labels.get("result")] = value
+        units = len(self.unit_times)
+
+        metrics = {
+                "units": units,
+                "failed": tested.get("fail", 0),
+                "errors": len(self.errors),
+                "elapsed_seconds": elapsed,
+                "units_per_hour": units * 3600.0 / elapsed if elapsed else 0,
+                }
+        add_summary(metrics, "unit_seconds", get_summary(self.unit_times))
+        for stage, samples in self.stage_times.items():
+            summary = get_summary(samples)
+            del summary["count"]
+            add_summary(metrics, "stage.{0}".format(stage), summary)
+        for name, process_usage in usage.items():
+            add_summary(metrics, "process.{0}".format(name), process_usage)
+        return metrics
+
+    def __check(self, command, address, result):
+        if result is None:
+            raise BenchmarkError("{0} timed out on {1}".format(command,
+                address))
+        if result[1]:
+            raise BenchmarkError("{0} failed on {1}: {2}".format(command,
+                address, result[1]))
+        return result[0]
+
+    def __call(self, client, command, recipient_type, address, data=None):
+        return self.__check(command, address, client.call(command,
+            recipient_type, address, data))
+
+    def __configure(self, client):
+        self.__call(client, "select_platform", RecipientType.PLATFORM, None,
+                fixture.PLATFORM_NAME)
+        self.__call(client, "set_platform_version", RecipientType.PLATFORM,
+                None, "master")
+        self.__check("configure", None, client.stream("configure",
+            RecipientType.PLATFORM, None, timeout=self.timeout)[0])
+
+        addresses = [(None, i) for i in range(self.slots)]
+        for address in addresses:
+            self.__call(client, "select_product", RecipientType.SLOT,
+                    address, fixture.PRODUCT_NAME)
+            self.__call(client, "set_product_version", RecipientType.SLOT,
+                    address, "master")
+        results = client.stream("configure", RecipientType.SLOT, addresses,
+                fixture.SPECIFICATION_NAME, timeout=self.timeout)
+        for address, result in zip(addresses, results):
+            self.__check("configure", address, result)
+
+    def __test_units(self, client):
+        threads = list()
+        for slot in range(self.slots):
+            thread = threading.Thread(target=self.__test_slot,
+                    name="BenchmarkSlot-{0}".format(slot),
+                    args=(client, slot))
+            thread.daemon = True
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def __test_slot(self, client, slot):
+        slot_address = (None, slot)
+        for unit in range(self.units):
+            serial_number = "SIM{0:02d}{1:04d}".format(slot, unit)
+            unit_address = (slot_address, serial_number)
+            stages = (
+                    (RecipientType.SLOT, slot_address,
+                        {"serialnum": serial_number}),
+                    (RecipientType.UUT, unit_address, None),
+                    (RecipientType.UUT, unit_address, None),
+                    (RecipientType.SLOT, slot_address, None),
+                    )
+            unit_start = time.time()
+            for stage, (recipient_type, address, data) in zip(STAGES,
+                    stages):
+                stage_start = time.time()
+                result = client.stream(stage, recipient_type, address, data,
+                        timeout=self.timeout)[0]
+                with self.lock:
+                    self.stage_times[stage].append(time.time() - stage_start)
+                    if result is None or result[1]:
+                        self.errors.append((stage, serial_number,
+                            result and result[1]))
+                if result is None:
+                    logging.error("Slot {0} gave up after a timeout".format(
+                        slot))
+                    return
+            with self.lock:
+                self.unit_times.append(time.time() - unit_start)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package fixture
+#
+#  Platform and product metadata for a simulated rack: a platform manifest
+#  pointing at two local bare git repositories, the platform (config.yaml
+#  with the rack's serial ports and ADAM bus) and the product (config.yaml,
+#  U-Boot template and a specification of remote BinaryCall tests).
+#
+
+import os, os.path as path, subprocess
+
+import yaml
+
+PLATFORM_NAME = "simulated"
+PRODUCT_NAME = "simproduct"
+SPECIFICATION_NAME = "benchmark"
+
+NFS_TEST_TEMPLATE = """setenv serverip ${server_ip}
+setenv gatewayip ${gateway_ip}
+setenv bootargs root=/dev/nfs nfsroot=${server_ip}:${nfs_base_dir}/${nfs_dir}
+"""
+
+def _git(work_tree, *args):
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call(["git", "-C", work_tree,
+            "-c", "user.name=ft", "-c", "user.email=ft@localhost"] +
+            list(args), stdout=devnull, stderr=devnull)
+
+def _dump(file_path, data):
+    directory = path.dirname(file_path)
+    if not path.isdir(directory):
+        os.makedirs(directory)
+    with open(file_path, "w") as f:
+        if isinstance(data, basestring):
+            f.write(data)
+        else:
+            yaml.dump(data, f, Dumper=_Dumper, default_flow_style=False)
+
+## Commit "files" ({relative path: data}) to a new bare repository
+#  "<remote_dir>/<name>.git".
+#
+def _create_repo(work_dir, remote_dir, name, files):
+    work_tree = path.join(work_dir, name)
+    os.makedirs(work_tree)
+    _git(work_tree, "init", "-q")
+    _git(work_tree, "symbolic-ref", "HEAD", "refs/heads/master")
+    for file_name, data in files.items():
+        _dump(path.join(work_tree, file_name), data)
+    _git(work_tree, "add", "-A")
+    _git(work_tree, "commit", "-q", "-m", "Simulated {0}".format(name))
+    _git(work_dir, "clone", "-q", "--bare", work_tree,
+            path.join(remote_dir, name + ".git"))
+
+## Return the specification dictionary: "tests" single tests each making one
+#  remote BinaryCall, "max_parallel" of them at a time.
+#
+def get_specification(tests=8, max_parallel=1):
+    testlist = list()
+    for i in range(tests):
+        testlist.append({
+            "name": "Test {0}".format(i),
+            "type": "single",
+            "shortdesc": "Simulated test {0}".format(i),
+            "refdes": [],
+            "valid": True,
+            "resources": [],
+            "actionlist": [{
+                "name": "call{0}".format(i),
+                "class": _Name("ft.device.emac_devices.BinaryCall"),
+                "method_name": "call",
+                "remote": True,
+                "constructor_args": {"binary_full_path": "/bin/true"},
+                "kwargs": {"argslist": []},
+                }],
+            })
+    return {
+            "name": SPECIFICATION_NAME,
+            "shortdesc": "Simulated benchmark specification",
+            "instructions": "",
+            "max_parallel": max_parallel,
+            "testlist": testlist,
+            }
+
+## Action class given by name, so that building the fixture does not import
+#  the platform; dumped as "!!python/name:<name>".
+#
+class _Name(object):
+
+    def __init__(self, name):
+        self.name = name
+
+class _Dumper(yaml.SafeDumper):
+    pass
+
+_Dumper.add_representer(_Name, lambda dumper, data:
+        dumper.represent_scalar(u"tag:yaml.org,2002:python/name:" +
+            data.name, u""))
+
+## Create the metadata of a simulated rack under "work_dir".
+#
+#  @param adam_config ADAM bus entry of the platform config; see
+#  SimulatedRack.get_adam_config.
+#  @param slot_controls "control" entries of the slots; see
+#  SimulatedRack.get_slot_control.
+#
+#  @return The path of the platform manifest.
+#
+def create_metadata(work_dir, adam_config, slot_controls, tests=8,
+        max_parallel=1):
+    remote_dir = path.join(work_dir, "remote")
+    source_dir = path.join(work_dir, "source")
+    os.makedirs(remote_dir)
+    os.makedirs(source_dir)
+    repo_dict = {"url": "file://" + remote_dir + "/", "basepath": ""}
+
+    _create_repo(source_dir, remote_dir, PLATFORM_NAME, {
+        "config.yaml": {
+            "name": PLATFORM_NAME,
+            "shortdesc": "Simulated rack",
+            "options": {
+                "server_ip": "127.0.0.1",
+                "gateway_ip": "127.0.0.1",
+                "nfs_base_dir": path.join(work_dir, "nfs"),
+                "tftp_base_dir": path.join(work_dir, "tftp"),
+                "password": "",
+                "adam": [adam_config],
+                "slots": [{"control": control} for control in slot_controls],
+                },
+            },
+        "manifest.yaml": {
+            "metadata_repo": repo_dict,
+            "repositories": [{
+                "name": PRODUCT_NAME,
+                "relative_path": PRODUCT_NAME,
+                }],
+            },
+        })
+
+    _create_repo(source_dir, remote_dir, PRODUCT_NAME, {
+        "config.yaml": {
+            "serial": {"baud": 115200},
+            "prompt": {"uboot": "U-Boot>", "linux": {"test": "sh-3.2#"}},
+            "uboot": {
+                "nfs_dir": PRODUCT_NAME,
+                "tftp_dir": PRODUCT_NAME,
+                "test_filesystem": "rootfs.tar.gz",
+                },
+            },
+        "nfs_test.template": NFS_TEST_TEMPLATE,
+        path.join("spec", SPECIFICATION_NAME + ".yaml"):
+            get_specification(tests, max_parallel),
+        })
+
+    manifest_file = path.join(work_dir, "manifest.yaml")
+    _dump(manifest_file, {
+        "metadata_repo": repo_dict,
+        "repositories": [{
+            "name": PLATFORM_NAME,
+            "relative_path": PLATFORM_NAME,
+            }],
+        })
+    return manifest_file
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package load
+#
+#  Load generator for PlatformSocketServer. A server process, running a stub
+#  platform that only answers "acknowledge", waits for N client processes to
+#  connect and then fires bursts of LoadEvents through
+#  PlatformSocketServer.fire, the path every platform event takes. Meanwhile
+#  each client sends sync commands at a fixed rate.
+#
+#  Every LoadEvent carries its sequence number and the time it was fired, so
+#  the clients measure the delivery lag and count the events that were
+#  dropped, repeated, delivered out of order or later than the "late"
+#  threshold. Each client runs in its own process, since PlatformSocketClient
+#  polls its socket in a busy loop.
+#
+
+import time, socket, threading, multiprocessing
+
+import ft.event
+from ft.server.sockets import PlatformSocketServer, PlatformSocketClient
+from ft.server.common import PlatformTimeoutError
+from ft.command import (
+        Command,
+        Commandable,
+        CommandRecord,
+        RecipientType,
+        address_registry,
+        )
+from ft.util.locker import RWLock, query
+from benchmark.results import (
+        get_summary,
+        add_summary,
+        get_process_usage,
+        make_result,
+        )
+
+## Event fired by the load generator; "done" marks the last one.
+#
+class LoadEvent(ft.event.Event):
+    """ Load Event """
+
+class _LoadPlatform(Commandable):
+
+    recipient_type = RecipientType.PLATFORM
+
+    def __init__(self):
+        self.address = None
+        self.lock = RWLock()
+        self.options = None
+        self.commands = Command(self)
+        address_registry.register(self)
+
+    def fire(self, event, **kwargs):
+        pass
+
+    def cleanup(self):
+        self.commands.executor.shutdown()
+
+    class CommandsSync:
+        @staticmethod
+        @query
+        def acknowledge(platform, data):
+            return data, ""
+
+    class CommandsAsync:
+        pass
+
+def _get_free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def _connect(server_info, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return PlatformSocketClient(server_info)
+        except socket.error:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+def _run_server(port, config, queue):
+    server = PlatformSocketServer("127.0.0.1", port)
+    server.platform = _LoadPlatform()
+    server.start()
+
+    # the acceptor holds new clients back for a moment after registering them
+    deadline = time.time() + config["timeout"]
+    while (len(server.socket_dict) < config["clients"] and
+            time.time() < deadline):
+        time.sleep(0.01)
+    time.sleep(0.5)
+
+    payload = "x" * config["payload"]
+    sequence = 0
+    start = time.time()
+    for burst in range(config["bursts"]):
+        for i in range(config["burst_size"]):
+            server.fire(LoadEvent, sequence=sequence, sent=time.time(),
+                    payload=payload)
+            sequence += 1
+        next_burst = start + (burst + 1) * config["burst_interval"]
+        time.sleep(max(0, next_burst - time.time()))
+    server.fire(LoadEvent, sequence=sequence, sent=time.time(), done=True)
+    fire_seconds = time.time() - start
+
+    server.join()
+    queue.put({
+        "events": sequence,
+        "fire_seconds": fire_seconds,
+        "usage": get_process_usage(),
+        })
+
+## Records the LoadEvents received by a client.
+#
+class _EventRecorder(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lags = list()
+        self.received = set()
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.last = -1
+        self.done = threading.Event()
+
+    def notify(self, event):
+        if not isinstance(event, LoadEvent):
+            return
+        lag = time.time() - event.sent
+        with self.lock:
+            if getattr(event, "done", False):
+                self.done.set()
+                return
+            if event.sequence in self.received:
+                self.duplicates += 1
+                return
+            if event.sequence < self.last:
+                self.out_of_order += 1
+            self.last = max(self.last, event.sequence)
+            self.received.add(event.sequence)
+            self.lags.append(lag)
+
+def _run_client(index, server_info, config, queue):
+    client = _connect(server_info)
+    recorder = _EventRecorder()
+    client.register_handler(recorder)
+    client.daemon = True
+    client.start()
+
+    latencies = list()
+    errors = 0
+    rate = config["command_rate"]
+    start = time.time()
+    deadline = start + config["timeout"]
+    sent = 0
+    while not recorder.done.is_set() and time.time() < deadline:
+        if not rate:
+            recorder.done.wait(deadline - time.time())
+            break
+        record = CommandRecord("acknowledge", RecipientType.PLATFORM, None,
+                sent)
+        command_start = time.time()
+        try:
+            result = client.run_command(record)
+        except PlatformTimeoutError:
+            result = None
+        if result is None or result[0] != sent:
+            errors += 1
+        latencies.append(time.time() - command_start)
+        sent += 1
+        # a fixed schedule, so slow responses do not lower the load
+        delay = start + sent / float(rate) - time.time()
+        if delay > 0:
+            recorder.done.wait(delay)
+
+    client.disconnect()
+    with recorder.lock:
+        queue.put({
+            "client": index,
+            "command_latencies": latencies,
+            "command_errors": errors,
+            "command_seconds": time.time() - start,
+            "lags": recorder.lags,
+            "received": len(recorder.received),
+            "duplicates": recorder.duplicates,
+            "out_of_order": recorder.out_of_order,
+            "done": recorder.done.is_set(),
+            "usage": get_process_usage(),
+            })
+
+class LoadBenchmark(object):
+
+    ## @param clients Number of connected clients.
+    #  @param bursts Number of event bursts.
+    #  @param burst_size Events per burst.
+    #  @param burst_interval Seconds from one burst to the next.
+    #  @param payload Bytes of payload carried by every event.
+    #  @param command_rate Sync commands per second sent by each client.
+    #  @param late Seconds after which a delivered event counts as late.
+    #
+    def __init__(self, clients=4, bursts=10, burst_size=100,
+            burst_interval=0.5, payload=64, command_rate=20, late=1.0,
+            timeout=120):
+        self.config = {
+                "clients": clients,
+                "bursts": bursts,
+                "burst_size": burst_size,
+                "burst_interval": burst_interval,
+                "payload": payload,
+                "command_rate": command_rate,
+                "late": late,
+                "timeout": timeout,
+                }
+
+    ## Run the load and return its result; see benchmark.results.
+    #
+    def run(self):
+        config = self.config
+        port = _get_free_port()
+        server_info = ("127.0.0.1", port)
+        server_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_run_server,
+                name="LoadServer", args=(port, config, server_queue))
+        server.start()
+
+        queue = multiprocessing.Queue()
+        clients = list()
+        for i in range(config["clients"]):
+            client = multiprocessing.Process(target=_run_client,
+                    name="LoadClient-{0}".format(i),
+                    args=(i, server_info, config, queue))
+            client.start()
+            clients.append(client)
+
+        reports = list()
+        try:
+            for client in clients:
+                reports.append(queue.get(True, config["timeout"] + 30))
+            for client in clients:
+                client.join()
+
+            control = _connect(server_info)
+            control.daemon = True
+            control.start()
+            control.terminate()
+            server_report = server_queue.get(True, 30)
+            server.join()
+        finally:
+            for process in clients + [server]:
+                if process.is_alive():
+                    process.terminate()
+
+        return make_result("load", config, self.get_metrics(server_report,
+            reports), {"clients": [dict((key, value) for key, value in
+                report.items() if not key in ("lags", "command_latencies"))
+                for report in reports]})
+
+    def get_metrics(self, server_report, reports):
+        events = server_report["events"]
+        lags = [lag for report in reports for lag in report["lags"]]
+        latencies = [latency for report in reports
+                for latency in report["command_latencies"]]
+        received = sum(report["received"] for report in reports)
+        command_seconds = max(report["command_seconds"] for report in reports)
+        fire_seconds = server_report["fire_seconds"]
+
+        metrics = {
+                "events_fired": events,
+                "events_dropped": len(reports) * events - received,
+                "events_late": len([lag for lag in lags
+                    if lag > self.config["late"]]),
+                "events_duplicated": sum(report["duplicates"]
+                    for report in reports),
+                "events_out_of_order": sum(report["out_of_order"]
+                    for report in reports),
+                "events_delivered_per_second": received / fire_seconds
+                    if fire_seconds else 0,
+                "commands": len(latencies),
+                "command_errors": sum(report["command_errors"]
+                    for report in reports),
+                "commands_per_second": len(latencies) / command_seconds
+                    if command_seconds else 0,
+                "clients_unfinished": len([report for report in reports
+                    if not report["done"]]),
+                }
+        add_summary(metrics, "event_lag_seconds", get_summary(lags))
+        add_summary(metrics, "command_seconds", get_summary(latencies))
+        add_summary(metrics, "process.server", server_report["usage"])
+        for name in ("cpu_seconds", "max_rss_kb"):
+            metrics["process.clients." + name] = max(report["usage"][name]
+                    for report in reports)
+        return metrics
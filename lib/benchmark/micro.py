@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package micro
+#
+#  Microbenchmarks of the server's hot paths: the socket wire protocol
+#  (header with MD5 digest, send/recv over loopback TCP, pickled events),
+#  event construction, EventHandlerRegistry fan-out and Command dispatch.
+#
+#  Every benchmark runs "count" operations "repeat" times and reports, under
+#  "<name>[.<parameter>]", the median operations per second and the median,
+#  fastest and slowest microseconds per operation.
+#
+
+import threading, socket, timeit
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import ft.event
+from ft.server import sockethandler
+from ft.server.sockethandler import SocketDataHandler, SocketObjectHandler
+from ft.server.common import EventHandlerRegistry
+from ft.command import (
+        Command,
+        Commandable,
+        CommandRecord,
+        RecipientType,
+        Mode,
+        address_registry,
+        )
+from ft.util.locker import RWLock, query
+from benchmark.results import get_percentile, make_result
+
+DEFAULT_SIZES = (64, 1024, 65536)
+DEFAULT_HANDLERS = (1, 8, 64)
+EVENT_TYPES = ("status", "update", "result")
+
+## Operations of a single run are cut so that it moves at most this many
+#  bytes.
+#
+MAX_BYTES = 64 * 1024 * 1024
+
+class Benchmark(object):
+
+    name = None
+
+    ## @param parameter Message size, number of handlers... appended to the
+    #  name of the metrics, or None.
+    #
+    def __init__(self, parameter=None):
+        self.parameter = parameter
+
+    def get_name(self):
+        if self.parameter is None:
+            return self.name
+        return "{0}.{1}".format(self.name, self.parameter)
+
+    def get_count(self, count):
+        return count
+
+    def setup(self):
+        pass
+
+    def run(self, count):
+        raise NotImplementedError()
+
+    def teardown(self):
+        pass
+
+class HeaderBenchmark(Benchmark):
+
+    name = "header"
+
+    def setup(self):
+        self.message = "x" * self.parameter
+
+    def get_count(self, count):
+        return max(1, min(count, MAX_BYTES // self.parameter))
+
+    def run(self, count):
+        message = self.message
+        for i in xrange(count):
+            sockethandler._parse_header(sockethandler._get_header(message))
+
+## Return two connected TCP sockets on the loopback interface, like those
+#  between the platform server and its clients.
+#
+def get_socket_pair():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(listener.getsockname())
+    server, address = listener.accept()
+    listener.close()
+    return client, server
+
+## Messages sent by a thread on one end of a connection and received on the
+#  other.
+#
+class SocketBenchmark(Benchmark):
+
+    handler_class = SocketDataHandler
+
+    def setup(self):
+        sender, receiver = get_socket_pair()
+        self.sender = self.handler_class(sender)
+        self.receiver = self.handler_class(receiver)
+        self.message = self.get_message()
+
+    def get_message(self):
+        raise NotImplementedError()
+
+    def run(self, count):
+        message = self.message
+        def send():
+            for i in xrange(count):
+                self.sender.send(message)
+        thread = threading.Thread(target=send, name="BenchmarkSender")
+        thread.daemon = True
+        thread.start()
+        for i in xrange(count):
+            self.receiver.recv()
+        thread.join()
+
+    def teardown(self):
+        self.sender.close()
+        self.receiver.close()
+
+class DataSocketBenchmark(SocketBenchmark):
+
+    name = "socket_data"
+
+    def get_message(self):
+        return "x" * self.parameter
+
+    def get_count(self, count):
+        return max(1, min(count, MAX_BYTES // self.parameter))
+
+class ObjectSocketBenchmark(SocketBenchmark):
+
+    name = "socket_object"
+    handler_class = SocketObjectHandler
+
+    def get_message(self):
+        return get_event(self.parameter)
+
+class _Object(object):
+
+    def __init__(self, address):
+        self.address = address
+
+## Return an event of the kind fired most often by the platform.
+#
+#  @param kind "status" for the TestEvent of fire_status(), "update" for an
+#  UpdateStatus message or "result" for the CommandResult of a run_all_tests.
+#
+def get_event(kind):
+    uut = _Object(((None, 3), "SN00012345"))
+    if kind == "status":
+        return ft.event.TestEvent(obj=_Object((uut.address, 7)),
+                status=0x104, datetime=1400000000.0)
+    elif kind == "update":
+        return ft.event.UpdateStatus(obj=uut,
+                message="INFO: Finishing test setup.")
+    elif kind == "result":
+        return ft.event.CommandResult(obj=uut,
+                command_id=16, command_address=uut.address,
+                result=[("Test {0}".format(i), 0x004, "") for i in range(32)],
+                message="")
+    raise ValueError(kind)
+
+class EventPickleBenchmark(Benchmark):
+
+    name = "event_pickle"
+
+    def setup(self):
+        self.event = get_event(self.parameter)
+
+    def run(self, count):
+        event = self.event
+        for i in xrange(count):
+            pickle.loads(pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+
+class EventBenchmark(Benchmark):
+
+    name = "event_create"
+
+    def setup(self):
+        self.obj = _Object((((None, 3), "SN00012345"), 7))
+
+    def run(self, count):
+        obj = self.obj
+        for i in xrange(count):
+            ft.event.TestEvent(obj=obj, status=0x104, datetime=1400000000.0)
+
+class _Handler(object):
+
+    def notify(self, event):
+        pass
+
+class RegistryBenchmark(Benchmark):
+
+    name = "registry_fire"
+
+    def setup(self):
+        self.registry = EventHandlerRegistry()
+        for i in range(self.parameter):
+            self.registry.register_handler(_Handler())
+        self.event = get_event("status")
+
+    def run(self, count):
+        fire = self.registry.fire
+        event = self.event
+        for i in xrange(count):
+            fire(event)
+
+class _Platform(object):
+
+    options = None
+
+    def fire(self, event, **kwargs):
+        pass
+
+class _Recipient(Commandable):
+
+    recipient_type = RecipientType.SLOT
+
+    def __init__(self, address):
+        self.lock = RWLock()
+        self.address = address
+        self.condition = threading.Condition()
+        self.completed = 0
+        address_registry.register(self)
+
+    def fire(self, event, **kwargs):
+        pass
+
+    class CommandsSync:
+        @staticmethod
+        @query
+        def acknowledge(recipient, data):
+            return data, ""
+
+    class CommandsAsync:
+        @staticmethod
+        def acknowledge(recipient, data):
+            with recipient.condition:
+                recipient.completed += 1
+                recipient.condition.notify()
+
+## Encoded sync commands, as received by the server, run to completion.
+#
+class CommandBenchmark(Benchmark):
+
+    name = "command_sync"
+
+    def setup(self):
+        self.command = Command(_Platform())
+        self.recipient = _Recipient(("benchmark", 0))
+
+    def run(self, count):
+        command = CommandRecord("acknowledge", RecipientType.SLOT,
+                self.recipient.address, "data").encode()
+        run_command = self.command.run_command
+        for i in xrange(count):
+            run_command(command)
+
+    def teardown(self):
+        self.command.executor.shutdown()
+        address_registry.unregister(self.recipient)
+
+## Async commands queued to one recipient and run by the executor; timed
+#  until the last one has finished.
+#
+class AsyncCommandBenchmark(CommandBenchmark):
+
+    name = "command_async"
+
+    def run(self, count):
+        recipient = self.recipient
+        recipient.completed = 0
+        run_command = self.command.run_command
+        for i in xrange(count):
+            # distinct data, or the executor drops the duplicates
+            run_command(CommandRecord("acknowledge", RecipientType.SLOT,
+                recipient.address, i, Mode.ASYNC).encode())
+        with recipient.condition:
+            while recipient.completed < count:
+                recipient.condition.wait(1)
+
+## Return the benchmarks to run.
+#
+#  @param names Only the benchmarks with these names, or all of them.
+#
+def get_benchmarks(sizes=DEFAULT_SIZES, handlers=DEFAULT_HANDLERS,
+        names=None):
+    benchmarks = list()
+    benchmarks.extend(HeaderBenchmark(size) for size in sizes)
+    benchmarks.extend(DataSocketBenchmark(size) for size in sizes)
+    benchmarks.extend(ObjectSocketBenchmark(kind) for kind in EVENT_TYPES)
+    benchmarks.extend(EventPickleBenchmark(kind) for kind in EVENT_TYPES)
+    benchmarks.append(EventBenchmark())
+    benchmarks.extend(RegistryBenchmark(n) for n in handlers)
+    benchmarks.append(CommandBenchmark())
+    benchmarks.append(AsyncCommandBenchmark())
+    if names:
+        benchmarks = [b for b in benchmarks if b.name in names]
+    return benchmarks
+
+## Run "benchmark" and return its metrics.
+#
+def measure(benchmark, count=10000, repeat=5):
+    count = benchmark.get_count(count)
+    times = list()
+    benchmark.setup()
+    try:
+        # warm up caches, lazily created threads...
+        benchmark.run(min(count, 100))
+        for i in range(repeat):
+            start = timeit.default_timer()
+            benchmark.run(count)
+            times.append((timeit.default_timer() - start) / count)
+    finally:
+        benchmark.teardown()
+
+    times.sort()
+    median = get_percentile(times, 0.5)
+    name = benchmark.get_name()
+    return {
+            name + ".ops_per_second": 1.0 / median,
+            name + ".us_per_op": median * 1e6,
+            name + ".us_per_op_min": times[0] * 1e6,
+            name + ".us_per_op_max": times[-1] * 1e6,
+            }
+
+## Run the microbenchmarks and return their result; see benchmark.results.
+#
+def run(count=10000, repeat=5, sizes=DEFAULT_SIZES,
+        handlers=DEFAULT_HANDLERS, names=None):
+    metrics = dict()
+    for benchmark in get_benchmarks(sizes, handlers, names):
+        metrics.update(measure(benchmark, count, repeat))
+    config = {
+            "count": count,
+            "repeat": repeat,
+            "sizes": list(sizes),
+            "handlers": list(handlers),
+            "names": sorted(names) if names else None,
+            }
+    return make_result("micro", config, metrics)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package results
+#
+#  Summaries, process usage, and saving and comparing benchmark results.
+#
+#  A metric counts as a regression when it is worse than the baseline by more
+#  than the threshold, as a fraction of the baseline. Throughput metrics,
+#  named "*_per_hour" or "*_per_second", are better when higher; everything
+#  else (latencies, CPU time, memory) is better when lower.
+#
+
+import os, time, json, math, resource, subprocess
+
+HIGHER_IS_BETTER = ("_per_hour", "_per_second")
+
+## Return the "p" (0 to 1) percentile of the sorted list "values".
+#
+def get_percentile(values, p):
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(p * len(values))))
+    return values[rank - 1]
+
+## Return count, mean, min, max and p50/p95/p99 of "samples".
+#
+def get_summary(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+            "count": len(values),
+            "mean": sum(values) / float(len(values)),
+            "min": values[0],
+            "max": values[-1],
+            "p50": get_percentile(values, 0.50),
+            "p95": get_percentile(values, 0.95),
+            "p99": get_percentile(values, 0.99),
+            }
+
+## Add the entries of "summary" to "metrics" as "<prefix>.<entry>".
+#
+def add_summary(metrics, prefix, summary):
+    for key, value in summary.items():
+        if value is not None:
+            metrics["{0}.{1}".format(prefix, key)] = value
+
+## Return the CPU time and peak resident set size of the calling process.
+#
+def get_process_usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+            # kilobytes on Linux
+            "max_rss_kb": usage.ru_maxrss,
+            }
+
+## Return the commit checked out at "directory", or None outside git.
+#
+def get_commit(directory=None):
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "-C", directory,
+                "rev-parse", "HEAD"], stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+## Return a result dictionary for "suite".
+#
+def make_result(suite, config, metrics, details=None):
+    return {
+            "suite": suite,
+            "commit": get_commit(),
+            "time": time.time(),
+            "config": config,
+            "metrics": metrics,
+            "details": details or {},
+            }
+
+def save(result, file_path):
+    with open(file_path, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def load(file_path):
+    with open(file_path) as f:
+        return json.load(f)
+
+def is_higher_better(name):
+    return name.endswith(HIGHER_IS_BETTER)
+
+## Compare the metrics of two results.
+#
+#  @return A list of (name, baseline, current, change, regressed) for every
+#  metric found in both, where "change" is relative to the baseline.
+#
+def compare(baseline, current, threshold=0.05):
+    comparison = list()
+    base_metrics = baseline["metrics"]
+    current_metrics = current["metrics"]
+    for name in sorted(set(base_metrics) & set(current_metrics)):
+        base = base_metrics[name]
+        value = current_metrics[name]
+        if not isinstance(base, (int, long, float)) or not base:
+            continue
+        change = (value - base) / float(abs(base))
+        if is_higher_better(name):
+            regressed = change < -threshold
+        else:
+            regressed = change > threshold
+        comparison.append((name, base, value, change, regressed))
+    return comparison
+
+## Return "comparison" as lines of text, regressions marked with "!".
+#
+def format_comparison(comparison):
+    lines = list()
+    width = max([len(entry[0]) for entry in comparison] + [6])
+    for name, base, value, change, regressed in comparison:
+        lines.append("{0} {1:<{width}} {2:>14.6g} {3:>14.6g} {4:>+8.1%}".format(
+            "!" if regressed else " ", name, base, value, change,
+            width=width))
+    return "\n".join(lines)
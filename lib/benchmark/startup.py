@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package startup
+#
+#  Startup time of the entry points. The imports of every entry point run
+#  "repeat" times, each in a fresh interpreter, reporting under
+#  "import.<entry>" the median seconds and the number of modules loaded:
+#
+#    server   what pytest.py --server-only loads before the platform exists
+#    platform the platform, loaded by the server when it creates it
+#    client   the connection of a UI client, without GTK
+#    target   bin/xmlrpcserver.py on the UUT, until it listens
+#    command  ft.command and ft.event, used by every process
+#
+#  "server_ready_seconds" is the time from starting pytest.py --server-only
+#  on a fixture platform until it answers a command: what restarting a
+#  server between shifts takes.
+#
+
+import os, os.path as path, sys, json, socket, subprocess, tempfile, shutil
+import time
+
+from ft.command import RecipientType
+from benchmark import fixture
+from benchmark.client import BenchmarkClient
+from benchmark.results import (
+        get_percentile,
+        get_summary,
+        add_summary,
+        make_result,
+        )
+
+libdir = path.dirname(path.dirname(path.abspath(__file__)))
+topdir = path.dirname(libdir)
+bindir = path.join(topdir, "bin")
+extdir = path.join(topdir, "ext")
+
+ENTRY_POINTS = {
+        "server": ["ft.server.sockets", "telemetry.logs"],
+        "platform": ["ft.server.sockets", "ft.platform"],
+        "client": ["ft.server.sockets"],
+        "target": ["interfaces.xmlrpc", "SimpleXMLRPCServer"],
+        "command": ["ft.command", "ft.event"],
+        }
+
+_IMPORT_SCRIPT = """
+import sys, time, json
+start = time.time()
+sys.path[0:0] = {0!r}
+for name in {1!r}:
+    __import__(name)
+json.dump({{"seconds": time.time() - start, "modules": len([module
+    for module in sys.modules.values() if module is not None])}}, sys.stdout)
+"""
+
+## Import "modules" in a fresh interpreter and return the seconds it took
+#  and the number of modules loaded.
+#
+def measure_imports(modules):
+    output = subprocess.check_output([sys.executable, "-c",
+        _IMPORT_SCRIPT.format([extdir, libdir], list(modules))])
+    report = json.loads(output)
+    return report["seconds"], report["modules"]
+
+def _get_free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def _wait(process, timeout):
+    deadline = time.time() + timeout
+    while process.poll() is None and time.time() < deadline:
+        time.sleep(0.01)
+    return process.poll() is not None
+
+## Start pytest.py --server-only on "manifest_file" and return the seconds
+#  until it answered a command.
+#
+def measure_server_ready(work_dir, manifest_file, timeout=60):
+    port = _get_free_port()
+    command = [sys.executable, path.join(bindir, "pytest.py"),
+            "--server-only",
+            "--platform-manifest", manifest_file,
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--log-file", path.join(work_dir, "pytest_log"),
+            "--journal-dir", path.join(work_dir, "journal"),
+            "--console-dir", path.join(work_dir, "console"),
+            "--measurement-dir", path.join(work_dir, "measurements"),
+            ]
+    with open(os.devnull, "w") as devnull:
+        with open(path.join(work_dir, "server.err"), "a") as errors:
+            start = time.time()
+            process = subprocess.Popen(command, cwd=work_dir,
+                    stdin=devnull, stdout=devnull, stderr=errors)
+    try:
+        client = BenchmarkClient(("127.0.0.1", port), timeout)
+        try:
+            if client.call("acknowledge", RecipientType.PLATFORM,
+                    None) is None:
+                raise RuntimeError("The server did not answer")
+            ready = time.time() - start
+        finally:
+            client.terminate()
+        _wait(process, timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    return ready
+
+class StartupBenchmark(object):
+
+    ## @param repeat Fresh interpreters started for every measurement; the
+    #  median is reported.
+    #  @param server Also measure server_ready_seconds.
+    #
+    def __init__(self, repeat=5, entry_points=None, server=True,
+            timeout=60):
+        self.repeat = repeat
+        self.entry_points = sorted(entry_points or ENTRY_POINTS)
+        self.server = server
+        self.timeout = timeout
+
+    def get_config(self):
+        return {
+                "repeat": self.repeat,
+                "entry_points": self.entry_points,
+                "server": self.server,
+                }
+
+    ## Run the benchmark and return its result; see benchmark.results.
+    #
+    def run(self):
+        metrics = dict()
+        for entry_point in self.entry_points:
+            samples = [measure_imports(ENTRY_POINTS[entry_point])
+                    for i in range(self.repeat)]
+            times = sorted(seconds for seconds, modules in samples)
+            prefix = "import.{0}.".format(entry_point)
+            metrics[prefix + "seconds"] = get_percentile(times, 0.5)
+            metrics[prefix + "modules"] = max(modules
+                    for seconds, modules in samples)
+
+        if self.server:
+            work_dir = tempfile.mkdtemp(prefix="ft-startup-")
+            try:
+                manifest_file = fixture.create_metadata(work_dir,
+                        {"serial": os.devnull, "baud": 9600}, [])
+                add_summary(metrics, "server_ready_seconds", get_summary(
+                    [measure_server_ready(work_dir, manifest_file,
+                        self.timeout) for i in range(self.repeat)]))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        return make_result("startup", self.get_config(), metrics)
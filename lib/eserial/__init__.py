@@ -1,6 +1,7 @@
 import inspect
 
 from eserial import *
+from capture import *
 
 __all__ = [ name for name, obj in locals().items()
 			if not (name.startswith('_') or inspect.ismodule(obj)) ]
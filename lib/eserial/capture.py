@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package capture
+#
+#  Console capture. Everything read from a UUT's serial console is kept per
+#  serial number, as gzip compressed segments and a small text index:
+#
+#    <directory>/<serial number>/000001.gz
+#    <directory>/<serial number>/index
+#
+#  Every index line is "<time> <segment> <offset> <label>": the output read at
+#  that time starts at that uncompressed offset of the segment. An entry is
+#  added when a segment starts, at most every INDEX_INTERVAL seconds while
+#  output arrives, and for every mark(), such as the start of a UUT stage or
+#  a test, so that ConsoleReader finds them without decompressing more than
+#  one segment.
+#
+#  ConsoleCapture.write() only queues the output; a single writer thread
+#  compresses and writes it for all captures, so the expect path never waits
+#  for the disk. Segments are sync-flushed after every batch and can be read
+#  while they are written, or after a crash.
+#
+#  CaptureStore keeps a directory of captures within a size and an age limit,
+#  removing the least recently written ones first.
+#
+
+import os, os.path as path, re, time, gzip, zlib, shutil, threading
+import collections, logging
+
+__all__ = [
+        "ConsoleCapture",
+        "ConsoleReader",
+        "CaptureStore",
+        "set_capture_dir",
+        "get_capture",
+        "get_capture_reader",
+        ]
+
+log = logging.getLogger(__name__)
+
+SEGMENT_BYTES = 1024 * 1024
+INDEX_INTERVAL = 1.0
+INDEX_NAME = "index"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]+", "_", str(name)) or "_"
+
+def _get_segment_name(segment):
+    return "{0:06d}.gz".format(segment)
+
+def _get_segments(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(int(name[:-3]) for name in names
+            if re.match(r"^\d+\.gz$", name))
+
+## Thread running the queued operations of every ConsoleCapture.
+#
+class _Writer(object):
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.condition = threading.Condition(threading.Lock())
+        self.thread = None
+
+    ## Queue "function(*args)"; "capture" is flushed after the batch the
+    #  operation ran in, and operations without one run after the flushes.
+    #
+    def put(self, capture, function, *args):
+        with self.condition:
+            self.queue.append((capture, function, args))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run,
+                        name="ConsoleWriter")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    def __run(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                items = list(self.queue)
+                self.queue.clear()
+
+            written = list()
+            after = list()
+            for capture, function, args in items:
+                if capture is None:
+                    after.append((function, args))
+                    continue
+                self.__call(capture, function, *args)
+                if not capture in written:
+                    written.append(capture)
+            for capture in written:
+                self.__call(capture, capture._flush)
+            for function, args in after:
+                self.__call(None, function, *args)
+
+    @staticmethod
+    def __call(capture, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            log.exception("Console capture failed: %s",
+                    capture.path if capture else None)
+
+_writer = _Writer()
+
+## Console output of one UUT, written to "directory".
+#
+#  An instance can be given to pexpect as "logfile_read"; see
+#  EnhancedSerial.capture. Reopening the directory of an earlier capture
+#  continues it with a new segment.
+#
+class ConsoleCapture(object):
+
+    def __init__(self, directory, store=None, segment_bytes=SEGMENT_BYTES):
+        self.path = directory
+        self.store = store
+        self.segment_bytes = segment_bytes
+        self.closed = False
+
+        # only used by the writer thread
+        self.segment = None
+        self.file = None
+        self.index = None
+        self.offset = 0
+        self.indexed = 0
+
+    def write(self, data):
+        if data and not self.closed:
+            _writer.put(self, self._write, time.time(), data)
+
+    # output is flushed by the writer
+    def flush(self):
+        pass
+
+    ## Add "label" to the index at the current position.
+    #
+    def mark(self, label):
+        if not self.closed:
+            _writer.put(self, self._mark, time.time(),
+                    " ".join(str(label).split()))
+
+    ## Wait up to "timeout" seconds until everything queued so far is
+    #  written, and return whether it was.
+    #
+    def sync(self, timeout=None):
+        done = threading.Event()
+        _writer.put(None, done.set)
+        done.wait(timeout)
+        return done.is_set()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            _writer.put(self, self._close)
+
+    def _open(self, timestamp):
+        if not path.isdir(self.path):
+            os.makedirs(self.path)
+        self.index = open(path.join(self.path, INDEX_NAME), "ab")
+        segments = _get_segments(self.path)
+        self._start_segment(segments[-1] + 1 if segments else 1, timestamp)
+
+    def _start_segment(self, segment, timestamp):
+        if self.file is not None:
+            self.file.close()
+        self.segment = segment
+        self.file = gzip.GzipFile(path.join(self.path,
+            _get_segment_name(segment)), "wb")
+        self.offset = 0
+        self._index(timestamp, "")
+
+    def _index(self, timestamp, label):
+        self.index.write("{0:.6f} {1} {2} {3}\n".format(timestamp,
+            self.segment, self.offset, label))
+        self.indexed = timestamp
+
+    def _write(self, timestamp, data):
+        if self.file is None:
+            self._open(timestamp)
+        elif self.offset >= self.segment_bytes:
+            self._start_segment(self.segment + 1, timestamp)
+            if self.store:
+                self.store.prune()
+        elif timestamp - self.indexed >= INDEX_INTERVAL:
+            self._index(timestamp, "")
+        self.file.write(data)
+        self.offset += len(data)
+
+    def _mark(self, timestamp, label):
+        if self.file is None:
+            self._open(timestamp)
+        self._index(timestamp, label)
+
+    def _flush(self):
+        if self.file is not None:
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+            self.index.flush()
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.index.close()
+            self.file = self.index = None
+        if self.store:
+            self.store._release(self)
+
+## Reads the capture kept in "directory".
+#
+class ConsoleReader(object):
+
+    def __init__(self, directory):
+        self.path = directory
+
+    ## Return the index as (time, segment, offset, label) tuples; a line cut
+    #  short by a crash is ignored.
+    #
+    def get_entries(self):
+        entries = list()
+        try:
+            f = open(path.join(self.path, INDEX_NAME), "rb")
+        except IOError:
+            return entries
+        with f:
+            for line in f:
+                if not line.endswith("\n"):
+                    continue
+                fields = line[:-1].split(" ", 3)
+                try:
+                    entries.append((float(fields[0]), int(fields[1]),
+                        int(fields[2]), fields[3]))
+                except (ValueError, IndexError):
+                    continue
+        return entries
+
+    ## Return the (time, label) of every mark.
+    #
+    def get_marks(self):
+        return [(entry[0], entry[3]) for entry in self.get_entries()
+                if entry[3]]
+
+    ## Return the output from the last "label" mark up to the next mark.
+    #
+    #  @exception KeyError There is no such mark.
+    #
+    def read_mark(self, label):
+        entries = self.get_entries()
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i][3] == label:
+                break
+        else:
+            raise KeyError(label)
+        end = None
+        for entry in entries[i + 1:]:
+            if entry[3]:
+                end = entry
+                break
+        return self.__read(entries[i], end)
+
+    ## Return the output read between the "start" and "end" times, widened
+    #  to the nearest index entries; None reads from the beginning or to the
+    #  end.
+    #
+    def read(self, start=None, end=None):
+        entries = self.get_entries()
+        if not entries:
+            return ""
+        first = entries[0]
+        if start is not None:
+            for entry in entries:
+                if entry[0] > start:
+                    break
+                first = entry
+        last = None
+        if end is not None:
+            for entry in entries:
+                if entry[0] >= end:
+                    last = entry
+                    break
+        return self.__read(first, last)
+
+    def __read(self, start, end):
+        chunks = list()
+        for segment in _get_segments(self.path):
+            if segment < start[1]:
+                continue
+            if end is not None and segment > end[1]:
+                break
+            data = self.__load(segment)
+            first = start[2] if segment == start[1] else 0
+            last = end[2] if end is not None and segment == end[1] else None
+            chunks.append(data[first:last])
+        return "".join(chunks)
+
+    def __load(self, segment):
+        with open(path.join(self.path, _get_segment_name(segment)),
+                "rb") as f:
+            data = f.read()
+        # also reads a segment still being written, or cut short
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            return decompressor.decompress(data)
+        except zlib.error:
+            log.warning("Corrupt console segment: %s", segment)
+            return ""
+
+## Directory of console captures, one per serial number, kept within
+#  "max_bytes" and "max_age" seconds.
+#
+class CaptureStore(object):
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES,
+            max_age=DEFAULT_MAX_AGE, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.active = collections.defaultdict(int)
+
+    def open(self, name):
+        capture = ConsoleCapture(path.join(self.directory, _safe_name(name)),
+                self, self.segment_bytes)
+        with self.lock:
+            self.active[capture.path] += 1
+        return capture
+
+    def get_reader(self, name):
+        return ConsoleReader(path.join(self.directory, _safe_name(name)))
+
+    def _release(self, capture):
+        with self.lock:
+            self.active[capture.path] -= 1
+            if self.active[capture.path] <= 0:
+                del self.active[capture.path]
+        self.prune()
+
+    ## Remove the captures older than max_age, then the least recently
+    #  written ones until the rest fits in max_bytes. Open captures are
+    #  counted but never removed.
+    #
+    #  @return The directories removed.
+    #
+    def prune(self, now=None):
+        if now is None:
+            now = time.time()
+        with self.lock:
+            active = set(self.active)
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        captures = list()
+        total = 0
+        for name in names:
+            directory = path.join(self.directory, name)
+            if not path.isdir(directory):
+                continue
+            size = 0
+            modified = path.getmtime(directory)
+            for file_name in os.listdir(directory):
+                stat = os.stat(path.join(directory, file_name))
+                size += stat.st_size
+                modified = max(modified, stat.st_mtime)
+            total += size
+            if not directory in active:
+                captures.append((modified, size, directory))
+
+        removed = list()
+        for modified, size, directory in sorted(captures):
+            if (self.max_age is not None and now - modified > self.max_age or
+                    self.max_bytes is not None and total > self.max_bytes):
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= size
+                removed.append(directory)
+        if removed:
+            log.info("Removed %d console capture(s)", len(removed))
+        return removed
+
+_store = None
+
+## Configure where console captures are kept; passing None disables them.
+#
+def set_capture_dir(directory, max_bytes=DEFAULT_MAX_BYTES,
+        max_age=DEFAULT_MAX_AGE):
+    global _store
+    if not directory:
+        _store = None
+        return
+    _store = CaptureStore(directory, max_bytes, max_age)
+    _store.prune()
+
+## Return a new capture of the console of the UUT with the given serial
+#  number, or None if captures are disabled.
+#
+def get_capture(serial_number):
+    if _store is None:
+        return None
+    return _store.open(serial_number)
+
+## Return the reader of the UUT with the given serial number, or None if
+#  captures are disabled.
+#
+def get_capture_reader(serial_number):
+    if _store is None:
+        return None
+    return _store.get_reader(serial_number)
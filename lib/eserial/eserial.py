@@ -8,9 +8,14 @@
 #  GPLv2
 #
 
-import pprint, threading, re, traceback, logging, os, termios
+import pprint, threading, re, traceback, logging, os, termios, time
 
-import serial, fdpexpect
+import serial, fdpexpect, pexpect
+
+## Longest time spent in a single expect() call while a cancellation token is
+#  in use; bounds how long a cancelled read keeps the serial port.
+#
+EXPECT_SLICE = 0.5
 
 ## Use regex to determine whether or a match exists in the given string list. 
 #
@@ -27,12 +32,21 @@ class EnhancedSerial():
     def __init__(self, serial_port, baud_rate, *args, **kwargs):
         self.serial_port = serial_port
         self.baud_rate = baud_rate
+        ## Optional capture.ConsoleCapture receiving everything read_until
+        #  reads from the port.
+        self.capture = None
 
     class fdpexpect:
-        lock = threading.Lock()
+        # One lock per serial port, so that slots on different ports do not
+        # wait for each other.
+        locks = {}
+        locks_lock = threading.Lock()
 
         def __init__(self, serial_port, baud_rate):
             self.serial_port = serial_port
+            with self.locks_lock:
+                self.lock = self.locks.setdefault(serial_port,
+                        threading.Lock())
             
             baud_rate = "B" + str(baud_rate)
             if hasattr(termios, baud_rate):
@@ -42,22 +56,29 @@ class EnhancedSerial():
 
         def __enter__(self):
             self.lock.acquire()
-            self.fd = os.open(self.serial_port, os.O_RDWR|os.O_NONBLOCK|os.O_NOCTTY)
-            attr_list = termios.tcgetattr(self.fd)
-            attr_list[1] &= ~termios.ONLCR
-            attr_list[3] &= ~termios.ECHO
-            attr_list[3] &= ~termios.ICANON
-            attr_list[4] = self.baud_rate
-            attr_list[5] = self.baud_rate
-            attr_list[6][termios.VTIME] = 5
-            termios.tcsetattr(self.fd, termios.TCSAFLUSH, attr_list)
+            try:
+                self.fd = os.open(self.serial_port,
+                        os.O_RDWR|os.O_NONBLOCK|os.O_NOCTTY)
+                attr_list = termios.tcgetattr(self.fd)
+                attr_list[1] &= ~termios.ONLCR
+                attr_list[3] &= ~termios.ECHO
+                attr_list[3] &= ~termios.ICANON
+                attr_list[4] = self.baud_rate
+                attr_list[5] = self.baud_rate
+                attr_list[6][termios.VTIME] = 5
+                termios.tcsetattr(self.fd, termios.TCSAFLUSH, attr_list)
+            except:
+                self.lock.release()
+                raise
             
             return fdpexpect.fdspawn(self.fd)
 
         def __exit__(self, type, value, traceback):
-            os.close(self.fd)
-            self.lock.release()
-            return True
+            try:
+                os.close(self.fd)
+            finally:
+                self.lock.release()
+            return False
 
     def setup(self):
         self.fd = os.open(self.serial_port, os.O_RDWR|os.O_NONBLOCK|os.O_NOCTTY)
@@ -82,18 +103,20 @@ class EnhancedSerial():
     #   a line in the unread buffer.
     #  @param debug Currently unused. Kept for backwards compatibility with old
     #   EnhancedSerial class.
+    #  @param token Optional; cancellation token whose check() method is called
+    #   between expect() slices of at most EXPECT_SLICE seconds and raises to
+    #   abandon the read.
     #
-    def read_until(self, regex, command=None, timeout=10, debug=False):
+    def read_until(self, regex, command=None, timeout=10, debug=False,
+            token=None):
         with self.fdpexpect(self.serial_port, self.baud_rate) as m:
-            if not command:
-                result = m.expect(regex, timeout)
-                return result
-    
+            m.logfile_read = self.capture
             try:
                 if debug:
                     print("regex: " + str(regex))
-                m.send(command)
-                result = m.expect(regex, timeout)
+                if command:
+                    m.send(command)
+                result = self.expect(m, regex, timeout, token)
                 if debug:
                     print("result: " + str(result))
                     print("-c-")
@@ -102,7 +125,7 @@ class EnhancedSerial():
                     print(m.before)
                     print("-a-")
                     print(m.after)
-            except fdpexpect.TIMEOUT:
+            except pexpect.TIMEOUT:
                 if debug:
                     print("-c-")
                     print(command)
@@ -111,12 +134,30 @@ class EnhancedSerial():
                     print("-a-")
                     print(m.after)
                 return False, m.before
-            except fdpexpect.EOF:
+            except pexpect.EOF:
                 return False, m.before
             
             if result == 0:
                 return True, m.before
 
+    ## Run m.expect() for up to "timeout" seconds, in slices when a
+    #  cancellation token is given so that it is checked regularly.
+    #
+    @staticmethod
+    def expect(m, regex, timeout, token=None):
+        if token is None or timeout is None:
+            return m.expect(regex, timeout)
+
+        deadline = time.time() + timeout
+        while True:
+            token.check()
+            remaining = deadline - time.time()
+            try:
+                return m.expect(regex, max(0, min(EXPECT_SLICE, remaining)))
+            except pexpect.TIMEOUT:
+                if remaining <= EXPECT_SLICE:
+                    raise
+
 class OldEnhancedSerial(serial.Serial,):
     def __init__(self, *args, **kwargs):
         #ensure that a reasonable timeout is set
@@ -1,29 +1,21 @@
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy import create_engine
+## @package ft
+#
+#  Subpackages and the ORM names are imported on first access, so that
+#  importing a light module such as ft.event or ft.command does not load
+#  sqlalchemy, GitPython and the interfaces; see telemetry.imports.
+#
 
-session_factory = sessionmaker()
-LogDBSession = scoped_session(session_factory)
-Base = declarative_base()
+from telemetry.imports import lazy_package
 
-def setup_logdb_engine(*args):
-    engine = create_engine(*args)
-    session_factory.configure(bind=engine)
+lazy_package(__name__, {
+        "test": "ft.test",
+        "platform": "ft.platform",
+        "device": "ft.device",
+        "unittest": "ft.unittest",
+        "event": "ft.event",
 
-import test
-import platform
-import device
-import unittest
-import event
-
-__all__ = [
-        test,
-        platform,
-        device,
-        unittest,
-        event,
-
-        Base,
-        LogDBSession,
-        setup_logdb_engine,
-        ]
+        "Base": "ft.orm:Base",
+        "LogDBSession": "ft.orm:LogDBSession",
+        "session_factory": "ft.orm:session_factory",
+        "setup_logdb_engine": "ft.orm:setup_logdb_engine",
+        })
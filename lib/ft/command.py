@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
 
-import logging, threading, os, os.path as path
+import logging, threading, os, os.path as path, time, collections, weakref
 
 import ft.event
+from ft.util.locker import OperationToken, OperationCancelled
+from telemetry import metrics
+
+log = logging.getLogger(__name__)
 
 class RecipientType:
     PLATFORM = "platform"
@@ -12,6 +16,166 @@ class RecipientType:
     TEST = "test"
     ACTION = "action"
 
+## Wire values of the recipient types; append only.
+#
+RECIPIENT_TYPES = (
+        RecipientType.PLATFORM,
+        RecipientType.SLOT,
+        RecipientType.UUT,
+        RecipientType.TEST,
+        RecipientType.ACTION,
+        )
+
+## Wire values of the command names; the index of a name is its command ID.
+#  Append only, since IDs must stay stable between client and server.
+#
+COMMAND_NAMES = (
+        "acknowledge",
+        "is_setup",
+        "get_manifest",
+        "select_platform",
+        "set_platform_version",
+        "configure",
+        "select_product",
+        "set_product_version",
+        "set_product_specification",
+        "set_uut",
+        "clear_uut",
+        "power_up",
+        "power_down",
+        "nfs_test_boot",
+        "nfs_full_boot",
+        "onboard_flash_boot",
+        "run_all_tests",
+        "run_all_modes",
+        "load_bootloader",
+        "load_kfs",
+        "log_data",
+        "remove",
+        "run",
+        "set_pass",
+        "set_fail",
+        "abort",
+        "get_metrics",
+        )
+
+COMMAND_IDS = dict((name, i) for i, name in enumerate(COMMAND_NAMES))
+
+## How a command is run and its result returned.
+#
+#  SYNC runs the command in the server thread and returns its result; ASYNC
+#  queues it and returns immediately; STREAM queues it like ASYNC and fires
+#  a CommandResult event once it has finished.
+#
+class Mode:
+    SYNC    = 0
+    ASYNC   = 1
+    STREAM  = 2
+
+## Version 2 command.
+#
+#  Addresses a command to one or more recipients of the same type, so that for
+#  instance a single record can power up every slot. On the wire, clients of
+#  both the socket and the process server send the encode()d form: a tuple of
+#  small integers followed by the addresses and data.
+#
+class CommandRecord(object):
+
+    VERSION = 2
+
+    __slots__ = ("command_id", "recipient_type", "addresses", "data", "mode")
+
+    ## @param command Command name or ID.
+    #  @param recipient_type RecipientType value or its index.
+    #  @param addresses Address of the recipient or a list of addresses.
+    #  @param data Data passed to the command method.
+    #  @param mode One of the Mode values.
+    #
+    def __init__(self, command, recipient_type, addresses, data=None,
+            mode=Mode.SYNC):
+        if not isinstance(command, int):
+            if not COMMAND_IDS.has_key(command):
+                raise CommandError(command)
+            command = COMMAND_IDS[command]
+        if not isinstance(recipient_type, int):
+            recipient_type = RECIPIENT_TYPES.index(recipient_type)
+        if not isinstance(addresses, list):
+            addresses = [addresses]
+
+        self.command_id = command
+        self.recipient_type = recipient_type
+        self.addresses = addresses
+        self.data = data
+        self.mode = mode
+
+    def __reduce__(self):
+        return (CommandRecord, self.encode()[1:])
+
+    def encode(self):
+        return (CommandRecord.VERSION, self.command_id, self.recipient_type,
+                self.addresses, self.data, self.mode)
+
+    @staticmethod
+    def decode(encoded):
+        return CommandRecord(*encoded[1:])
+
+    @staticmethod
+    def is_encoded(command):
+        return (isinstance(command, tuple) and len(command) == 6 and
+                command[0] == CommandRecord.VERSION)
+
+    def __repr__(self):
+        return "<CommandRecord({0}, {1}, {2}, {3!r}, {4})>".format(self.name,
+                RECIPIENT_TYPES[self.recipient_type], self.addresses,
+                self.data, self.mode)
+
+    @property
+    def name(self):
+        return COMMAND_NAMES[self.command_id]
+
+    ## Return the version 1 5-tuple addressed to "address".
+    #
+    def to_tuple(self, address):
+        return (self.name, RECIPIENT_TYPES[self.recipient_type], address,
+                self.data, self.mode == Mode.SYNC)
+
+## Index of live Platform objects by address.
+#
+#  Platform, PlatformSlot, UnitUnderTest, Test and Action objects register
+#  themselves whenever their address is set. Entries are weak references, so
+#  objects that are garbage collected drop out of the index automatically;
+#  destroyed objects unregister explicitly.
+#
+class AddressRegistry(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.__objects = weakref.WeakValueDictionary()
+
+    def register(self, obj):
+        with self.lock:
+            self.__objects[obj.address] = obj
+
+    ## Remove "obj" from the index unless its address has since been taken
+    #  over by another object.
+    #
+    def unregister(self, obj):
+        with self.lock:
+            if self.__objects.get(obj.address) is obj:
+                del self.__objects[obj.address]
+
+    ## Return the object at "address" or None.
+    #
+    def get(self, address):
+        with self.lock:
+            return self.__objects.get(address)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.__objects)
+
+address_registry = AddressRegistry()
+
 class Command(object):
 
     ( ADDRESS,
@@ -27,37 +191,106 @@ class Command(object):
     def __init__(self, platform):
         self.platform = platform
         self.options = platform.options
-
-    ## Runs the specified command; depending on how many values are in the
-    #  tuple, run the old or the new version of the run_command method.
+        self.executor = CommandExecutor(
+                getattr(self.options, "command_workers", 32), self.options)
+        for stat in ("queue_depth", "running", "workers"):
+            metrics.registry.function_gauge("ft_command_" + stat,
+                    self.__get_executor_stat(stat))
+
+    def __get_executor_stat(self, stat):
+        executor = weakref.ref(self.executor)
+        def get():
+            if executor() is None:
+                return None
+            return executor().get_stats()[stat]
+        return get
+
+    ## Runs the specified command; CommandRecords are run as version 2
+    #  commands, tuples depending on how many values they contain.
     #
-    #  @param command Currently either a 3- or 5- tuple containing important
-    #  command information.
+    #  @param command A CommandRecord or its encoded form, or a 3- or 5- tuple
+    #  containing important command information.
     #
     def run_command(self, command):
-        if len(command) == 3:
+        if CommandRecord.is_encoded(command):
+            return self.__run_command_record(CommandRecord.decode(command))
+        elif isinstance(command, CommandRecord):
+            return self.__run_command_record(command)
+        elif len(command) == 3:
             return self.__run_command_v2(command)
         elif len(command) == 5:
             return self.__run_command_v1(command)
 
+    ## Run a command of the form (address, recipient_type, (name, data,
+    #  synchronous)).
+    #
     def __run_command_v2(self, command):
-        raise NotImplementedError
+        message = command[Command.MESSAGE]
+        if message[Command.SYNCHRONOUS]:
+            mode = Mode.SYNC
+        else:
+            mode = Mode.ASYNC
+        try:
+            record = CommandRecord(message[Command.NAME],
+                    command[Command.RECIPIENT_TYPE], command[Command.ADDRESS],
+                    message[Command.DATA], mode)
+        except (CommandError, ValueError) as e:
+            return False, "ERROR: {0}".format(e)
+        return self.__run_command_record(record)
+
+    ## Run "record" for each of its addresses. Commands with a single address
+    #  return the recipient's result; bulk commands return the list of results
+    #  in address order.
+    #
+    def __run_command_record(self, record):
+        results = list()
+        for address in record.addresses:
+            command = record.to_tuple(address)
+            check = self.__get_recipient(command)
+            if not check[0]:
+                results.append(check)
+                continue
+
+            callback = None
+            if record.mode == Mode.STREAM:
+                callback = self.__get_stream_callback(check[1], record,
+                        address)
+            results.append(self.__dispatch(check[1], command, callback))
+
+        if len(results) == 1:
+            return results[0]
+        return results, ""
+
+    def __get_stream_callback(self, recipient, record, address):
+        def callback(result):
+            if not isinstance(result, tuple):
+                result = (result, "")
+            recipient.fire(ft.event.CommandResult,
+                    obj = recipient,
+                    command_id = record.command_id,
+                    command_address = address,
+                    result = result[0],
+                    message = result[1],
+                    )
+        return callback
 
     def __run_command_v1(self, command):
-        command_name = command[0]
-        command_is_synchronous = command[4]
-
         check = self.__get_recipient(command)
         if not check[0]:
             return check
-        recipient = check[1]
+        return self.__dispatch(check[1], command)
+
+    def __dispatch(self, recipient, command, callback=None):
+        command_is_synchronous = command[4]
+        metrics.registry.counter("ft_commands_total", command=command[0],
+                mode="sync" if command_is_synchronous else "async").inc()
 
         try:
             if command_is_synchronous:
-                return recipient.run_command(command)
+                with metrics.timer("ft_command_seconds", command=command[0]):
+                    return recipient.run_command(command)
             else:
-                cw = CommandWorker(recipient, command, self.options)
-                cw.start()
+                self.executor.submit(recipient, command, callback)
         except:
             import traceback
             error = traceback.format_exc()
@@ -65,72 +298,23 @@ class Command(object):
                     obj = self.platform,
                     traceback = error,
                     )
-            logging.debug(error)
+            log.debug("%s", error)
             return None, error
 
         return None, ""
 
+    ## Get recipient from the address registry.
+    #
     def __get_recipient(self, command):
-        return self.__get_recipient_v0(command)
-        #return self.__get_recipient_v1(command)
-
-    address_index = 2
-    ## Get recipient without depending on a specific RecipientType.
-    #
-    def __get_recipient_v1(self, command):
-        def get_object_by_address(tpl):
-            parent_address = tpl[0]
-            object_index = tpl[1]
-            if isinstance(parent_address, tuple):
-                parent = get_parent(tpl)
-                return parent.get_subordinate(object_index)
-            else:
-                return platform
-
-        object_address = command[self.address_index]
-        try:
-            obj = get_object_by_address(object_address)
-            return True, obj
-        except IndexError, KeyError:
-            msg = "ERROR: recipient '{0}:{1}' does not exist".format(
-                    recipient_type, recipient_address)
-        except Exception:
-            import traceback
-            msg = traceback.format_exc()
-        else:
-            msg = "ERROR: invalid recipient type '{0}'".format( recipient_type)
+        recipient_type = command[1]
+        recipient_address = command[2]
 
-        return False, msg
-                
-    ## Get recipient by checking the given RecipientType value.
-    #
-    def __get_recipient_v0(self, command):
-        try: 
-            recipient_type = command[1]
-            recipient_address = command[2]
-            if recipient_type == RecipientType.PLATFORM:
-                recipient = self.platform
-            else:
-                recipient_index = recipient_address[1]
-                if recipient_type == RecipientType.SLOT:
-                    recipient = self.platform.slots[recipient_index]
-                elif recipient_type == RecipientType.UUT:
-                    recipient = self.platform.uuts[recipient_index]
-                elif recipient_type == RecipientType.TEST:
-                    uut_index = recipient_address[0][1]
-                    recipient = self.platform.uuts[uut_index].\
-                            tests[recipient_index]
-                elif recipient_type == RecipientType.ACTION:
-                    uut_index = recipient_address[0][0][1]
-                    test_index = recipient_address[0][1]
-                    recipient = self.platform.uuts[uut_index].\
-                            tests[test_index].actions[recipient_index]
-        except IndexError, KeyError:
+        recipient = address_registry.get(recipient_address)
+        if recipient is None:
             msg = "ERROR: recipient '{0}:{1}' does not exist".format(
                     recipient_type, recipient_address)
-        except Exception:
-            import traceback
-            msg = traceback.format_exc()
+        elif getattr(recipient, "recipient_type", None) != recipient_type:
+            msg = "ERROR: invalid recipient type '{0}'".format(recipient_type)
         else:
             return True, recipient
 
@@ -141,86 +325,282 @@ class Command(object):
 
         return False, msg
 
-## Desperate attempt to work around a bug in the initial async command stuff.
+## Whether the handler of "command" is marked ft.util.locker.idempotent.
 #
-class CommandWorker(threading.Thread):
+def _is_idempotent(recipient, command):
+    command_method = getattr(recipient.CommandsAsync, command[0], None)
+    return getattr(command_method, "idempotent", False)
 
-    def __init__(self, obj, command, options=None):
-        if obj.address:
-            thread_name = obj.address[1]
-        else:
-            thread_name = type(obj).__name__
+## A queued asynchronous command.
+#
+class _QueuedCommand(object):
 
-        super(CommandWorker, self).__init__(name=thread_name)
+    def __init__(self, recipient, command, callback=None):
+        self.recipient = recipient
+        self.command = command
+        self.callback = callback
+        self.queued = time.time()
 
-        self.options = options
+    def is_duplicate(self, command):
+        return (self.command[0] == command[0] and
+                self.command[3] == command[3])
 
-        self.obj = obj
-        self.command = command
+## Runs asynchronous commands on a bounded pool of worker threads.
+#
+#  Every recipient has its own FIFO queue and at most one of its commands runs
+#  at a time, so commands sent to a busy UUT wait in its queue instead of
+#  occupying a thread blocked on the UUT's lock. Recipients with pending
+#  commands are served round-robin. An idempotent command identical to the
+#  last one queued for the same recipient (same name and data), or to the one
+#  running when nothing is queued, is dropped; anything else is queued so the
+#  recipient sees commands in the order sent.
+#
+class CommandExecutor(object):
 
-    def run(self):
-        obj = self.obj
-        obj.lock.acquire()
+    def __init__(self, max_workers=32, options=None):
+        self.max_workers = max_workers
+        self.options = options
 
-        command_name = self.command[0]
-        command_data = self.command[3]
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+        self.__queues = dict()
+        self.__running = dict()
+        self.__ready = collections.deque()
+        self.__workers = list()
+        self.__idle = 0
+        self.__shutdown = False
+
+        self.__stats = {
+                "submitted": 0,
+                "deduplicated": 0,
+                "completed": 0,
+                "max_queue_depth": 0,
+                "total_wait": 0.0,
+                "max_wait": 0.0,
+                }
+
+    ## Queue "command" for "recipient".
+    #
+    #  @param callback Called with the command's result once it has run.
+    #
+    #  @return True if the command was queued, False if it is idempotent and
+    #  duplicates the last command queued, or running, for the recipient.
+    #
+    def submit(self, recipient, command, callback=None):
+        with self.lock:
+            if self.__shutdown:
+                raise CommandError(command[0])
+            key = id(recipient)
+            queue = self.__queues.setdefault(key, collections.deque())
+            running = self.__running.get(key)
+            last = queue[-1] if queue else running
+            if (last is not None and last.is_duplicate(command) and
+                    _is_idempotent(recipient, command)):
+                self.__stats["deduplicated"] += 1
+                log.debug("Dropping duplicate command: %s", command[0])
+                return False
+
+            queue.append(_QueuedCommand(recipient, command, callback))
+            if len(queue) == 1 and running is None:
+                self.__ready.append(key)
+
+            self.__stats["submitted"] += 1
+            self.__stats["max_queue_depth"] = max(
+                    self.__stats["max_queue_depth"], self.__get_queue_depth())
+
+            if self.__idle == 0 and len(self.__workers) < self.max_workers:
+                self.__start_worker()
+            self.condition.notify()
+            return True
+
+    ## Return a snapshot of the executor statistics.
+    #
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.__stats)
+            stats["queue_depth"] = self.__get_queue_depth()
+            stats["running"] = len(self.__running)
+            stats["workers"] = len(self.__workers)
+            started = stats["completed"] + stats["running"]
+            stats["mean_wait"] = stats["total_wait"] / started if started else 0
+            return stats
+
+    ## Discard the commands queued for "recipient"; a command that is
+    #  already running is not affected.
+    #
+    #  @return The number of commands discarded.
+    #
+    def cancel(self, recipient):
+        with self.lock:
+            key = id(recipient)
+            queue = self.__queues.pop(key, None)
+            if not queue:
+                return 0
+            if key in self.__ready:
+                self.__ready.remove(key)
+            return len(queue)
+
+    ## Stop the worker threads once the commands already running finish;
+    #  queued commands are discarded.
+    #
+    def shutdown(self):
+        with self.lock:
+            self.__shutdown = True
+            self.__queues.clear()
+            self.__ready.clear()
+            self.condition.notify_all()
+
+    def __get_queue_depth(self):
+        return sum(len(queue) for queue in self.__queues.values())
+
+    def __start_worker(self):
+        worker = threading.Thread(target=self.__work,
+                name="CommandWorker-{0}".format(len(self.__workers)))
+        worker.daemon = True
+        self.__workers.append(worker)
+        worker.start()
+
+    def __work(self):
+        while True:
+            with self.lock:
+                while not self.__ready and not self.__shutdown:
+                    self.__idle += 1
+                    self.condition.wait()
+                    self.__idle -= 1
+                if self.__shutdown:
+                    self.__workers.remove(threading.current_thread())
+                    return
+
+                key = self.__ready.popleft()
+                queue = self.__queues[key]
+                item = queue.popleft()
+                if not queue:
+                    del self.__queues[key]
+                self.__running[key] = item
+
+                wait = time.time() - item.queued
+                self.__stats["total_wait"] += wait
+                self.__stats["max_wait"] = max(self.__stats["max_wait"], wait)
+
+            log.debug("Command %s waited %.3fs", item.command[0], wait)
+            metrics.registry.histogram("ft_command_wait_seconds").observe(wait)
+            with metrics.timer("ft_command_seconds", command=item.command[0]):
+                result = _run_async_command(item.recipient, item.command,
+                        self.options)
+            if item.callback:
+                try:
+                    item.callback(result)
+                except Exception:
+                    log.exception("Command callback failed")
+
+            with self.lock:
+                del self.__running[key]
+                self.__stats["completed"] += 1
+                if self.__queues.get(key):
+                    self.__ready.append(key)
+                    self.condition.notify()
+
+## Run an asynchronous command under an OperationToken set as the recipient's
+#  "operation"; the recipient's lock is only held to set and clear the token.
+#
+#  @return The command method's return value, or (None, traceback) if it
+#  raised.
+#
+def _run_async_command(obj, command, options=None):
+    command_name = command[0]
+    command_data = command[3]
+
+    with obj.lock.write():
+        obj.operation = OperationToken(command_name)
+
+    if options and options.profile:
+        import cProfile
+        pr = cProfile.Profile()
+        pr.enable()
+
+    result = None
+    try:
+        command_method = getattr(obj.CommandsAsync, command_name)
+        result = command_method(obj, command_data)
+    except OperationCancelled:
+        obj.fire(ft.event.UpdateStatus,
+                obj = obj,
+                message = "INFO: '{0}' cancelled.".format(command_name),
+                )
+        result = (None, "cancelled")
+    except:
+        import traceback
+        error = traceback.format_exc()
+        obj.fire(ft.event.ErrorEvent,
+                obj = obj,
+                traceback = error,
+                )
+        log.debug("%s", error)
+        result = (None, error)
+    finally:
+        with obj.lock.write():
+            operation, obj.operation = obj.operation, None
+        if operation is not None:
+            operation.finish()
+
+    if options and options.profile:
+        pr.disable()
+        import pstats, io
 
-        if self.options and self.options.profile:
-            import cProfile
-            pr = cProfile.Profile()
-            pr.enable()
+        if obj.address:
+            profile_name = obj.address[1]
+        else:
+            profile_name = type(obj).__name__
 
         try:
-            command_method = getattr(obj.CommandsAsync, command_name)
-            self.result = command_method(obj, command_data)
+            os.makedirs(options.profile_dir)
         except:
-            import traceback
-            error = traceback.format_exc()
-            obj.fire(ft.event.ErrorEvent,
-                    obj = obj,
-                    traceback = error,
-                    )
-            logging.debug(error)
-
-        if self.options and self.options.profile:
-            pr.disable()
-            import pstats, io, threading
-            t = threading.current_thread()
-
-            try:
-                os.makedirs(self.options.profile_dir)
-            except:
-                logging.info("Directory already exists: {0}".format(
-                    self.options.profile_dir))
-            profile_file = path.join(self.options.profile_dir, t.name)
-            f = io.open( profile_file, 'wb')
+            log.info("Directory already exists: %s", options.profile_dir)
+        profile_file = path.join(options.profile_dir, str(profile_name))
+        f = io.open( profile_file, 'wb')
 
-            ps = pstats.Stats(pr, stream=f)
-            ps.sort_stats("file", "cumulative")
-            ps.print_stats()
+        ps = pstats.Stats(pr, stream=f)
+        ps.sort_stats("file", "cumulative")
+        ps.print_stats()
 
-        obj.lock.release()
+    return result
 
 ## Mixin designed to synchronize synchronous command behavior for objects that
-#  recieve commands. Requires that implementing classes have a reentrant lock
+#  recieve commands. Requires that implementing classes have an RWLock
 #  attribute named 'lock' and own two classes, CommandsSync and CommandsAsync.
 #
 class Commandable(object):
 
-    ## Synchronous command form should be the same for all Commandables
+    ## OperationToken of the asynchronous command currently running, if any.
     #
-    def run_command(self, command):
-        self.lock.acquire()
-        result = (False, None)
+    operation = None
 
+    ## Synchronous command form should be the same for all Commandables.
+    #
+    #  Commands marked with ft.util.locker.query run under the read lock and
+    #  are served even while an asynchronous command is running. Other
+    #  commands take the write lock and wait for a running asynchronous
+    #  command to finish, unless marked with ft.util.locker.preempt or sent
+    #  by the asynchronous command itself.
+    #
+    def run_command(self, command):
         command_name = command[0]
         command_data = command[3]
 
         command_method = getattr(self.CommandsSync, command_name)
-        result = command_method(self, command_data)
-
-        self.lock.release()
-        return result
+        if getattr(command_method, "is_query", False):
+            with self.lock.read():
+                return command_method(self, command_data)
+
+        preempts = getattr(command_method, "preempts", False)
+        while True:
+            with self.lock.write():
+                operation = self.operation
+                if (operation is None or preempts or
+                        operation.thread is threading.current_thread()):
+                    return command_method(self, command_data)
+            operation.wait()
 
 class CommandError(Exception):
 
@@ -11,6 +11,15 @@ import subprocess
 import sys
 import time
 import inspect
+import re
+import pty
+import tty
+import errno
+import select
+import threading
+import itertools
+import ctypes
+import tempfile
 
 import logging
 
@@ -19,6 +28,157 @@ from interfaces.xmlrpc import (
         xmlrpc_all,
         )
 
+## Seconds BinaryCall.poll() waits for new output unless told otherwise.
+#
+POLL_WAIT = 1.0
+
+## Seconds a stopped binary has to exit before it is killed.
+#
+KILL_DELAY = 1.0
+
+##
+# @brief Binary started by BinaryCall.start().
+#
+# The binary runs on a pseudo-terminal, so its stdio is line buffered and
+# every line arrives as it is printed. A reader thread collects the output,
+# checks every line against the pass and fail patterns, and enforces the
+# timeout; the first pattern found, or the timeout, decides the result and
+# stops the binary. Otherwise an exit status of 0 passes.
+#
+class _Job(object):
+    def __init__(self, args, timeout=None, pass_patterns=(),
+            fail_patterns=()):
+        self.pass_patterns  = [re.compile(p) for p in pass_patterns]
+        self.fail_patterns  = [re.compile(p) for p in fail_patterns]
+        self.deadline       = time.time() + timeout if timeout else None
+        self.timeout        = timeout
+
+        self.output         = bytearray()
+        self.status         = None
+        self.result         = None
+        self.reason         = None
+        self.condition      = threading.Condition()
+        self.timer          = None
+
+        master, slave = pty.openpty()
+        # no "\r\n" translation of the output
+        tty.setraw(slave)
+        try:
+            with open(os.devnull) as devnull:
+                self.process = subprocess.Popen(args, stdin=devnull,
+                        stdout=slave, stderr=slave, close_fds=True)
+        except:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        self.master = master
+
+        self.thread = threading.Thread(target=self.__read,
+                name="BinaryCall-{0}".format(self.process.pid))
+        self.thread.daemon = True
+        self.thread.start()
+
+    ##
+    # @brief Return what changed since "offset": the output after it, the
+    # offset to ask for next, the exit status (None until the binary exited
+    # and all of its output was read), the result ("pass", "fail" or None)
+    # and the reason for it. Waits up to "wait" seconds for either.
+    #
+    def get(self, offset=0, wait=0):
+        deadline = time.time() + wait
+        with self.condition:
+            while len(self.output) <= offset and self.status == None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return {
+                    "output": str(self.output[offset:]),
+                    "offset": len(self.output),
+                    "status": self.status,
+                    "result": self.result,
+                    "reason": self.reason,
+                    }
+
+    def stop(self):
+        if self.process.poll() == None:
+            try:
+                self.process.terminate()
+            except OSError:
+                pass
+            self.timer = threading.Timer(KILL_DELAY, self.__kill)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def __kill(self):
+        if self.process.poll() == None:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+
+    def __decide(self, result, reason):
+        with self.condition:
+            if not self.result == None:
+                return
+            self.result = result
+            self.reason = reason
+        logging.debug("Binary {0}: {1}".format(result, reason))
+        self.stop()
+
+    def __check(self, line):
+        for pattern in self.fail_patterns:
+            if pattern.search(line):
+                self.__decide("fail", "found '{0}'".format(pattern.pattern))
+                return
+        for pattern in self.pass_patterns:
+            if pattern.search(line):
+                self.__decide("pass", "found '{0}'".format(pattern.pattern))
+                return
+
+    def __read(self):
+        line = ""
+        while True:
+            if self.deadline and time.time() >= self.deadline:
+                self.__decide("fail", "timeout after {0} s".format(
+                    self.timeout))
+            ready = select.select([self.master], [], [], 0.5)[0]
+            if not ready:
+                # children of the binary may keep the terminal open
+                if self.process.poll() == None:
+                    continue
+                break
+            try:
+                data = os.read(self.master, 4096)
+            except OSError as e:
+                # the terminal is closed once the binary exited
+                if not e.errno == errno.EIO:
+                    raise
+                data = ""
+            if not data:
+                break
+            with self.condition:
+                self.output += data
+                self.condition.notify_all()
+            lines = (line + data).split("\n")
+            line = lines.pop()
+            for complete in lines:
+                self.__check(complete)
+        if line:
+            self.__check(line)
+        os.close(self.master)
+
+        status = self.process.wait()
+        if self.timer:
+            self.timer.cancel()
+        with self.condition:
+            self.status = status
+            if self.result == None:
+                self.result = "pass" if status == 0 else "fail"
+                self.reason = "exit status {0}".format(status)
+            self.condition.notify_all()
+
 @xmlrpc_all
 class BinaryCall(ServerInterface,):
     def __init__(self, kwargs):
@@ -35,6 +195,8 @@ class BinaryCall(ServerInterface,):
         ServerInterface.__init__(self, instance_name, xmlrpc_client, kwargs_copy)
 
         self.process        = None
+        self.jobs           = dict()
+        self.job_ids        = itertools.count(1)
 
     ##
     # @brief call the test binary with the arguments passed from the "test"
@@ -70,6 +232,178 @@ class BinaryCall(ServerInterface,):
             p       = subprocess.Popen(args,) 
             return False, ""
 
+    ##
+    # @brief Start the test binary with "argslist" and return the job to
+    # poll() for its output and exit status.
+    #
+    # "timeout" seconds, if given, are enforced here on the target. A line of
+    # output matching a regular expression of "fail_patterns" or
+    # "pass_patterns" decides the result without waiting for the binary to
+    # exit.
+    #
+    def start(self, kwargs):
+        args   = [self.bincmd] + kwargs["argslist"]
+
+        logging.debug("About to start binary: {0}".format(args))
+
+        # jobs whose result was read are kept until the next one starts
+        for job_id, job in self.jobs.items():
+            if not job.status == None:
+                del self.jobs[job_id]
+
+        job_id  = next(self.job_ids)
+        self.jobs[job_id] = _Job(args,
+                timeout         = kwargs.get("timeout"),
+                pass_patterns   = kwargs.get("pass_patterns", []),
+                fail_patterns   = kwargs.get("fail_patterns", []),
+                )
+        return job_id
+
+    ##
+    # @brief Return the output of "job" after "offset", waiting up to "wait"
+    # seconds for some; see _Job.get().
+    #
+    def poll(self, kwargs):
+        return self.jobs[kwargs["job"]].get(kwargs.get("offset", 0),
+                kwargs.get("wait", POLL_WAIT))
+
+    ##
+    # @brief Stop "job" and forget it.
+    #
+    def stop(self, kwargs):
+        job     = self.jobs.pop(kwargs["job"], None)
+        if job:
+            job.stop()
+        return True
+
+## Test library built from include/ by "make library".
+#
+LIBRARY_PATH = path.join(path.dirname(path.dirname(path.dirname(
+    path.abspath(__file__)))), "libemac_tests.so")
+
+## (Required, total) numbers of string arguments of the test functions of
+#  include/emac_generic_tests.h that are safe to call in process; only the
+#  arguments past the required ones may be NULL, for a default. They return 0
+#  on success.
+#
+#  test_analog_gpio, test_analog_mcp3208, test_gpo and test_gpi are left out:
+#  they loop until a key is read from stdin, which is the agent's own, and
+#  would hold the library's lock forever. Run them through py_test with
+#  BinaryCall.
+#
+TEST_FUNCTIONS = {
+        "test_block":           (1, 1),
+        "test_serial":          (2, 2),
+        "test_pwm":             (0, 1),
+        "test_pld":             (0, 1),
+        "test_gpio":            (0, 2),
+        "test_rtc":             (0, 1),
+        "test_485":             (0, 1),
+        "test_i2c_read":        (4, 4),
+        }
+
+##
+# @brief The test library loaded into this process.
+#
+# A test's standard output is captured by pointing file descriptor 1 at a
+# temporary file kept open for the life of the process, so calls run one at a
+# time. The redirection is process-wide: anything another thread of the agent
+# writes to stdout during a call ends up in the test's output.
+#
+class _Library(object):
+    def __init__(self, library_path):
+        self.dll            = ctypes.CDLL(library_path)
+        self.libc           = ctypes.CDLL(None)
+        self.functions      = dict()
+        for name, (required, arity) in TEST_FUNCTIONS.items():
+            function            = getattr(self.dll, name)
+            function.argtypes   = [ctypes.c_char_p] * arity
+            function.restype    = ctypes.c_int
+            self.functions[name] = function
+
+        self.lock           = threading.Lock()
+        self.output         = tempfile.TemporaryFile()
+        self.stdout         = os.dup(1)
+
+    ##
+    # @brief Call the test function "name" with "args", missing optional
+    # trailing ones passed as NULL, and return its exit status and standard
+    # output.
+    #
+    def call(self, name, args):
+        function    = self.functions[name]
+        required, arity = TEST_FUNCTIONS[name]
+        if not required <= len(args) <= arity:
+            raise ValueError("{0} takes {1} to {2} arguments".format(name,
+                required, arity))
+        args        = list(args) + [None] * (arity - len(args))
+
+        with self.lock:
+            fd          = self.output.fileno()
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            sys.stdout.flush()
+            self.libc.fflush(None)
+            os.dup2(fd, 1)
+            try:
+                status      = function(*args)
+            finally:
+                self.libc.fflush(None)
+                os.dup2(self.stdout, 1)
+            size        = os.lseek(fd, 0, os.SEEK_END)
+            os.lseek(fd, 0, os.SEEK_SET)
+            output      = os.read(fd, size) if size else ""
+
+        return status, output
+
+_libraries      = dict()
+_libraries_lock = threading.Lock()
+
+def _get_library(library_path):
+    with _libraries_lock:
+        if not _libraries.has_key(library_path):
+            _libraries[library_path] = _Library(library_path)
+        return _libraries[library_path]
+
+##
+# @brief Tests of the include/ library, called in the agent's process rather
+# than by starting a binary for every action.
+#
+# A test that may hang is better run by BinaryCall.start(), whose timeout
+# can stop it.
+#
+@xmlrpc_all
+class TestLibrary(ServerInterface,):
+    def __init__(self, kwargs):
+        # loaded on the first call, where the tests run
+        self.library_path   = kwargs.get("library_path", LIBRARY_PATH)
+        instance_name       = kwargs["instance_name"]
+
+        kwargs_copy = copy.copy(kwargs)
+
+        if kwargs.has_key("xmlrpc_client"):
+            xmlrpc_client       = kwargs_copy.pop("xmlrpc_client")
+        else:
+            xmlrpc_client       = None
+
+        ServerInterface.__init__(self, instance_name, xmlrpc_client, kwargs_copy)
+
+    ##
+    # @brief call the test "function" with the strings of "argslist". Return
+    # exit_status and std_out, as BinaryCall.call.
+    def call(self, kwargs):
+        library     = _get_library(self.library_path)
+
+        logging.debug("About to call {0}: {1}".format(kwargs["function"],
+            kwargs.get("argslist", [])))
+
+        status, output  = library.call(kwargs["function"],
+                kwargs.get("argslist", []))
+
+        logging.debug("Test returned ({0}, {1})".format(status, output))
+
+        return status, output
+
 @xmlrpc_all
 class Audio(ServerInterface):
     valid_modes = [
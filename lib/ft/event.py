@@ -144,6 +144,11 @@ class DestroyEvent(Event):
 class UpdateStatus(Event):
     """ Test Ready """
 
+## Event carries the result of a command run in Mode.STREAM.
+#
+class CommandResult(Event):
+    """ Command Result """
+
 #-------------------------------------------------------------------------------
 # Test Events
 
@@ -167,6 +172,11 @@ class TestStart(TestEvent):
 class TestFatal(TestEvent):
     """ Test Fatal """
 
+## Event indicates that a test, or one of its actions, is about to be retried.
+#
+class TestRetry(TestEvent):
+    """ Test Retry """
+
 ## Event indicates running test instance has finished.
 #
 class TestFinish(TestEvent):
@@ -210,6 +220,11 @@ class ActionFinish(ActionEvent):
 class ActionFatal(ActionEvent):
     """ Action Fatal """
 
+## Event carries output of a streaming action as it arrives.
+#
+class ActionOutput(ActionEvent):
+    """ Action Output """
+
 #-------------------------------------------------------------------------------
 # Platform Events
 
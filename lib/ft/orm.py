@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package orm
+#
+#  Declarative base and session of the test log database, imported by the
+#  modules defining ORM classes rather than by every user of the ft package.
+#
+
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import create_engine
+
+session_factory = sessionmaker()
+LogDBSession = scoped_session(session_factory)
+Base = declarative_base()
+
+def setup_logdb_engine(*args):
+    engine = create_engine(*args)
+    session_factory.configure(bind=engine)
@@ -2,13 +2,13 @@
 # vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
 
 # standard libraries
-import re, sys
+import re, sys, time, threading
 from os import path, walk
 
 import logging, pprint
 
 # installed libraries
-import git, yaml
+import yaml
 try:
         from yaml import CLoader as Loader, CDumper as Dumper
 except ImportError:
@@ -16,9 +16,15 @@ except ImportError:
 
 # local libraries
 
+from telemetry.imports import LazyModule
 from ft.util.locker import (
         cls_locker_all
         )
+from ft.util.yaml_util import load_yaml
+from ft.util.metadata_cache import metadata_cache
+
+# only loaded for metadata kept in git repositories
+git = LazyModule("git")
 
 ##
 # General configuration tool.
@@ -30,13 +36,12 @@ class GenConfig(object):
         self._load(file_name)
     
     def _load(self, file_name):
-        with file(file_name, 'r+') as f:
-            tmp = yaml.load(f, Loader=Loader)
-            self.name = tmp["name"]
-            self.shortdesc = tmp["shortdesc"]
-            options = tmp["options"]
+        tmp = load_yaml(file_name)
+        self.name = tmp["name"]
+        self.shortdesc = tmp["shortdesc"]
+        options = tmp["options"]
 
-            self._set_subattr(options)
+        self._set_subattr(options)
     
     def _set_subattr(self, dct):
         for key, val in dct.items():
@@ -66,9 +71,8 @@ class GenConfig2(GenConfig):
         return pprint.pformat(self.__dict__)
 
     def _load(self, file_name):
-        with file(file_name, 'r+') as f:
-            tmp = yaml.load(f, Loader=Loader)
-            self._set_subattr(tmp)
+        tmp = load_yaml(file_name)
+        self._set_subattr(tmp)
 
 ## Mixin intended to give subclassers access to nifty metadata directories.
 #  
@@ -95,45 +99,94 @@ class HasMetadata(object):
         self.__setup_git_repo()
 
     def __setup_git_repo(self):
-        self.repo = GitMetaDataRepo(self.metadata_repo_dict,
+        self.repo = repo_pool.get(self.metadata_repo_dict,
                 self.relative_path, self.__metadata_type__)
         self.local_path = self.repo.local_path
         self.metadata_repo = self.repo.url
         self.metadata_version = self.repo.version
-        self.repo.update()
 
 class MetaDataDir(object):
 
     local_base_path = "./resources/"
 
-    def __init__(self, relative_path):
-        self.local_path = path.join( self.local_base_path, relative_path)
+    def __init__(self, relative_path, base_path=None):
+        if base_path is None:
+            base_path = self.local_base_path
+        self.local_path = path.join( base_path, relative_path)
         self.repo = None
         self.version = ""
 
 class GitMetaDataRepo(MetaDataDir):
 
-    def __init__(self, repo_dict, relative_path, metadata_type=""):
-        MetaDataDir.__init__(self, path.join( metadata_type, relative_path ))
+    ## Options passed to "git clone"; a partial clone fetches all commits and
+    #  refs but defers blob downloads until a version is checked out. Servers
+    #  that do not support filtering fall back to a full clone.
+    #
+    clone_options = {
+            "filter": "blob:none",
+            }
+
+    def __init__(self, repo_dict, relative_path, metadata_type="",
+            base_path=None):
+        MetaDataDir.__init__(self, path.join( metadata_type, relative_path ),
+                base_path)
         self.url = ( repo_dict['url'] + repo_dict['basepath'] + relative_path +
                 '.git' )
+        if repo_dict.has_key("clone_options"):
+            self.clone_options = repo_dict["clone_options"]
+
+        self.lock = threading.RLock()
+        self.refs = None
+        self.last_fetch = 0
 
+    ## Make sure a local clone exists; an existing clone is reused as is and
+    #  refreshed by the GitMetaDataRepoPool in the background.
+    #
     def update(self,):
-        if path.isdir( path.join(self.local_path, '.git')) and not self.repo:
-            self.repo = git.Repo(self.local_path)
-            self.repo.remotes.origin.fetch()
-        else:
-            self.checkout()
+        with self.lock:
+            if self.repo:
+                return
+            if path.isdir( path.join(self.local_path, '.git')):
+                self.repo = git.Repo(self.local_path)
+            else:
+                self.checkout()
+
+    ## Fetch from the remote; the network round trip runs without the lock
+    #  so that get_refs() and update() are not held up by a slow remote.
+    #
+    def fetch(self,):
+        with self.lock:
+            repo = self.repo
+        repo.remotes.origin.fetch()
+        with self.lock:
+            self.last_fetch = time.time()
+            self.refs = None
+
+    def is_stale(self, ttl):
+        return time.time() - self.last_fetch > ttl
 
     def checkout(self, ref=None):
-        if not self.repo:
-            self.repo = git.Repo.clone_from(self.url, self.local_path)
-        if ref:
-            tmp = self.repo.git
-            tmp.checkout(ref)
+        with self.lock:
+            if not self.repo:
+                self.repo = git.Repo.clone_from(self.url, self.local_path,
+                        **self.clone_options)
+                self.last_fetch = time.time()
+            if ref:
+                tmp = self.repo.git
+                tmp.checkout(ref)
+                metadata_cache.invalidate(self.local_path)
         return None
     
+    ## Return the branches and tags of the repository; the list is cached
+    #  until the next fetch.
+    #
     def get_refs(self,):
+        with self.lock:
+            if self.refs is None:
+                self.refs = self.__list_refs()
+            return list(self.refs)
+
+    def __list_refs(self,):
         symbolic_refs = []
         branches = self.repo.branches
         for branch in branches:
@@ -144,8 +197,85 @@ class GitMetaDataRepo(MetaDataDir):
 
         tags = self.repo.tags
         for tag in tags:
+            if tag.tag:
+                shortdesc = tag.tag.message
+            else:
+                shortdesc = tag.commit.summary
             symbolic_refs.append({
                 "name": tag.name,
-                "shortdesc": tag.tag.message,
+                "shortdesc": shortdesc,
                 })
         return symbolic_refs
+
+## Process-wide pool of metadata repositories keyed by URL.
+#
+#  Every Platform and Product selecting the same repository shares a single
+#  GitMetaDataRepo, so the clone happens once and remote fetches are done by a
+#  background thread whenever the last fetch is older than "ttl" seconds.
+#  Callers never wait for the network except for the very first clone.
+#
+class GitMetaDataRepoPool(object):
+
+    def __init__(self, ttl=300, base_path=None):
+        self.ttl = ttl
+        self.base_path = base_path
+        self.repos = dict()
+        self.lock = threading.Lock()
+
+        self.__wakeup = threading.Event()
+        self.__refresh_thread = None
+        self.__running = True
+
+    def get(self, repo_dict, relative_path, metadata_type=""):
+        url = ( repo_dict['url'] + repo_dict['basepath'] + relative_path +
+                '.git' )
+        with self.lock:
+            repo = self.repos.get(url)
+            if repo is None:
+                repo = GitMetaDataRepo(repo_dict, relative_path,
+                        metadata_type, self.base_path)
+                self.repos[url] = repo
+
+        repo.update()
+
+        if repo.is_stale(self.ttl):
+            self.__start_refresh_thread()
+            self.__wakeup.set()
+        return repo
+
+    ## Stop the background refresh thread.
+    #
+    def close(self):
+        self.__running = False
+        self.__wakeup.set()
+
+    def __start_refresh_thread(self):
+        with self.lock:
+            if self.__refresh_thread:
+                return
+            self.__refresh_thread = threading.Thread(
+                    target = self.__refresh_loop,
+                    name = "GitMetaDataRepoRefresh",
+                    )
+            self.__refresh_thread.daemon = True
+            self.__refresh_thread.start()
+
+    def __refresh_loop(self):
+        while self.__running:
+            self.__wakeup.wait(self.ttl)
+            self.__wakeup.clear()
+            if not self.__running:
+                break
+            with self.lock:
+                repos = self.repos.values()
+            for repo in repos:
+                if not repo.is_stale(self.ttl):
+                    continue
+                try:
+                    repo.fetch()
+                except Exception:
+                    logging.warning("Metadata repository fetch failed: "
+                            "{0}".format(repo.url))
+                    repo.last_fetch = time.time()
+
+repo_pool = GitMetaDataRepoPool()
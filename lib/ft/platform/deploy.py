@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package deploy
+#
+#  Content addressed cache for NFS root filesystems and TFTP files.
+#
+#  Every NFS deployment is extracted once into a cache directory named after
+#  the hash of the filesystem archive, the product metadata revision and the
+#  install commands run on top of it. The NFS directory the UUT boots from is
+#  a symlink which is atomically swapped to the matching cache entry, so
+#  switching between product versions that were deployed before costs a
+#  rename instead of a full extraction. Every NFS directory linked into the
+#  cache is recorded by a symlink in the cache's ".links" directory, so entries
+#  still in use are known even after a restart. TFTP files are only copied
+#  when their content differs from the file already on the server.
+#
+
+import os, os.path as path, shutil, threading, subprocess, shlex, hashlib
+import time, logging
+
+## Read size used when hashing files.
+#
+BLOCK_SIZE = 1 << 20
+
+## Directory of the cache recording the NFS directories linked into it.
+#
+LINKS_DIR = ".links"
+
+class Deployment(object):
+
+    def __init__(self, key):
+        self.key = key
+        self.error = None
+        self.done = threading.Event()
+
+    ## Block until the deployment has finished; re-raises its exception.
+    #
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        if self.error:
+            raise self.error
+        return self.done.is_set()
+
+class DeploymentCache(object):
+
+    ## @param cache_dir Directory holding the extracted filesystems; must be
+    #  inside the NFS export so that symlinks into it resolve for clients.
+    #  @param password Password fed to "sudo -S".
+    #  @param sudo Whether to run filesystem commands through sudo.
+    #  @param max_entries Number of unused cache entries kept around.
+    #
+    def __init__(self, cache_dir, password=None, sudo=True, max_entries=4):
+        self.cache_dir = path.abspath(cache_dir)
+        self.password = password
+        self.sudo = sudo
+        self.max_entries = max_entries
+
+        self.lock = threading.Lock()
+        self.__digests = dict()
+        self.__key_locks = dict()
+        self.__pending = dict()
+        self.__last_used = dict()
+
+    ## Return the SHA-1 of a file, memoized by path, size and mtime.
+    #
+    def get_digest(self, file_path):
+        file_path = path.realpath(file_path)
+        stat = os.stat(file_path)
+        memo_key = (file_path, stat.st_size, stat.st_mtime)
+        with self.lock:
+            digest = self.__digests.get(memo_key)
+        if digest:
+            return digest
+
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), ""):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+        with self.lock:
+            self.__digests[memo_key] = digest
+        return digest
+
+    ## Make "dest_dir" point at an extracted copy of "archive".
+    #
+    #  @param archive Path of the gzipped filesystem tarball.
+    #  @param dest_dir NFS directory the UUT mounts.
+    #  @param revision Revision of any other input to the install commands,
+    #  typically the product metadata commit. None disables reuse of the entry.
+    #  @param install Command strings run after extraction; "{nfs_dir}" is
+    #  replaced with the directory being populated.
+    #
+    #  @return Path of the cache entry now linked from "dest_dir".
+    #
+    def deploy_nfs(self, archive, dest_dir, revision=None, install=()):
+        key = self.get_key(archive, revision, install)
+        entry = path.join(self.cache_dir, key)
+
+        with self.__get_key_lock(key):
+            if not path.isdir(entry):
+                self.__extract(archive, entry, install)
+            self.__link(entry, path.abspath(dest_dir))
+
+        self.collect()
+        return entry
+
+    ## Run deploy_nfs() on a background thread. Requests for a deployment
+    #  that is already pending return the pending Deployment.
+    #
+    def deploy_nfs_async(self, archive, dest_dir, revision=None, install=()):
+        key = (self.get_key(archive, revision, install), path.abspath(dest_dir))
+        with self.lock:
+            deployment = self.__pending.get(key)
+            if deployment:
+                return deployment
+            deployment = self.__pending[key] = Deployment(key)
+
+        def run():
+            try:
+                self.deploy_nfs(archive, dest_dir, revision, install)
+            except Exception as e:
+                logging.warning("NFS deployment failed: {0}".format(e))
+                deployment.error = e
+            with self.lock:
+                del self.__pending[key]
+            deployment.done.set()
+
+        thread = threading.Thread(target=run, name="Deploy-{0}".format(
+            path.basename(dest_dir)))
+        thread.daemon = True
+        thread.start()
+        return deployment
+
+    def get_key(self, archive, revision=None, install=()):
+        if revision is None:
+            revision = "{0}-{1}".format(os.getpid(), time.time())
+        sha1 = hashlib.sha1(self.get_digest(archive))
+        sha1.update(revision)
+        for command_string in install:
+            sha1.update(command_string)
+        return sha1.hexdigest()
+
+    ## Copy "file_path" into "dest_dir" unless an identical file is there.
+    #
+    #  @return True if the file was copied.
+    #
+    def deploy_tftp(self, dest_dir, file_path):
+        try:
+            os.makedirs(dest_dir)
+        except OSError:
+            pass
+
+        dest_file = path.join(dest_dir, path.basename(file_path))
+        if (path.isfile(dest_file) and
+                path.getsize(dest_file) == path.getsize(file_path) and
+                self.get_digest(dest_file) == self.get_digest(file_path)):
+            return False
+
+        shutil.copy2(file_path, dest_file)
+        return True
+
+    ## Remove the least recently used cache entries that are not linked from
+    #  any NFS directory, keeping at most "max_entries" of them.
+    #
+    def collect(self):
+        if not path.isdir(self.cache_dir):
+            return
+        with self.lock:
+            linked = self.__get_linked()
+            unused = list()
+            for name in os.listdir(self.cache_dir):
+                entry = path.join(self.cache_dir, name)
+                if entry in linked or not path.isdir(entry):
+                    continue
+                if name.endswith(".partial") or name.startswith("."):
+                    continue
+                last_used = self.__last_used.get(entry,
+                        path.getmtime(entry))
+                unused.append((last_used, entry))
+            unused.sort()
+            evicted = [entry for last_used, entry in
+                    unused[:max(0, len(unused) - self.max_entries)]]
+            for entry in evicted:
+                self.__last_used.pop(entry, None)
+
+        for entry in evicted:
+            try:
+                self._run('rm -rf {0}'.format(entry))
+            except Exception as e:
+                logging.warning(e)
+
+    ## Return the entries that the recorded NFS directories link to now.
+    #
+    def __get_linked(self):
+        linked = set()
+        links_dir = path.join(self.cache_dir, LINKS_DIR)
+        if not path.isdir(links_dir):
+            return linked
+        for name in os.listdir(links_dir):
+            dest_dir = os.readlink(path.join(links_dir, name))
+            if path.islink(dest_dir):
+                linked.add(os.readlink(dest_dir))
+        return linked
+
+    def _run(self, command_string):
+        command = shlex.split(command_string)
+        if self.sudo:
+            command = ["sudo", "-S"] + command
+        p = subprocess.Popen(command, stdin=subprocess.PIPE)
+        p.communicate(input=self.password)
+        if not p.returncode == 0:
+            raise Exception("Command failed: {0}".format(command_string))
+
+    def __get_key_lock(self, key):
+        with self.lock:
+            lock = self.__key_locks.get(key)
+            if lock is None:
+                lock = self.__key_locks[key] = threading.Lock()
+            return lock
+
+    ## Extract into a temporary directory and rename it into place once
+    #  complete, so a half-extracted entry is never mistaken for a valid one.
+    #
+    def __extract(self, archive, entry, install):
+        partial = entry + ".partial"
+        self._run('rm -rf {0}'.format(partial))
+        self._run('mkdir -p {0}'.format(partial))
+        self._run('tar -pxzf {0} -C {1}'.format(archive, partial))
+        for command_string in install:
+            self._run(command_string.format(nfs_dir=partial))
+        self._run('mv -T {0} {1}'.format(partial, entry))
+
+    def __link(self, entry, dest_dir):
+        with self.lock:
+            self.__last_used[entry] = time.time()
+        if path.islink(dest_dir) and os.readlink(dest_dir) == entry:
+            return
+
+        if path.isdir(dest_dir) and not path.islink(dest_dir):
+            # A full extraction left behind by an older deployment.
+            self._run('rm -rf {0}'.format(dest_dir))
+        parent = path.dirname(dest_dir)
+        if not path.isdir(parent):
+            self._run('mkdir -p {0}'.format(parent))
+        new_link = dest_dir + ".new"
+        self._run('ln -sfn {0} {1}'.format(entry, new_link))
+        self._run('mv -T {0} {1}'.format(new_link, dest_dir))
+
+        links_dir = path.join(self.cache_dir, LINKS_DIR)
+        record = path.join(links_dir, hashlib.sha1(dest_dir).hexdigest())
+        if not path.islink(record):
+            self._run('mkdir -p {0}'.format(links_dir))
+            self._run('ln -sfn {0} {1}'.format(dest_dir, record))
@@ -26,8 +26,14 @@ from ft.platform.unit import UnitUnderTest
 from ft.platform.product import Product
 from ft.platform.platformslots import PlatformSlot
 from ft.platform.configuration import HasMetadata, GenConfig
-from ft.command import Commandable, Command
+from ft.platform.deploy import DeploymentCache
+from ft.command import Commandable, Command, RecipientType, address_registry
+from ft.util.locker import RWLock, query
 from ft.util.yaml_util import load_manifest
+from ft.util.metadata_cache import get_head_commit
+from ft.test import measurement, journal
+from telemetry import trace, metrics
+from eserial import capture
 
 from interfaces import (
         adam,
@@ -54,25 +60,46 @@ class Platform(PlatformDB, HasMetadata, Commandable, EventGenerator):
 
     __metadata_type__ = "platforms"
 
+    recipient_type = RecipientType.PLATFORM
+
     def __init__(self, event_handler, options, address=None):
         HasMetadata.__init__(self) 
 
         self.options = options
         self.config = None
+        self.deployment_cache = None
         self.manifest = load_manifest(options.platform_manifest_file)
         self.metadata_repo_dict = self.manifest["metadata_repo"]
         self.repo = None
         self.local_path = None
 
         self.address = address
+        address_registry.register(self)
         self.slots = list()
         self.uuts = dict()
 
         self.event_handler = event_handler
-        self.lock = threading.RLock()
+        self.lock = RWLock("Platform")
 
         self.commands = Command(self)
 
+        measurement.set_measurement_sink(
+                getattr(options, "measurement_dir", None))
+        journal.set_journal_dir(getattr(options, "journal_dir", None))
+        max_days = getattr(options, "console_max_days", None)
+        capture.set_capture_dir(getattr(options, "console_dir", None),
+                getattr(options, "console_max_bytes",
+                    capture.DEFAULT_MAX_BYTES),
+                max_days * 24 * 3600 if max_days else capture.DEFAULT_MAX_AGE)
+        if getattr(options, "trace_file", None):
+            trace.enable()
+        self.metrics_server = None
+        metrics_port = getattr(options, "metrics_port", None)
+        if metrics_port is not None:
+            self.metrics_server = metrics.MetricsServer(
+                    ("127.0.0.1", metrics_port))
+            self.metrics_server.start()
+
         self.fire(ft.event.PlatformInit, 
                 obj = self, 
                 name = self.name,
@@ -100,53 +127,54 @@ class Platform(PlatformDB, HasMetadata, Commandable, EventGenerator):
                 obj = self,
                 message = "INFO: Deploying NFS archive . . .",
                 )
+        self.deployment_cache.deploy_nfs(*self.__get_nfs_deployment(product))
+        self.fire(ft.event.UpdateStatus,
+                obj = self,
+                message = "INFO: NFS Achive Deployed . . .",
+                )
+
+    ## Deploy the product's NFS archive on a background thread.
+    #
+    #  @return A deploy.Deployment whose wait() method blocks until the NFS
+    #  directory is ready.
+    #
+    def deploy_nfs_async(self, product):
+        return self.deployment_cache.deploy_nfs_async(
+                *self.__get_nfs_deployment(product))
+
+    def __get_nfs_deployment(self, product):
         filesystem_archive = os.path.join(product.local_path,
                 product.config.uboot["test_filesystem"])
         dest_dir = os.path.join(self.config.nfs_base_dir,
                 product.config.uboot["nfs_dir"])
+        make_string = ('make install-nfs NFS_DEPLOY_DIR={{nfs_dir}} '
+                'CURRENT_TEST={0}'.format(product.local_path))
+        revision = get_head_commit(product.local_path)
+        return filesystem_archive, dest_dir, revision, [make_string]
 
-        cleanup_string = 'sudo -S rm -rf {0}'.format(dest_dir)
-        mkdir_string = 'sudo -S mkdir -p {0}'.format(dest_dir)
-        tar_string = 'sudo -S tar -pxzf {0} -C {1}'.format(filesystem_archive,
-                dest_dir)
-        make_string = 'sudo -S make install-nfs'
-
-        for command_string in [cleanup_string, mkdir_string, tar_string,
-                make_string]:
-            p = subprocess.Popen(shlex.split(command_string), stdin=subprocess.PIPE)
-            p.communicate(input=self.config.password)
-            p.wait()
-            if not p.returncode == 0:
-                raise Exception("Command failed: {0}".format(command_string))
-
+    def deploy_tftp(self, dest_dir, file_path):
+        if self.deployment_cache.deploy_tftp(dest_dir, file_path):
+            message = "INFO: TFTP Deploy successful: {0}"
+        else:
+            message = "INFO: TFTP file up to date: {0}"
         self.fire(ft.event.UpdateStatus,
                 obj = self,
-                message = "INFO: NFS Achive Deployed . . .",
+                message = message.format(file_path),
                 )
 
-    def deploy_tftp(self, dest_dir, file_path):
-        try:
-            os.makedirs(dest_dir)
-        except OSError:
-            pass
-
-        try:
-            shutil.copy2(file_path, dest_dir)
-        except:
-            raise
-        else:
-            self.fire(ft.event.UpdateStatus,
-                    obj = self,
-                    message = "INFO: TFTP Deploy successful: {0}".format(
-                        file_path),
-                    )
-
     def get_platform_versions(self):
         self._setup_repo()
         return self.repo.get_refs()
 
     def cleanup(self):
         self.deactivate()
+        self.commands.executor.shutdown()
+        measurement.set_measurement_sink(None)
+        if getattr(self.options, "trace_file", None):
+            trace.export(self.options.trace_file)
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
     
     def deactivate(self):
         slots = self.slots
@@ -158,6 +186,9 @@ class Platform(PlatformDB, HasMetadata, Commandable, EventGenerator):
 
     def __configure(self, config_file):
         self.config = GenConfig(config_file)
+        self.deployment_cache = DeploymentCache(
+                path.join(self.config.nfs_base_dir, ".deploy_cache"),
+                self.config.password)
         product_manifest_file = path.join(self.repo.local_path, "manifest.yaml")
         self.product_manifest = load_manifest(product_manifest_file)
 
@@ -197,14 +228,23 @@ class Platform(PlatformDB, HasMetadata, Commandable, EventGenerator):
 
     class CommandsSync:
         @staticmethod
+        @query
         def is_setup(platform, data):
             return False, ""
 
         @staticmethod
+        @query
         def get_manifest(platform, data):
             result = platform.manifest["repositories"]
             return result, ""
 
+        ## Return a snapshot of the live metrics; see telemetry.metrics.
+        #
+        @staticmethod
+        @query
+        def get_metrics(platform, data):
+            return metrics.registry.snapshot(), ""
+
         @staticmethod
         def select_platform(platform, data):
             platform_name = data
@@ -226,6 +266,7 @@ class Platform(PlatformDB, HasMetadata, Commandable, EventGenerator):
             return success, ""
     
         @staticmethod
+        @query
         def acknowledge(platform, data):
             return False, ""
     
@@ -15,7 +15,8 @@ import ft.event
 from ft.platform.unit import UnitUnderTest
 from ft.platform.product import Product
 from ft.platform.controller import Relay, UUTState
-from ft.command import Commandable
+from ft.command import Commandable, RecipientType, address_registry
+from ft.util.locker import RWLock, query, preempt
 
 from eserial import EnhancedSerial
 from interfaces import adam, ADAM_4068
@@ -38,12 +39,15 @@ class PlatformSlotDB(Base):
 
 class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
 
+    recipient_type = RecipientType.SLOT
+
     def __init__(self, slot_config, parent):
         self.config = slot_config
         self.options = parent.options
 
         self.address = None
         self.uut = None
+        self.deployment = None
         self.product = Product( self.config["product_manifest_filename"] )
         self.hardware_rev = None
         self.status = PlatformSlot.State.INIT
@@ -54,10 +58,13 @@ class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
         self.platform = parent
         self.event_handler = parent.event_handler
 
-        self.lock = threading.RLock()
+        self.lock = RWLock("PlatformSlot-{0}".format(id(self)))
 
     def set_address(self, address):
         self.address = (self.platform.address, address)
+        self.product.owner = "slot{0}".format(address)
+        self.lock.name = "PlatformSlot-{0}".format(address)
+        address_registry.register(self)
         self.fire(ft.event.PlatformSlotInit,
                 obj = self,
                 name = self.name,
@@ -103,12 +110,18 @@ class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
         product_tftp_dir = os.path.join(self.product.local_path, "tftp_files")
         platform_tftp_dir = os.path.join(self.platform.config.tftp_base_dir,
                 self.product.config.uboot["tftp_dir"])
-        for dirpath, dirnames, filenames in os.walk(tftp_filedir):
+        for dirpath, dirnames, filenames in os.walk(product_tftp_dir):
             for filename in filenames:
                 filename = os.path.join(dirpath, filename)
                 self.platform.deploy_tftp(platform_tftp_dir, filename)
 
-        self.platform.deploy_nfs(self.product)
+        self.deployment = self.platform.deploy_nfs_async(self.product)
+
+    ## Block until the NFS deployment started by configure() has finished.
+    #
+    def wait_deployment(self):
+        if self.deployment:
+            self.deployment.wait()
 
     def __init_adam(self):
         adam_dict = self.config["control"]["adam"]
@@ -143,43 +156,75 @@ class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
         return self.__control
 
     def powerdown(self):
-        self.lock.acquire()
-        if self.__control.has_key("power"):
-            if self.__control["power"].isstate("off"):
-                self.fire( ft.event.UpdateStatus, 
-                        message = "INFO: Unit already powered down.",
-                        )
-            else:
-                self.__control["power"].disable()
-                if self.__control.has_key("backlight"):
-                    self.__control["backlight"].disable()
-                self.fire_status(None, PlatformSlot.State.POWER)
-
-        else:
-            self.fire( ft.event.UpdateStatus,
-                    message = "WARNING: Automated powerdown not available.",
-                    )
+        with self.lock:
+            if self.__control.has_key("power"):
+                if self.__control["power"].isstate("off"):
+                    self.fire( ft.event.UpdateStatus, 
+                            message = "INFO: Unit already powered down.",
+                            )
+                else:
+                    self.__control["power"].disable()
+                    if self.__control.has_key("backlight"):
+                        self.__control["backlight"].disable()
+                    self.fire_status(None, PlatformSlot.State.POWER)
 
-        self.lock.release()
+            else:
+                self.fire( ft.event.UpdateStatus,
+                        message = "WARNING: Automated powerdown not available.",
+                        )
 
     def powerup(self):
-        self.lock.acquire()
-        if self.__control.has_key("power"):
-            if self.__control["power"].isstate("on"):
+        with self.lock:
+            if self.__control.has_key("power"):
+                if self.__control["power"].isstate("on"):
+                    self.fire( ft.event.UpdateStatus, 
+                            message = "INFO: Unit already powered up.",
+                            )
+                else:
+                    self.__control["power"].enable()
+                    if self.__control.has_key("backlight"):
+                        self.__control["backlight"].enable()
+                    self.fire_status(PlatformSlot.State.POWER, None)
+            else:
                 self.fire( ft.event.UpdateStatus, 
-                        message = "INFO: Unit already powered up.",
+                        message = "WARNING: Automated powerup not available.",
                         )
+
+    ## Cancel everything the slot and its UUT are doing and power down.
+    #
+    #  Commands queued for the slot, its UUT and the UUT's tests are dropped
+    #  and their running operations are cancelled. Cancelled operations stop
+    #  at their next token check; serial reads check every
+    #  eserial.EXPECT_SLICE seconds, so the slot is free again shortly after
+    #  the power is cut.
+    #
+    #  @return The number of queued commands dropped.
+    #
+    def abort(self):
+        with self.lock:
+            executor = self.platform.commands.executor
+            uut = self.uut
+            recipients = [self]
+            if uut:
+                recipients.append(uut)
+                recipients.extend(uut.tests or [])
+
+            dropped = 0
+            for recipient in recipients:
+                dropped += executor.cancel(recipient)
+                if recipient.operation:
+                    recipient.operation.cancel()
+
+            if uut:
+                uut.powerdown()
             else:
-                self.__control["power"].enable()
-                if self.__control.has_key("backlight"):
-                    self.__control["backlight"].enable()
-                self.fire_status(PlatformSlot.State.POWER, None)
-        else:
-            self.fire( ft.event.UpdateStatus, 
-                    message = "WARNING: Automated powerup not available.",
+                self.powerdown()
+            self.fire( ft.event.UpdateStatus,
+                    obj = self,
+                    message = "INFO: Aborted, {0} queued command(s) "
+                        "dropped.".format(dropped),
                     )
-
-        self.lock.release()
+        return dropped
 
     ## Adds a UUT to the FTPlatform
     #
@@ -192,38 +237,38 @@ class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
     #  up.
     #
     def _create_uut(self, data):
-        self.lock.acquire()
-        serial_number = data["serialnum"]
+        with self.lock:
+            serial_number = data["serialnum"]
 
-        if self.status & PlatformSlot.State.OCCUPIED:
-            self.fire_status(None, None)
-            self.fire( ft.event.UpdateStatus,
-                    message = "WARNING: PlatformSlot currently populated.",
-                    )
-            return
+            if self.status & PlatformSlot.State.OCCUPIED:
+                self.fire_status(None, None)
+                self.fire( ft.event.UpdateStatus,
+                        message = "WARNING: PlatformSlot currently populated.",
+                        )
+                return
 
-        self.uut = UnitUnderTest(self.config, self, serial_number)
-        self.uut.set_address(serial_number)
-        self.uut.configure(serial_number, self.product)
+            self.uut = UnitUnderTest(self.config, self, serial_number)
+            self.uut.set_address(serial_number)
+            self.uut.configure(serial_number, self.product)
 
-        self.platform.uuts[serial_number] = self.uut
+            self.platform.uuts[serial_number] = self.uut
         
-        self.fire_status(PlatformSlot.State.OCCUPIED, None)
-        self.fire( ft.event.PlatformSlotEvent, 
-                obj = self,
-                current_uut = serial_number,
-                product_type = self.product.name,
-                metadata_version = self.product.metadata_version,
-                specification_name = self.product.specification_name,
-                )
-        self.powerdown()
-
-        self.lock.release()
+            self.fire_status(PlatformSlot.State.OCCUPIED, None)
+            self.fire( ft.event.PlatformSlotEvent, 
+                    obj = self,
+                    current_uut = serial_number,
+                    product_type = self.product.name,
+                    metadata_version = self.product.metadata_version,
+                    specification_name = self.product.specification_name,
+                    )
+            self.powerdown()
 
     ## Remove the current UUT object.
     #
     def _clear_uut(self):
         self.uut.deactivate()
+        self.uut.release_capture()
+        address_registry.unregister(self.uut)
         self.fire_status(None, PlatformSlot.State.OCCUPIED)
         self.fire( ft.event.PlatformSlotEvent,
                 obj = self,
@@ -236,15 +281,22 @@ class PlatformSlot(PlatformSlotDB, Commandable, EventGenerator):
 
     class CommandsSync:
         @staticmethod
+        @query
         def acknowledge(platform_slot, data):
             return data, ""
 
         @staticmethod
+        @query
         def get_manifest(platform_slot, data):
             product = platform_slot.product
             product_list = product.manifest["repositories"]
             return product_list, ""
 
+        @staticmethod
+        @preempt
+        def abort(platform_slot, data):
+            return platform_slot.abort(), ""
+
         @staticmethod
         def set_product_version(platform_slot, data):
             product = platform_slot.product
@@ -8,7 +8,7 @@
 #  running an NFS test.
 #
 
-import sys, os, shutil, tarfile
+import sys, os, shutil, tarfile, threading
 
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
@@ -16,6 +16,8 @@ from ft import Base
 
 from ft.platform import HasMetadata, GenConfig, GenConfig2
 from ft.util.yaml_util import load_manifest
+from ft.util.metadata_cache import metadata_cache
+from ft.platform.worktree import worktree_manager
 from ft.test import Specification
 
 class ProductDB(Base):
@@ -35,17 +37,29 @@ class ProductDB(Base):
                 self.metadata['rev'], )
         return rstring % rtuple
 
+## Symlink to the most recently selected metadata, the default CURRENT_TEST
+#  of the Makefile when make is run by hand; pyft's own deployments pass the
+#  slot's worktree instead.
+#
+CURRENT_TEST = "current_test"
+
+_current_test_lock = threading.Lock()
+
 class Product(ProductDB, HasMetadata):
 
     __metadata_type__ = "products"
 
     __deployed_files = []
 
-    def __init__(self, manifest_file):
+    ## @param owner Name under which worktrees are acquired; products without
+    #  an owner check versions out in the shared clone.
+    #
+    def __init__(self, manifest_file, owner=None):
         self.manifest = load_manifest(manifest_file)
         self.metadata_repo_dict = self.manifest["metadata_repo"]
 
         self.repo = None
+        self.owner = owner
     
         self.specification = None
         self.__specification_list = list()
@@ -57,19 +71,32 @@ class Product(ProductDB, HasMetadata):
         self.config = None
 
     def select(self, version):
-        self.repo.checkout(version)
+        if self.owner is None:
+            self.repo.checkout(version)
+            self.local_path = self.repo.local_path
+        else:
+            self.local_path = worktree_manager.acquire(self.repo, version,
+                    self.owner)
+        self.__specification_list = list()
         self.configure()
         self.metadata_version = version
+        self.__link_current_test()
+
+    ## Point CURRENT_TEST at this product's metadata; the link is replaced
+    #  with a rename so that it never goes missing.
+    #
+    def __link_current_test(self):
+        with _current_test_lock:
+            temporary = "{0}.{1}".format(CURRENT_TEST, os.getpid())
+            if os.path.lexists(temporary):
+                os.unlink(temporary)
+            os.symlink(os.path.abspath(self.local_path), temporary)
+            os.rename(temporary, CURRENT_TEST)
 
     def configure(self):
         config_file = os.path.join(self.local_path, "config.yaml")
         self.config = GenConfig2(config_file)
 
-        current_test = "current_test"
-        if os.path.exists(current_test):
-            os.unlink(current_test)
-        os.symlink(self.local_path, current_test)
-
     def get_file_path(self, file_name):
         return os.path.join(self.local_path, file_name)
 
@@ -121,6 +148,12 @@ class Product(ProductDB, HasMetadata):
 
     def __load_single_spec(self, file_name):
         if file_name.endswith(".yaml"):
-            spec = Specification(file_name)
-            self.__specification_list.append(spec.test_spec)
+            test_spec = metadata_cache.load(file_name, _load_specification,
+                    "specification")
+            self.__specification_list.append(test_spec)
+
+## Parse and validate a specification file; used as metadata cache loader.
+#
+def _load_specification(file_name):
+    return Specification(file_name).test_spec
 
@@ -7,7 +7,8 @@
 #  various interfaces.
 #
 
-import logging, threading, time, xmlrpclib
+import logging, threading, socket, time
+from functools import wraps
 from string import Template
 
 from sqlalchemy import ( Column, Integer, String, Boolean, DateTime, Text,
@@ -23,8 +24,44 @@ from interfaces import (
 from ft.event import EventGenerator
 import ft.event
 from ft import Base
-from ft.command import Commandable
+from ft.command import Commandable, RecipientType, address_registry
+from ft.util.locker import (RWLock, OperationToken, query, preempt,
+        idempotent)
 from ft.test import Test
+from ft.test.retry import RetryBudget, DEFAULT_BUDGET
+from ft.test.scheduler import TestScheduler, EventSequencer, DEFAULT_WORKERS
+from ft.test.journal import get_journal, get_spec_hash
+from ft.util.metadata_cache import get_head_commit
+from eserial.capture import get_capture
+from telemetry import trace, metrics
+from ft.test.measurement import get_measurement_sink
+
+## Seconds to wait for the resident test agent after boot before starting it
+#  from the console, e.g. on a root filesystem without one.
+#
+AGENT_TIMEOUT = 10
+
+## Seconds to wait for an agent started from the console.
+#
+AGENT_START_TIMEOUT = 30
+
+## Decorator tracing a UUT stage and observing its duration in the
+#  "ft_uut_stage_seconds" histogram of the UUT's slot. The start of the stage
+#  is marked "stage:<name>" in the UUT's console capture.
+#
+def _stage(name):
+    def decorator(f):
+        traced = trace.traced(name, "uut")(f)
+        @wraps(f)
+        def wrapper(uut, *args, **kwargs):
+            if uut.capture:
+                uut.capture.mark("stage:" + name)
+            slot = getattr(uut.platform_slot, "address", None)
+            with metrics.timer("ft_uut_stage_seconds", stage=name,
+                    slot=slot[1] if slot else None):
+                return traced(uut, *args, **kwargs)
+        return wrapper
+    return decorator
 
 ## Representation of a UUT for logging/viewing purposes.
 #
@@ -84,12 +121,18 @@ class UnitUnderTestDB(Base, EventGenerator):
 #  
 class UnitUnderTest(UnitUnderTestDB, Commandable):
 
+    recipient_type = RecipientType.UUT
+
     def __init__(self, config, parent=None, serial_number="0000000000"):
         self.serial_number = serial_number
         self.product = None
         self.mac_address = None
         self.ip_address = None
         self.status = self.State.INIT
+        self.retry_budget = None
+        self.event_sequencer = None
+        self.journal = None
+        self.capture = None
 
         self.name = "Anonymous Unit"
 
@@ -99,10 +142,11 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         self.platform_slot = parent
         self.event_handler = parent.event_handler
 
-        self.lock = threading.RLock()
+        self.lock = RWLock("UnitUnderTest-{0}".format(serial_number))
 
     def set_address(self, serial_number):
         self.address = (self.platform_slot.address, serial_number)
+        address_registry.register(self)
         self.fire( ft.event.UUTInit,
                 obj = self,
                 name = self.serial_number,
@@ -135,6 +179,16 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         # status notification
         self.fire_status(None, UnitUnderTest.State.ACTIVE)
 
+    ## Stop capturing the console; see eserial.capture.
+    #
+    def release_capture(self):
+        if self.capture:
+            serial = self.serial()
+            if serial and serial.capture is self.capture:
+                serial.capture = None
+            self.capture.close()
+            self.capture = None
+
     def powerdown(self):
         self.platform_slot.powerdown()
         self.status = UnitUnderTest.State.ACTIVE
@@ -149,8 +203,11 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         self.mac_address = mac_address
 
         self.name = product.name
+        self.journal = get_journal(serial_number)
 
         self.serial = self.platform_slot.get_serialport()
+        self.capture = get_capture(serial_number)
+        self.serial().capture = self.capture
         self.interfaces = { 
                 "linux" : LinuxTerminalInterface(
                     prompt = self.product.config.prompt["linux"]["test"],
@@ -188,10 +245,12 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
     # @param template_string Python Template string.
     # @param mapping Dictionary object whose keys correspond to variables to be
     # interpolated in the "template_string".
+    # @param token Cancellation token checked while talking to U-Boot.
     # @param kwargs Contains additional key-value pairs to be added to the
     # "mapping" object.
     #
-    def __uboot_prep(self, template_string, mapping, **kwargs):
+    @_stage("uboot_prep")
+    def __uboot_prep(self, template_string, mapping, token, **kwargs):
         for key, value in kwargs.items():
             mapping[key] = value
 
@@ -212,7 +271,7 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         self.activate()
 
         # listen for U-Boot prompt
-        if not interface.chk(10):
+        if not interface.chk(10, token=token):
             raise Exception("U-Boot prompt not found!")
 
         self.fire_status(UnitUnderTest.State.BOOTL, UnitUnderTest.State.READY)
@@ -220,7 +279,7 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         # run given uboot template line-by-line at uboot prompt
         for command in commands:
             if len(command) > 0:
-                interface.cmd(command)
+                interface.cmd(command, token=token)
 
         # set UUT's IP address
         self.ip_address = interface.get_var("ipaddr")
@@ -228,8 +287,12 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
 
         self.fire_status(UnitUnderTest.State.READY, None)
 
-    def _nfs_test_boot(self):
+    @_stage("nfs_test_boot")
+    def _nfs_test_boot(self, token=None):
+        if token is None:
+            token = OperationToken("nfs_test_boot")
         self.fire_status(UnitUnderTest.State.BOOT_NFS, None)
+        self.platform_slot.wait_deployment()
         # get nfs_test.template from product
         template_string = self.product.get_file("nfs_test.template")
         
@@ -239,7 +302,7 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
 
         # pass in template string, mapping dict, and additional values to be
         # added to the mapping dict, get interface object back
-        self.__uboot_prep(template_string, mapping_dict, 
+        self.__uboot_prep(template_string, mapping_dict, token,
             server_ip = platform.config.server_ip,
             gateway_ip = platform.config.gateway_ip,
             nfs_base_dir = platform.config.nfs_base_dir,
@@ -250,47 +313,63 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         # run boot command
         interface = self.interfaces["uboot"]
 
-        interface.cmd("run boot-test", prompt="sh-3.2#", timeout=40)
+        interface.cmd("run boot-test", prompt="sh-3.2#", timeout=40,
+                token=token)
 
         self.fire_status(UnitUnderTest.State.READY | UnitUnderTest.State.LINUX,
                 UnitUnderTest.State.BOOTING)
 
     ## Initialize UUT's Test objects; if UUT is not booted, boot it to nfs.
     #
-    def _initialize_tests(self):
+    @_stage("initialize_tests")
+    def _initialize_tests(self, token=None):
+        if token is None:
+            token = OperationToken("initialize_tests")
         if not (self.status & (UnitUnderTest.State.LINUX |
             UnitUnderTest.State.BOOT_NFS)):
-            self._nfs_test_boot()
+            self._nfs_test_boot(token)
 
         while not self.status & UnitUnderTest.State.READY:
             logging.debug("Not ready.")
-            time.sleep(0.1)
+            token.sleep(0.1)
 
         self.fire_status(UnitUnderTest.State.LOAD_TESTS, None)
         interface = self.interfaces["linux"]
 
-        # run xmlrpc server on remote machine
-        if self.options and self.options.debug > 0:
-            interface.cmd("./bin/xmlrpcserver.py -P -p 8001 {0}".format(self.ip_address))
-        else:
-            interface.cmd("./bin/xmlrpcserver.py -p 8001 {0} &".format(self.ip_address))
-
-        # time out 5 seconds to give xmlrpc server a chance to load and become
-        # ready to respond
-        time.sleep(5)
+        with trace.span("rpc_startup", "uut"):
+            # run xmlrpc server on remote machine
+            if self.options and self.options.debug > 0:
+                interface.cmd("./bin/xmlrpcserver.py -P -p {0} {1}".format(
+                    xmlrpc.AGENT_PORT, self.ip_address), token=token)
+
+                # time out 5 seconds to give xmlrpc server a chance to load
+                # and become ready to respond
+                token.sleep(5)
+            elif not self.__wait_for_agent(AGENT_TIMEOUT, token):
+                logging.info("No test agent on {0}, starting it".format(
+                    self.ip_address))
+                started, output = interface.cmd(
+                        "./bin/xmlrpcserver.py -p {0} {1} &".format(
+                            xmlrpc.AGENT_PORT, self.ip_address),
+                        prompt=xmlrpc.READY_MARKER,
+                        timeout=AGENT_START_TIMEOUT, token=token)
+                if not started:
+                    logging.warning("Test agent on {0} not ready".format(
+                        self.ip_address))
         
         # initialize xmlrpc client
-        xmlrpc_server_address = "http://{0}:{1}".format(self.ip_address, "8001")
+        xmlrpc_server_address = "http://{0}:{1}".format(self.ip_address,
+                xmlrpc.AGENT_PORT)
         def load_xmlrpc_client():
             try:
-                xmlrpc_client = xmlrpclib.ServerProxy(xmlrpc_server_address,
-                        allow_none=True)
+                xmlrpc_client = xmlrpc.ThreadLocalServerProxy(
+                        xmlrpc_server_address, allow_none=True)
             except Exception:
                 import traceback
                 logging.warning("XML RPC Client Connection Failure: {0}".format(
                     xmlrpc_server_address))
                 logging.warning(traceback.format_exc())
-                time.sleep(2)
+                token.sleep(2)
                 xmlrpc_client = load_xmlrpc_client()
             return xmlrpc_client
 
@@ -301,29 +380,91 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
 
         # initialize Tests from Product's Specification and xmlrpc client
         specification_dict = self.product.specification
+        self.__reset_retry_budget()
+        self.event_sequencer = EventSequencer(self.event_handler)
+        revision = (get_head_commit(self.product.local_path) or
+                self.product.metadata_version)
         self.tests = []
 
         for i, test_dict in enumerate(specification_dict["testlist"]):
             test = Test(test_dict, self, xmlrpc_client)
+            test.event_handler = self.event_sequencer.get_channel(i)
+            test.spec_hash = get_spec_hash(test_dict, revision)
             test.set_address(i)
             test.initialize_actions()
             self.tests.append(test)
 
         self.fire_status(UnitUnderTest.State.READY, UnitUnderTest.State.LOAD_TESTS)
 
+    ## Wait up to "timeout" seconds until the test agent accepts connections,
+    #  and return whether it does.
+    #
+    def __wait_for_agent(self, timeout, token):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                socket.create_connection((self.ip_address, xmlrpc.AGENT_PORT),
+                        max(0.1, min(1, deadline - time.time()))).close()
+                return True
+            except socket.error:
+                if time.time() >= deadline:
+                    return False
+                token.sleep(0.1)
+
     ## Run all tests; if tests are not initialized, initialize them.
     #
-    def _run_all_tests(self):
+    #  Tests run concurrently where their "resources" and "depends" entries
+    #  allow it, at most "max_parallel" (from the specification) at a time;
+    #  see ft.test.scheduler.
+    #
+    #  @param resume Skip the tests that the UUT's journal shows passed on
+    #  the same specification and metadata revision.
+    #
+    @_stage("run_all_tests")
+    def _run_all_tests(self, token=None, resume=False):
+        if token is None:
+            token = OperationToken("run_all_tests")
         if len(self.tests) == 0:
             self.fire( ft.event.UpdateStatus,
                     obj = self,
                     message = "WARNING: No tests available!",
                     )
         self.fire_status(UnitUnderTest.State.TESTING, UnitUnderTest.State.READY)
-        for test in self.tests:
-            test.run()
+        self.__reset_retry_budget()
+        scheduler = TestScheduler(self.tests, self.event_sequencer,
+                self.specification.get("max_parallel", DEFAULT_WORKERS))
+
+        skip = []
+        if resume and self.journal:
+            passed = self.journal.get_passed()
+            for i, test in enumerate(self.tests):
+                if (test.name, test.spec_hash) in passed:
+                    test.resume()
+                    skip.append(i)
+            if skip:
+                self.fire( ft.event.UpdateStatus,
+                        obj = self,
+                        message = "INFO: Resuming, {0} of {1} tests already "
+                            "passed.".format(len(skip), len(self.tests)),
+                        )
+        scheduler.run(token, skip)
+        failed = any(test.status & Test.State.FAIL for test in self.tests)
+        metrics.registry.counter("ft_uuts_tested_total",
+                result="fail" if failed else "pass").inc()
+
+        sink = get_measurement_sink()
+        if sink:
+            sink.flush()
         self.fire_status(UnitUnderTest.State.READY, UnitUnderTest.State.TESTING)
 
+    ## Give the UUT a fresh budget of retries, shared by all of its tests.
+    #
+    #  The size comes from the specification's "retry_budget" entry.
+    #
+    def __reset_retry_budget(self):
+        limit = self.specification.get("retry_budget", DEFAULT_BUDGET)
+        self.retry_budget = RetryBudget(limit)
+
     def _load_kfs(self):
         pass
 
@@ -337,18 +478,25 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
     
     class CommandsSync:
         @staticmethod
+        @query
         def acknowledge(uut, data):
             return data, ""
 
+        @staticmethod
+        @preempt
+        def abort(uut, data):
+            return uut.platform_slot.abort(), ""
+
     class CommandsAsync:
         @staticmethod
         def acknowledge(uut, data):
             pass
 
         @staticmethod
+        @idempotent
         def nfs_test_boot(uut, data):
-            uut._nfs_test_boot()
-            uut._initialize_tests()
+            uut._nfs_test_boot(uut.operation)
+            uut._initialize_tests(uut.operation)
 
         @staticmethod
         def nfs_full_boot(uut, data):
@@ -358,19 +506,24 @@ class UnitUnderTest(UnitUnderTestDB, Commandable):
         def onboard_flash_boot(uut, data):
             pass
 
+        ## Run all tests; only when "data" is {"resume": True} are the tests
+        #  the UUT's journal shows passed skipped.
+        #
         @staticmethod
+        @idempotent
         def run_all_tests(uut, data):
 
             if len(uut.tests) == 0:
-                uut._initialize_tests()
-                time.sleep(20) # BUG507
+                uut._initialize_tests(uut.operation)
+                uut.operation.sleep(20) # BUG507
 
             uut.fire( ft.event.UpdateStatus,
                     obj = uut,
                     message = "INFO: Finishing test setup.",
                     )
 
-            uut._run_all_tests()
+            resume = isinstance(data, dict) and data.get("resume") is True
+            uut._run_all_tests(uut.operation, resume)
 
         @staticmethod
         def load_bootloader(uut, data):
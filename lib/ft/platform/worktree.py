@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package worktree
+#
+#  Gives every PlatformSlot its own checkout of product metadata. Instead of
+#  switching the shared clone between versions (and racing with other slots),
+#  each slot/version pair gets a "git worktree" next to the clone. Worktrees
+#  are kept after a slot moves on so that they can be reused by later units,
+#  created on a background thread and garbage-collected least recently used
+#  first once more than "capacity" of them exist.
+#
+
+import os.path as path, re, shutil, threading, time, logging
+
+class _Worktree(object):
+
+    def __init__(self, repo, version, owner, local_path):
+        self.repo = repo
+        self.version = version
+        self.owner = owner
+        self.local_path = local_path
+
+        self.in_use = False
+        self.last_used = time.time()
+        self.error = None
+        self.ready = threading.Event()
+
+class WorktreeManager(object):
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.worktrees = dict()
+        self.owners = dict()
+
+    ## Start creating the worktree for the given slot and version in the
+    #  background, if it does not exist yet.
+    #
+    #  @param repo GitMetaDataRepo whose clone the worktree is added to.
+    #  @param version Any ref accepted by "git checkout".
+    #  @param owner Name of the slot that will use the worktree.
+    #
+    def prepare(self, repo, version, owner):
+        key = (repo.url, version, owner)
+        with self.lock:
+            worktree = self.worktrees.get(key)
+            if worktree and not worktree.error:
+                return worktree
+            worktree = _Worktree(repo, version, owner,
+                    self.__get_path(repo, version, owner))
+            self.worktrees[key] = worktree
+
+        thread = threading.Thread(target=self.__create, args=(worktree,),
+                name="Worktree-{0}".format(owner))
+        thread.daemon = True
+        thread.start()
+        return worktree
+
+    ## Return the path of the worktree for the given slot and version, waiting
+    #  for it to be created if necessary. Any worktree previously held by the
+    #  owner is released.
+    #
+    def acquire(self, repo, version, owner):
+        worktree = self.prepare(repo, version, owner)
+        worktree.ready.wait()
+        if worktree.error:
+            raise worktree.error
+
+        with self.lock:
+            previous = self.owners.get(owner)
+            if previous and previous is not worktree:
+                previous.in_use = False
+                previous.last_used = time.time()
+            worktree.in_use = True
+            worktree.last_used = time.time()
+            self.owners[owner] = worktree
+
+        self.collect()
+        return worktree.local_path
+
+    def release(self, owner):
+        with self.lock:
+            worktree = self.owners.pop(owner, None)
+            if worktree:
+                worktree.in_use = False
+                worktree.last_used = time.time()
+
+    ## Remove the least recently used idle worktrees beyond capacity.
+    #
+    def collect(self):
+        with self.lock:
+            idle = [w for w in self.worktrees.values()
+                    if not w.in_use and w.ready.is_set()]
+            excess = len(self.worktrees) - self.capacity
+            if excess <= 0:
+                return
+            idle.sort(key=lambda w: w.last_used)
+            evicted = idle[:excess]
+            for worktree in evicted:
+                del self.worktrees[(worktree.repo.url, worktree.version,
+                    worktree.owner)]
+
+        for worktree in evicted:
+            self.__remove(worktree)
+
+    ## Absolute, since git runs in the clone and would put a relative path
+    #  under it.
+    #
+    def __get_path(self, repo, version, owner):
+        name = re.sub(r"[^\w.-]+", "_", "{0}-{1}".format(owner, version))
+        return path.join(path.abspath(repo.local_path) + ".worktrees", name)
+
+    def __create(self, worktree):
+        repo = worktree.repo
+        try:
+            with repo.lock:
+                git = repo.repo.git
+                if path.exists(path.join(worktree.local_path, ".git")):
+                    # Left over from an earlier run; reuse it.
+                    git.execute(["git", "-C", worktree.local_path, "checkout",
+                        "--detach", "--force", worktree.version])
+                else:
+                    if path.exists(worktree.local_path):
+                        shutil.rmtree(worktree.local_path)
+                    git.worktree("prune")
+                    git.worktree("add", "--detach", "--force",
+                            worktree.local_path, worktree.version)
+        except Exception as e:
+            logging.warning("Could not create worktree {0}: {1}".format(
+                worktree.local_path, e))
+            worktree.error = e
+        worktree.ready.set()
+
+    def __remove(self, worktree):
+        repo = worktree.repo
+        try:
+            with repo.lock:
+                shutil.rmtree(worktree.local_path, ignore_errors=True)
+                repo.repo.git.worktree("prune")
+        except Exception:
+            logging.warning("Could not remove worktree {0}".format(
+                worktree.local_path))
+
+worktree_manager = WorktreeManager()
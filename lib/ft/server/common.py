@@ -4,6 +4,8 @@
 from multiprocessing import Queue
 import time, threading, logging, Queue as StdLibQueue
 
+from ft.command import CommandRecord
+
 class PlatformClient(threading.Thread):
 
     def __init__(self):
@@ -29,6 +31,8 @@ class PlatformClient(threading.Thread):
             self._handle_outgoing_queue()
 
     def run_command(self, command):
+        if isinstance(command, CommandRecord):
+            command = command.encode()
         self.outgoing_queue.put(command)
         if command == "TERMINATE":
             time.sleep(1)
@@ -49,8 +53,23 @@ class PlatformClient(threading.Thread):
     def terminate(self):
         logging.debug("Client TERMINATE sequence")
         self.run_command("TERMINATE")
+        self.__stop()
+
+    ## Leave the server running for its other clients and stop this one.
+    #
+    def disconnect(self):
+        logging.debug("Client DISCONNECT sequence")
+        self.outgoing_queue.put("DISCONNECT")
+        self.__stop()
+
+    ## Stop the loop once the outgoing queue has been sent, then close.
+    #
+    def __stop(self):
         while not self.outgoing_queue.empty():
-            pass
+            time.sleep(0.01)
+        self.running.clear()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
         self._terminate()
 
     def _terminate(self):
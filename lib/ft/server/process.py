@@ -6,9 +6,12 @@ from multiprocessing import Process, Pipe, Queue
 import signal, logging, threading, os
 
 import ft.event
-from ft.platform import Platform
+from telemetry.imports import LazyModule
 from ft.server.common import PlatformClient, EventHandlerRegistry
 
+# only loaded by the server, when it creates the platform
+platform = LazyModule("ft.platform")
+
 class PlatformProcessClient(PlatformClient):
 
     def __init__(self, server_info, *args, **kwargs):
@@ -129,7 +132,7 @@ class PlatformServer(object):
         self.serverinfo = (self.ui_channel, self.server_channel)
 
     def init_platform(self, manifest_file):
-        self.platform = Platform(manifest_file, self.server)
+        self.platform = platform.Platform(manifest_file, self.server)
         self.server.platform = self.platform
         return
 
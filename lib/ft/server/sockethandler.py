@@ -70,7 +70,11 @@ class SocketDataHandler(object):
         self.address = address
 
     def close(self):
-        self.__socket.shutdown(socket.SHUT_RDWR)
+        try:
+            self.__socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            # the peer has already gone
+            pass
         self.__socket.close()
 
     def fileno(self):
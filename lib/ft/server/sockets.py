@@ -1,11 +1,11 @@
 #!/usr/bin/env python
 # vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
 
-import Queue as StdLibQueue, threading, logging, os, socket, select, time
-from multiprocessing import Queue
+import Queue as StdLibQueue, threading, logging, os, socket, select
 
 import ft.event
-from ft.platform import Platform
+from telemetry.imports import LazyModule
+from telemetry import trace, metrics
 
 from ft.server.sockethandler import (
     QueuedSocketHandler, 
@@ -18,6 +18,11 @@ from ft.server.common import (
         PlatformTimeoutError,
         )
 
+# only loaded by the server, when it creates the platform
+platform = LazyModule("ft.platform")
+
+log = logging.getLogger(__name__)
+
 class PlatformSocketClient(PlatformClient):
 
     def __init__(self, server_info, *args, **kwargs):
@@ -27,7 +32,7 @@ class PlatformSocketClient(PlatformClient):
         self.server.connect(server_info)
 
         self.socket_handler = SocketObjectHandler(self.server)
-        logging.debug("connected to server")
+        log.debug("connected to server")
 
     def _receive_message(self):
         readable, writable, exceptional = select.select(
@@ -42,13 +47,12 @@ class PlatformSocketClient(PlatformClient):
 
     def _handle_message(self, message):
         if isinstance(message, ft.event.Event):
-            logging.debug(message)
+            log.debug("%s", message)
             self.handler_registry.fire(message)
         elif message[0] == "RESPONSE":
             self.incoming_queue.put(message[1])
         else:
-            logging.error("Unhandled PlatformServer message: "
-                          "{0}".format(message))
+            log.error("Unhandled PlatformServer message: %s", message)
 
     def _get_outgoing_item(self):
         try:
@@ -93,10 +97,14 @@ class PlatformSocketServer(threading.Thread):
         self.commands = None
         self.platform = None # is set externally
         self.event_registry = EventHandlerRegistry()
-        self.temp_queue = Queue() 
+        # events fired before the first client connects; only used by this
+        # process, so a multiprocessing Queue would only add its feeder thread
+        self.temp_queue = StdLibQueue.Queue()
 
     def fire(self, event, **kwargs):
         e = event(**kwargs)
+        metrics.registry.counter("ft_events_total",
+                event=event.__name__).inc()
         if len(self.socket_dict) == 0:
             self.temp_queue.put(e)
         else:
@@ -107,9 +115,9 @@ class PlatformSocketServer(threading.Thread):
         while self.running.is_set():
             client_socket, address = self.socket.accept()
             client_socket_handler = QueuedSocketHandler(client_socket, address)
-            logging.debug("client connected: " + str(address))
+            log.debug("client connected: %s", address)
             self.__register_socket(client_socket_handler)
-            logging.debug("client socket registered: " + str(address))
+            log.debug("client socket registered: %s", address)
 
     def run(self):
         self.commands = self.platform.commands
@@ -143,15 +151,13 @@ class PlatformSocketServer(threading.Thread):
         with self.poll_lock:
             self.poll.register(socket_handler, self.__poll_mask)
         self.socket_dict[socket_handler.fileno()] = socket_handler
-        tmp = Queue()
-        while not self.temp_queue.empty():
-            logging.debug("emptying temp_queue")
-            e = self.temp_queue.get(False)
-            tmp.put(e)
-        time.sleep(0.3)
-        while not tmp.empty():
-            logging.debug("queuing socket_handler")
-            e = tmp.get(False)
+        metrics.registry.gauge("ft_server_clients").inc()
+        while True:
+            try:
+                e = self.temp_queue.get(False)
+            except StdLibQueue.Empty:
+                break
+            log.debug("queuing socket_handler")
             socket_handler.put(e)
 
     def __unregister_socket(self, socket_handler):
@@ -159,31 +165,40 @@ class PlatformSocketServer(threading.Thread):
             self.poll.unregister(socket_handler)
             self.socket_dict.pop(socket_handler.fileno())
             socket_handler.close()
+        metrics.registry.gauge("ft_server_clients").dec()
 
     def __handle_socket_fd(self, event):
         error = None
         socket_fd, event_mask = event
-        socket_handler = self.socket_dict[socket_fd]
-
-        if event_mask & (select.POLLPRI | select.POLLIN):
-            command = self.__receive_command(socket_handler)
-            if command:
-                result = self.__handle_command(command)
-                if result[0] == "RESPONSE":
-                    socket_handler.put(result)
-                elif result[0] == "DISCONNECT":
-                    self.__unregister_socket(socket_handler)
-                    # TODO: determine whether client had control, if so reset
-                    # server to "clean" state that can be connected to and
-                    # controlled by another client
-                elif result[0] == "TERMINATE":
-                    self.__unregister_socket(socket_handler)
-                    # TODO: finish handling proper termination in multi-client
-                    # case
-        if event_mask & select.POLLOUT:
-            message = socket_handler.get()
-            if message:
-                socket_handler.send(message)
+        socket_handler = self.socket_dict.get(socket_fd)
+        if socket_handler is None:
+            # unregistered while handling an earlier event of the same poll
+            return
+
+        try:
+            if event_mask & (select.POLLPRI | select.POLLIN):
+                command = socket_handler.recv()
+                if command:
+                    result = self.__handle_command(command)
+                    if result[0] == "RESPONSE":
+                        socket_handler.put(result)
+                    elif result[0] == "DISCONNECT":
+                        self.__unregister_socket(socket_handler)
+                        # TODO: determine whether client had control, if so
+                        # reset server to "clean" state that can be connected
+                        # to and controlled by another client
+                        return
+                    elif result[0] == "TERMINATE":
+                        self.__unregister_socket(socket_handler)
+                        # TODO: finish handling proper termination in
+                        # multi-client case
+                        return
+            if event_mask & select.POLLOUT:
+                message = socket_handler.get()
+                if message:
+                    socket_handler.send(message)
+        except (PlatformSocketError, socket.error) as e:
+            error = "Connection lost: {0}".format(e)
 
         if event_mask & select.POLLHUP:
             error = "Unexpected disconnect from client."
@@ -192,32 +207,30 @@ class PlatformSocketServer(threading.Thread):
         if event_mask & select.POLLNVAL:
             error = "Invalid request, descriptor not open."
 
+        # a client going away must not take the server and the other clients
+        # down with it
         if error:
+            log.warning("Client %s: %s", socket_handler.address, error)
             self.__unregister_socket(socket_handler)
-            raise PlatformSocketError(error)
-
-    def __receive_command(self, socket_handler):
-        try:
-            command = socket_handler.recv()
-        except PlatformSocketError:
-            return None
-        return command
 
     def __handle_command(self, command):
         if command == "TERMINATE":
-            logging.debug("Server TERMINATE sequence")
+            log.debug("Server TERMINATE sequence")
             self.running.clear()
             return ("TERMINATE", (False, ""))
         if command == "DISCONNECT":
             return ("DISCONNECT", (False, ""))
         if command == None:
             return ("RESPONSE", (False, ""))
-        logging.debug(command)
+        log.debug("%s", command)
         result = ("RESPONSE", self.__run_command(command))
         return result
 
     def __run_command(self, command):
-        return self.commands.run_command(command)
+        metrics.registry.counter("ft_server_requests_total").inc()
+        with trace.span("run_command", "server"), \
+                metrics.timer("ft_server_request_seconds"):
+            return self.commands.run_command(command)
 
     def __cleanup(self):
         self.platform.cleanup()
@@ -244,7 +257,7 @@ class PlatformServer(object):
         self.serverinfo = (self.server.address, self.server.port)
 
     def init_platform(self, options):
-        self.platform = Platform(self.server, options)
+        self.platform = platform.Platform(self.server, options)
         self.server.platform = self.platform
 
     ## If running locally as a thread or process, start the thread/process and
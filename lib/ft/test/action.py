@@ -10,6 +10,12 @@ from ft import Base
 from ft.event import EventGenerator
 import ft.event
 from ft.util import ui_adapter
+from ft.test.measurement import get_measurement_sink
+from ft.command import RecipientType, address_registry
+from ft.util.locker import OperationCancelled
+from telemetry import trace
+
+log = logging.getLogger(__name__)
 
 ## Base class for actions that comprise a test run.
 #
@@ -50,6 +56,8 @@ class ActionDB(Base):
 #
 class Action(ActionDB, EventGenerator):
 
+    recipient_type = RecipientType.ACTION
+
     ## The constructor
     #
     # Fires ActionInit and ActionReady events
@@ -81,12 +89,19 @@ class Action(ActionDB, EventGenerator):
         if action_dict.has_key("log_output"):
             log_action_output   = action_dict["log_output"]
 
+        # run with start() and poll() instead of "method_name"
+        self.stream = False
+        if action_dict.has_key("stream"):
+            self.stream = action_dict["stream"]
+
         self.status = Action.State.INIT
+        self.error = None
 
         self.instances = {}
 
     def destroy(self):
         self._destroy()
+        address_registry.unregister(self)
         self.fire( ft.event.DestroyEvent,
                 obj = self,
                 )
@@ -98,6 +113,7 @@ class Action(ActionDB, EventGenerator):
 
     def set_address(self, address):
         self.address = (self.test.address, address)
+        address_registry.register(self)
         self.fire( ft.event.ActionInit,
                 obj = self,
                 name = self.name,
@@ -127,20 +143,35 @@ class Action(ActionDB, EventGenerator):
     #
     # @param self The object pointer
     # @param value Value of the keyword arguments, defaulted to None
+    # @param token Optional cancellation token checked before the action runs;
+    # OperationCancelled is propagated instead of being reported as an error.
+    #
+    # The exception raised by the last call, if any, is kept in "error".
     #
-    def call(self, value=None):
+    def call(self, value=None, token=None):
+        with trace.span(self.name, "action"):
+            return self.__call(value, token)
+
+    def __call(self, value, token):
+        if token:
+            token.check()
         self.fire(ft.event.ActionStart,
                 obj = self
                 )
         self.fire_status(Action.State.RUNNING | Action.State.FAIL)
         if not value == None:
             self.kwargs[self.kwargs_value_key] = value
+        self.error = None
         try:
-            result = self._call()
+            result = self._call(token)
+        except OperationCancelled:
+            self.fire_status(None, Action.State.RUNNING)
+            raise
         except:
             import traceback
+            self.error = sys.exc_info()[1]
             msg = traceback.format_exc()
-            logging.debug(msg)
+            log.debug("%s", msg)
             self.fire(ft.event.ErrorEvent,
                     obj = self,
                     traceback = msg
@@ -154,30 +185,92 @@ class Action(ActionDB, EventGenerator):
         self.fire_status(Action.State.HAS_RUN, Action.State.RUNNING)
         return result
 
-    def _call(self,):
+    def _call(self, token=None):
         instances = self.instances
 
         if not instances.has_key(self.name):
             self._generate_instance()
 
         instance = instances[self.name]
-        method = getattr(instance, self.method_name)
-        output = method(self.kwargs)
+        if self.stream:
+            output = self.__stream(instance, token)
+        else:
+            method = getattr(instance, self.method_name)
+            output = method(self.kwargs)
 
         if not output == None:
             self.exit_status, self.output = output
 
-        logging.debug(self.name)
-        logging.debug(output)
+        log.debug("%s", self.name)
+        log.debug("%s", output)
         return output
     
-    def set_status(self, exp='', act='', tol=''):
+    ## Run the instance's binary with start() and poll(), firing ActionOutput
+    #  with the output as it arrives; see BinaryCall.start().
+    #
+    #  @return (exit status, output) as BinaryCall.call(); the exit status is
+    #  0 when a pass pattern decided the result, and never 0 when a fail
+    #  pattern or the timeout did.
+    #
+    def __stream(self, instance, token):
+        job = instance.start(self.kwargs)
+        chunks = list()
+        offset = 0
+        try:
+            while True:
+                if token:
+                    token.check()
+                state = instance.poll({"job": job, "offset": offset})
+                if state["output"]:
+                    chunks.append(state["output"])
+                    self.fire(ft.event.ActionOutput,
+                            obj = self,
+                            output = state["output"],
+                            )
+                offset = state["offset"]
+                if not state["status"] == None:
+                    break
+        except OperationCancelled:
+            instance.stop({"job": job})
+            raise
+
+        log.debug("%s: %s, %s", self.name, state["result"], state["reason"])
+        if state["result"] == "pass":
+            status = 0
+        else:
+            status = state["status"] or 1
+        return status, "".join(chunks)
+
+    def set_status(self, exp='', act='', tol='', point=None):
         self.value= {
                 "expected": exp,
                 "actual": act,
                 "tolerance": tol,
                 }
         self.fire_status(value = self.value)
+        self._record_measurement(point)
+
+    ## Append the current value to the measurement sink, if one is set up.
+    #
+    def _record_measurement(self, point):
+        sink = get_measurement_sink()
+        if not sink:
+            return
+        uut = self.test.unit_under_test
+        product = uut.product
+        sink.append(
+                product = product.name,
+                specification = product.specification_name,
+                metadata_version = product.metadata_version,
+                serial_number = uut.serial_number,
+                test = self.test.name,
+                action = self.name,
+                point = point,
+                expected = self.value["expected"],
+                actual = self.value["actual"],
+                tolerance = self.value["tolerance"],
+                passed = not self.status & Action.State.FAIL,
+                )
 
 if __name__ == "__main__":
     a   = Action()
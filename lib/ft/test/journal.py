@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package journal
+#
+#  Append-only record of the tests each UUT has completed, one file per serial
+#  number. Every line is a JSON object written and synced as soon as a test
+#  finishes:
+#
+#    {"time": ..., "test": "Audio loopback", "spec": "<sha1>", "status": 4,
+#     "passed": true}
+#
+#  "spec" is the hash of the test's specification entry together with the
+#  revision of the product metadata, so a result only counts for the exact
+#  test that produced it. When run_all_tests resumes, tests whose latest entry
+#  passed are skipped and everything else runs again. A line cut short by a
+#  crash is ignored when the journal is read back.
+#
+
+import os, os.path as path, re, json, hashlib, threading, time, logging
+import types
+
+## Keys that tests and actions add to the shared specification entries while
+#  they run; they are left out of the hash.
+#
+RUNTIME_KEYS = ("xmlrpc_client", "instance_name")
+
+def _strip_runtime_keys(value):
+    if isinstance(value, dict):
+        return dict((key, _strip_runtime_keys(item))
+                for key, item in value.items() if key not in RUNTIME_KEYS)
+    if isinstance(value, (list, tuple)):
+        return [_strip_runtime_keys(item) for item in value]
+    return value
+
+## Return the hash identifying a test's specification entry at "revision".
+#
+def get_spec_hash(test_dict, revision=""):
+    def default(obj):
+        # action classes loaded from the YAML; other objects are not part of
+        # the test
+        if isinstance(obj, (type, types.ClassType, types.FunctionType)):
+            return "{0}.{1}".format(obj.__module__, obj.__name__)
+        return None
+    sha1 = hashlib.sha1(str(revision or ""))
+    sha1.update(json.dumps(_strip_runtime_keys(test_dict), sort_keys=True,
+        default=default))
+    return sha1.hexdigest()
+
+class TestJournal(object):
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+
+    ## Append the result of a finished test.
+    #
+    def record(self, name, spec_hash, status, passed, timestamp=None):
+        entry = {
+                "time": timestamp if timestamp is not None else time.time(),
+                "test": name,
+                "spec": spec_hash,
+                "status": status,
+                "passed": bool(passed),
+                }
+        line = json.dumps(entry, sort_keys=True) + "\n"
+        with self.lock:
+            try:
+                directory = path.dirname(self.file_path)
+                if not path.isdir(directory):
+                    os.makedirs(directory)
+                with open(self.file_path, "ab+") as f:
+                    f.seek(0, os.SEEK_END)
+                    if f.tell() > 0:
+                        # finish a line cut short by a crash
+                        f.seek(-1, os.SEEK_END)
+                        if not f.read(1) == "\n":
+                            line = "\n" + line
+                        f.seek(0, os.SEEK_END)
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except (IOError, OSError):
+                logging.exception("Could not write test journal: {0}".format(
+                    self.file_path))
+
+    ## Return the latest entry of every (test name, spec hash) pair.
+    #
+    def load(self):
+        entries = dict()
+        with self.lock:
+            if not path.isfile(self.file_path):
+                return entries
+            with open(self.file_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = (entry["test"], entry["spec"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    entries[key] = entry
+        return entries
+
+    ## Return the (test name, spec hash) pairs whose latest result passed.
+    #
+    def get_passed(self):
+        return set(key for key, entry in self.load().items()
+                if entry["passed"])
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]+", "_", str(name)) or "_"
+
+journal_dir = None
+
+## Configure where journals are kept; passing None disables them.
+#
+def set_journal_dir(directory):
+    global journal_dir
+    journal_dir = directory
+
+## Return the journal of the UUT with the given serial number, or None if
+#  journals are disabled.
+#
+def get_journal(serial_number):
+    if not journal_dir:
+        return None
+    return TestJournal(path.join(journal_dir,
+        _safe_name(serial_number) + ".journal"))
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package measurement
+#
+#  Append-only columnar storage for the expected/actual/tolerance points that
+#  ExpectTest actions record through Action.set_status. One file is kept per
+#  product and specification; rows are buffered in memory and written out as
+#  self-contained chunks of typed arrays so that a year of production data can
+#  be scanned without replaying events or ORM rows.
+#
+#  File layout:
+#
+#    header: MAGIC, format version, byte order, schema length, schema (json)
+#    chunk:  CHUNK_MAGIC, row count, string table length, string table (json),
+#            one packed array per schema column
+#
+#  String-valued columns (serial number, test name, ...) are dictionary
+#  encoded against the string table of the chunk they belong to.
+#
+
+import os, os.path as path, sys, re, struct, json, mmap, threading, time
+import logging
+from array import array
+
+MAGIC = "FTMC"
+CHUNK_MAGIC = "CHNK"
+FORMAT_VERSION = 1
+
+## Column schema; (name, array typecode, dictionary encoded)
+#
+SCHEMA = [
+        ("time", "d", False),
+        ("serial_number", "I", True),
+        ("metadata_version", "I", True),
+        ("test", "I", True),
+        ("action", "I", True),
+        ("point", "I", False),
+        ("expected", "d", False),
+        ("actual", "d", False),
+        ("tolerance", "d", False),
+        ("passed", "B", False),
+        ]
+
+_FILE_HEADER = struct.Struct("!4sBcH")
+_CHUNK_HEADER = struct.Struct("!4sII")
+
+_NAN = float("nan")
+
+## Convert a measured value to a float, NaN if it is not numeric.
+#
+def to_float(value):
+    if value is None or value == "":
+        return _NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]+", "_", str(name)) or "_"
+
+## Buffered columns for a single measurement file.
+#
+class _ColumnBuffer(object):
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.rows = 0
+        self.strings = []
+        self.string_index = {}
+        self.columns = dict((name, array(typecode))
+                for name, typecode, encoded in SCHEMA)
+
+    def __intern(self, value):
+        value = unicode(value)
+        index = self.string_index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.string_index[value] = index
+        return index
+
+    def append(self, row):
+        for name, typecode, encoded in SCHEMA:
+            value = row[name]
+            if encoded:
+                value = self.__intern(value)
+            self.columns[name].append(value)
+        self.rows += 1
+
+    def pack(self):
+        strings = json.dumps(self.strings).encode("utf-8")
+        data = [_CHUNK_HEADER.pack(CHUNK_MAGIC, self.rows, len(strings)),
+                strings]
+        for name, typecode, encoded in SCHEMA:
+            data.append(self.columns[name].tostring())
+        return "".join(data)
+
+## Collects measurement points and appends them to per product/specification
+#  column files.
+#
+class MeasurementSink(object):
+
+    ## @param directory Base directory of the measurement files.
+    #  @param chunk_size Number of rows buffered per file before a chunk is
+    #  written out.
+    #
+    def __init__(self, directory, chunk_size=1024):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.buffers = {}
+
+    def get_file_path(self, product, specification):
+        return path.join(self.directory, _safe_name(product),
+                _safe_name(specification) + ".ftm")
+
+    ## Record one measurement point.
+    #
+    def append(self, product, specification, serial_number, test, action,
+            point, expected, actual, tolerance, passed,
+            metadata_version="", timestamp=None):
+        row = {
+                "time": timestamp if timestamp is not None else time.time(),
+                "serial_number": serial_number,
+                "metadata_version": metadata_version,
+                "test": test,
+                "action": action,
+                "point": point or 0,
+                "expected": to_float(expected),
+                "actual": to_float(actual),
+                "tolerance": to_float(tolerance),
+                "passed": 1 if passed else 0,
+                }
+        file_path = self.get_file_path(product, specification)
+        with self.lock:
+            buf = self.buffers.get(file_path)
+            if buf is None:
+                buf = self.buffers[file_path] = _ColumnBuffer()
+            buf.append(row)
+            if buf.rows >= self.chunk_size:
+                self.__write(file_path, buf)
+
+    ## Write all buffered rows out to their files.
+    #
+    def flush(self):
+        with self.lock:
+            for file_path, buf in self.buffers.items():
+                if buf.rows > 0:
+                    self.__write(file_path, buf)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.buffers.clear()
+
+    def __write(self, file_path, buf):
+        try:
+            directory = path.dirname(file_path)
+            if not path.isdir(directory):
+                os.makedirs(directory)
+            with open(file_path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(_pack_file_header())
+                f.write(buf.pack())
+        except (IOError, OSError):
+            logging.exception("Could not write measurements: {0}".format(
+                file_path))
+        buf.clear()
+
+def _pack_file_header():
+    schema = json.dumps([(name, typecode, array(typecode).itemsize, encoded)
+        for name, typecode, encoded in SCHEMA])
+    byteorder = "<" if sys.byteorder == "little" else ">"
+    return _FILE_HEADER.pack(MAGIC, FORMAT_VERSION, byteorder,
+            len(schema)) + schema
+
+## Memory-mapped reader for measurement files written by MeasurementSink.
+#
+class MeasurementReader(object):
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    ## Return a dictionary of column name to list of values.
+    #
+    #  @param names Optional list of column names to decode; all columns are
+    #  returned by default.
+    #
+    def columns(self, names=None):
+        if names is None:
+            names = [name for name, typecode, encoded in SCHEMA]
+        result = dict((name, []) for name in names)
+        for chunk in self.chunks(names):
+            for name in names:
+                result[name].extend(chunk[name])
+        return result
+
+    ## Iterate over the stored rows as dictionaries.
+    #
+    def __iter__(self):
+        names = [name for name, typecode, encoded in SCHEMA]
+        for chunk in self.chunks(names):
+            for i in range(len(chunk["time"])):
+                yield dict((name, chunk[name][i]) for name in names)
+
+    ## Iterate over the decoded chunks of the file.
+    #
+    def chunks(self, names):
+        if not path.exists(self.file_path) or \
+                path.getsize(self.file_path) == 0:
+            return
+        with open(self.file_path, "rb") as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for chunk in self.__read_chunks(m, names):
+                    yield chunk
+            finally:
+                m.close()
+
+    def __read_chunks(self, m, names):
+        magic, version, byteorder, schema_len = _FILE_HEADER.unpack_from(m, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise MeasurementFileError(self.file_path)
+        offset = _FILE_HEADER.size
+        schema = json.loads(m[offset:offset + schema_len])
+        offset += schema_len
+
+        native = "<" if sys.byteorder == "little" else ">"
+        swap = byteorder != native
+        size = len(m)
+
+        while offset < size:
+            magic, rows, strings_len = _CHUNK_HEADER.unpack_from(m, offset)
+            if magic != CHUNK_MAGIC:
+                raise MeasurementFileError(self.file_path)
+            offset += _CHUNK_HEADER.size
+            strings = json.loads(m[offset:offset + strings_len].decode(
+                "utf-8"))
+            offset += strings_len
+
+            chunk = {}
+            for name, typecode, itemsize, encoded in schema:
+                length = rows * itemsize
+                if name in names:
+                    column = array(str(typecode))
+                    column.fromstring(m[offset:offset + length])
+                    if swap:
+                        column.byteswap()
+                    if encoded:
+                        column = [strings[i] for i in column]
+                    chunk[name] = column
+                offset += length
+            yield chunk
+
+class MeasurementFileError(Exception):
+
+    def __init__(self, file_path):
+        self.message = "Invalid measurement file: {0}".format(file_path)
+
+    def __str__(self):
+        return repr(self.message)
+
+measurement_sink = None
+
+## Configure the process-wide measurement sink; passing None disables
+#  measurement recording.
+#
+def set_measurement_sink(directory, chunk_size=1024):
+    global measurement_sink
+    if measurement_sink:
+        measurement_sink.close()
+    if directory:
+        measurement_sink = MeasurementSink(directory, chunk_size)
+    else:
+        measurement_sink = None
+    return measurement_sink
+
+def get_measurement_sink():
+    return measurement_sink
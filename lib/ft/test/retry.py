@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package retry
+#
+#  Retry policies for tests. A test in the specification may carry a "retry"
+#  dictionary, for instance:
+#
+#    retry:
+#      attempts: 3      # attempts in total, including the first one
+#      scope: action    # "test" reruns the whole test, "action" only reruns
+#                       # the action that went wrong
+#      on_fail: true    # with "action" scope, also retry actions that ran
+#                       # but failed rather than only broken ones
+#      backoff: 0.5     # seconds to wait before the first retry
+#      factor: 2        # backoff multiplier for every further retry
+#      max_backoff: 10
+#
+#  Tests without one keep the "max_retry" behaviour: the whole test is rerun
+#  when it breaks, without backoff. Whatever the policy, a test whose
+#  interface is not valid and errors that mean the UUT cannot be reached are
+#  never retried, and each retry is taken from the RetryBudget of the UUT so
+#  that a dead unit stops retrying after a bounded number of attempts.
+#
+
+import threading, xmlrpclib
+
+from ft.test.specification import SpecificationError
+
+DEFAULT_ATTEMPTS = 5
+DEFAULT_BUDGET = 10
+
+class Scope:
+    TEST    = "test"
+    ACTION  = "action"
+
+## Return True if "error" means that the UUT, or the device an action talks
+#  to, cannot be reached. Retrying those only delays the failure.
+#
+def is_interface_error(error):
+    return isinstance(error, (EnvironmentError, xmlrpclib.ProtocolError))
+
+class RetryPolicy(object):
+
+    def __init__(self, attempts=DEFAULT_ATTEMPTS, scope=Scope.TEST,
+            on_fail=False, backoff=0, factor=2, max_backoff=30):
+        self.attempts = attempts
+        self.scope = scope
+        self.on_fail = on_fail
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+
+    ## Build the policy of a test from its specification dictionary.
+    #
+    @classmethod
+    def from_test_dict(cls, test_dict):
+        attempts = test_dict.get("max_retry", DEFAULT_ATTEMPTS)
+        retry = test_dict.get("retry")
+        if retry is None:
+            return cls(attempts)
+        if not isinstance(retry, dict):
+            raise SpecificationError(" retry")
+
+        scope = retry.get("scope", Scope.TEST)
+        if not scope in (Scope.TEST, Scope.ACTION):
+            raise SpecificationError(" retry scope")
+        return cls(
+                attempts = retry.get("attempts", attempts),
+                scope = scope,
+                on_fail = retry.get("on_fail", False),
+                backoff = retry.get("backoff", 0),
+                factor = retry.get("factor", 2),
+                max_backoff = retry.get("max_backoff", 30),
+                )
+
+    ## Return the time to wait before retry number "retry" (1 based).
+    #
+    def get_delay(self, retry):
+        if not self.backoff:
+            return 0
+        return min(self.max_backoff,
+                self.backoff * self.factor ** (retry - 1))
+
+## Number of retries a UUT may spend over a whole test run, shared by all of
+#  its tests.
+#
+class RetryBudget(object):
+
+    def __init__(self, limit=DEFAULT_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    ## Take one retry from the budget; False once it is spent.
+    #
+    def take(self):
+        with self.lock:
+            if self.limit is not None and self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def get_remaining(self):
+        with self.lock:
+            if self.limit is None:
+                return None
+            return self.limit - self.used
+
+## Retry statistics of one test run.
+#
+class RetryStats(object):
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.backoff = 0.0
+        self.fail_fast = False
+        self.exhausted = False
+        self.reason = None
+
+    def get_all(self):
+        return dict(self.__dict__)
+
+## Applies a RetryPolicy and a RetryBudget to the attempts of one test run.
+#
+class Retrier(object):
+
+    def __init__(self, policy, budget=None):
+        self.policy = policy
+        self.budget = budget
+        self.stats = RetryStats()
+
+    ## Account for an attempt that broke or failed and decide whether to try
+    #  again.
+    #
+    #  @param attempt Number of attempts made so far at the thing retried,
+    #  the whole test or a single action.
+    #  @param reason Short description of what went wrong.
+    #  @param error Exception raised by the attempt, if any.
+    #
+    #  @return The delay to wait before the next attempt, or None to give up.
+    #
+    def next(self, attempt, reason, error=None):
+        stats = self.stats
+        stats.reason = reason
+        if error is not None and is_interface_error(error):
+            stats.fail_fast = True
+            return None
+        if attempt >= self.policy.attempts:
+            return None
+        if self.budget and not self.budget.take():
+            stats.exhausted = True
+            return None
+
+        stats.retries += 1
+        delay = self.policy.get_delay(stats.retries)
+        stats.backoff += delay
+        return delay
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package scheduler
+#
+#  Runs the tests of one UUT concurrently where the specification allows it.
+#  Tests may declare the interfaces they use and the tests they must follow:
+#
+#    - name: Audio loopback
+#      resources: [audio]
+#      depends: [Load audio driver]
+#
+#  Tests sharing a resource never run at the same time and a test starts only
+#  once every test it depends on has finished, whatever its result. A test
+#  without "resources" is exclusive: it runs on its own, and no test after it
+#  in the list starts before it does, so specifications that do not declare
+#  resources run strictly in order as before. An empty list marks a test that
+#  uses no shared interface at all.
+#
+#  Events of the tests are passed through an EventSequencer so the UI receives
+#  them in specification order, as if the tests had run one after the other.
+#
+
+import threading, sys, heapq
+
+from ft.test.specification import SpecificationError
+
+DEFAULT_WORKERS = 4
+
+## Return the resource tags of a test, or None if the test is exclusive.
+#
+def get_resources(test):
+    resources = test.test_dict.get("resources")
+    if resources is None or test.type == "interact":
+        return None
+    return frozenset(resources)
+
+## Return the indices of the tests each test depends on.
+#
+#  @throws SpecificationError if a dependency is unknown or circular.
+#
+def get_dependencies(tests):
+    indices = dict()
+    for i, test in enumerate(tests):
+        indices.setdefault(test.name, []).append(i)
+
+    dependencies = list()
+    for test in tests:
+        depends = set()
+        for name in test.test_dict.get("depends", []):
+            if not indices.has_key(name):
+                raise SpecificationError(" dependency '{0}' of '{1}'".format(
+                    name, test.name))
+            depends.update(indices[name])
+        dependencies.append(depends)
+
+    # depth first search for cycles
+    state = [0] * len(tests)
+    def visit(i):
+        if state[i] == 1:
+            raise SpecificationError(" circular dependency on '{0}'".format(
+                tests[i].name))
+        if state[i] == 0:
+            state[i] = 1
+            for j in dependencies[i]:
+                visit(j)
+            state[i] = 2
+    for i in range(len(tests)):
+        visit(i)
+
+    return dependencies
+
+## Return the test indices in the order they are considered for starting:
+#  specification order, except that a test always comes after the tests it
+#  depends on.
+#
+def get_order(dependencies):
+    dependents = [list() for depends in dependencies]
+    waiting = [len(depends) for depends in dependencies]
+    for i, depends in enumerate(dependencies):
+        for j in depends:
+            dependents[j].append(i)
+
+    ready = [i for i, count in enumerate(waiting) if count == 0]
+    heapq.heapify(ready)
+    order = list()
+    while ready:
+        i = heapq.heappop(ready)
+        order.append(i)
+        for j in dependents[i]:
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                heapq.heappush(ready, j)
+    return order
+
+## Forward the events of concurrently running tests in test order.
+#
+#  Each test fires through its own channel. While a scheduled run is in
+#  progress, events of a test are held back until every test before it has
+#  finished; outside of one they are passed straight on.
+#
+class EventSequencer(object):
+
+    def __init__(self, event_handler):
+        self.event_handler = event_handler
+        self.lock = threading.RLock()
+        self.__active = False
+        self.__current = 0
+        self.__finished = set()
+        self.__held = dict()
+
+    def get_channel(self, index):
+        return _EventChannel(self, index)
+
+    def start(self):
+        with self.lock:
+            self.__active = True
+            self.__current = 0
+            self.__finished = set()
+            self.__held = dict()
+
+    ## Mark test "index" as finished and release the events that can go.
+    #
+    def finish(self, index):
+        with self.lock:
+            self.__finished.add(index)
+            while self.__current in self.__finished:
+                self.__current += 1
+                self.__release(self.__current)
+
+    ## End the run, releasing whatever is still held in test order.
+    #
+    def stop(self):
+        with self.lock:
+            for index in sorted(self.__held.keys()):
+                self.__release(index)
+            self.__active = False
+
+    def fire(self, index, event, kwargs):
+        with self.lock:
+            if self.__active and index > self.__current:
+                self.__held.setdefault(index, []).append((event, kwargs))
+                return
+        self.event_handler.fire(event, **kwargs)
+
+    def __release(self, index):
+        for event, kwargs in self.__held.pop(index, []):
+            self.event_handler.fire(event, **kwargs)
+
+class _EventChannel(object):
+
+    def __init__(self, sequencer, index):
+        self.sequencer = sequencer
+        self.index = index
+
+    def fire(self, event, **kwargs):
+        self.sequencer.fire(self.index, event, kwargs)
+
+## Run a list of tests as a DAG of dependencies and resource conflicts.
+#
+class TestScheduler(object):
+
+    ## @param tests Tests in specification order.
+    #  @param sequencer Optional EventSequencer the tests fire through.
+    #  @param max_workers Largest number of tests running at once.
+    #
+    def __init__(self, tests, sequencer=None, max_workers=DEFAULT_WORKERS):
+        self.tests = tests
+        self.sequencer = sequencer
+        self.max_workers = max(1, max_workers)
+        self.resources = [get_resources(test) for test in tests]
+        self.dependencies = get_dependencies(tests)
+        self.order = get_order(self.dependencies)
+
+        self.condition = threading.Condition()
+        self.__finished = set()
+        self.__running = dict()
+        self.__error = None
+
+    ## Run every test once, returning when all of them have finished.
+    #
+    #  Exclusive tests run on the calling thread, others on threads of their
+    #  own. Once "token" is cancelled no further test is started and the
+    #  cancellation is raised after the running tests have stopped.
+    #
+    #  @param skip Indices of tests not to run; they count as finished for
+    #  the tests depending on them.
+    #
+    def run(self, token, skip=()):
+        if self.sequencer:
+            self.sequencer.start()
+        try:
+            with self.condition:
+                self.__finished.update(skip)
+            if self.sequencer:
+                for index in skip:
+                    self.sequencer.finish(index)
+            self.__run(token)
+        finally:
+            if self.sequencer:
+                self.sequencer.stop()
+
+    def __run(self, token):
+        pending = [i for i in self.order if not i in self.__finished]
+        while True:
+            with self.condition:
+                while True:
+                    if self.__error or token.is_cancelled():
+                        started = None
+                    else:
+                        started = self.__next(pending)
+                    if started is not None:
+                        break
+                    if not self.__running:
+                        if self.__error:
+                            raise self.__error[0], self.__error[1], \
+                                    self.__error[2]
+                        token.check()
+                        if not pending:
+                            return
+                        raise RuntimeError("No test can be scheduled")
+                    self.condition.wait(0.5)
+
+                pending.remove(started)
+                self.__running[started] = self.resources[started]
+                exclusive = self.resources[started] is None
+
+            if exclusive:
+                self.__run_test(started, token)
+            else:
+                thread = threading.Thread(target=self.__run_test,
+                        args=(started, token),
+                        name="Test-{0}".format(self.tests[started].name))
+                thread.daemon = True
+                thread.start()
+
+    ## Return the first pending test that may start now, if any.
+    #
+    def __next(self, pending):
+        if len(self.__running) >= self.max_workers:
+            return None
+        in_use = set()
+        for resources in self.__running.values():
+            if resources is None:
+                return None
+            in_use.update(resources)
+
+        for i in pending:
+            resources = self.resources[i]
+            if not self.dependencies[i] <= self.__finished:
+                if resources is None:
+                    return None
+                continue
+            if resources is None:
+                if self.__running:
+                    return None
+                return i
+            if not resources & in_use:
+                return i
+        return None
+
+    def __run_test(self, index, token):
+        try:
+            self.tests[index].run(token)
+        except:
+            with self.condition:
+                if not self.__error:
+                    self.__error = sys.exc_info()
+        finally:
+            with self.condition:
+                del self.__running[index]
+                self.__finished.add(index)
+                self.condition.notify_all()
+            if self.sequencer:
+                self.sequencer.finish(index)
@@ -12,7 +12,11 @@ from ft import Base
 from ft.event import EventGenerator
 import ft.event
 from ft.test import Action
+from ft.test.retry import RetryPolicy, Retrier, Scope
+from ft.command import RecipientType, address_registry
 from ft.util import ui_adapter
+from ft.util.locker import RWLock, OperationToken, OperationCancelled
+from telemetry import trace
 
 class TestDB(Base):
     
@@ -53,6 +57,9 @@ class TestDB(Base):
 #
 class Test(TestDB, EventGenerator):
 
+    recipient_type = RecipientType.TEST
+    operation = None
+
     ## Creates a new Test object
     #
     # Ensures that the test is either SingleTest or ExpectTest; Raises 
@@ -81,7 +88,8 @@ class Test(TestDB, EventGenerator):
 
     ## The constructor
     #
-    # Automatically sets max_retry to 5 if none is specified
+    # Builds the test's RetryPolicy from its "retry" dictionary, falling back
+    # to max_retry (5 if none is specified).
     #
     # @param self The object pointer
     # @param xmlrpc_client Connection to the UUT to facilitate the transparent proxy
@@ -92,7 +100,7 @@ class Test(TestDB, EventGenerator):
         self.uut_id = parent.serial_number
         self.test_dict  = test_dict
 
-        self.lock = threading.RLock()
+        self.lock = RWLock("Test-{0}".format(test_dict["name"]))
 
         self.unit_under_test = parent
         self.event_handler = parent.event_handler
@@ -104,9 +112,10 @@ class Test(TestDB, EventGenerator):
         self.shortdesc  = test_dict["shortdesc"]
         self.refdes = test_dict["refdes"]
 
-        self.max_retry  = 5
-        if test_dict.has_key("max_retry"):
-            self.max_retry  = test_dict["max_retry"]
+        self.retry_policy = RetryPolicy.from_test_dict(test_dict)
+        self.max_retry  = self.retry_policy.attempts
+        self.retrier = None
+        self.spec_hash = None
 
         self.status = Test.State.INIT
 
@@ -115,6 +124,7 @@ class Test(TestDB, EventGenerator):
 
     def set_address(self, index):
         self.address = (self.unit_under_test.address, index)
+        address_registry.register(self)
         self.fire( ft.event.TestInit,
                 obj = self,
                 name = self.name,
@@ -153,25 +163,45 @@ class Test(TestDB, EventGenerator):
 
     ## Runs the test, fires events to signal that the test begins and ends
     #
-    # Fires the TestStart event, runs the test a maximum of max_retry times
-    # (or until the test breaks), then checks the status of the test's
-    # actions. After testing, a TestFinish event is fired.
+    # Fires the TestStart event, runs the test, retrying according to the
+    # test's RetryPolicy, then checks the status of the test's actions. After
+    # testing, a TestFinish event carrying the retry statistics is fired.
     #
     # @param self The object pointer
-    #
-    def run(self,):
+    # @param token Cancellation token checked before every attempt and passed
+    # down to the test's actions; OperationCancelled is never retried.
+    #
+    def run(self, token=None):
+        with trace.span(self.name, "test"):
+            self.__run(token)
+
+    def __run(self, token):
+        if token is None:
+            token = OperationToken("run")
+        self.retrier = Retrier(self.retry_policy,
+                getattr(self.unit_under_test, "retry_budget", None))
         self.fire(ft.event.TestStart,
                 obj = self
                 )
-        count   = 0
-        while count < self.max_retry:
+        capture = getattr(self.unit_under_test, "capture", None)
+        if capture:
+            capture.mark("test:" + self.name)
+        attempt = 0
+        while True:
+            token.check()
+            attempt += 1
+            self.retrier.stats.attempts += 1
             try:
                 self.fire_status(Test.State.RUNNING, None)
-                self._run()
+                self._run(token)
                 if not self.type == "interact":
                     self.fire_status(Test.State.HAS_RUN, Test.State.RUNNING)
+            except OperationCancelled:
+                self.fire_status(None, Test.State.RUNNING)
+                raise
             except:
                 import traceback
+                error = sys.exc_info()[1]
                 msg = traceback.format_exc()
                 logging.debug(msg)
                 self.status |= Test.State.BROKEN
@@ -180,14 +210,88 @@ class Test(TestDB, EventGenerator):
                         )
             else:
                 break
-            count += 1
-            #time.sleep(.1)
+            if not self.retry_policy.scope == Scope.TEST:
+                break
+            if not self._retry(attempt, "broken", error, token):
+                break
         self.check()
         self.fire(ft.event.TestFinish,
                 obj = self,
                 status = self.status,
+                retries = self.retrier.stats.get_all(),
                 )
 
+        journal = getattr(self.unit_under_test, "journal", None)
+        if journal and self.spec_hash:
+            journal.record(self.name, self.spec_hash, self.status,
+                    not self.status & Test.State.FAIL)
+
+    ## Mark the test as passed without running it, because the UUT's journal
+    # shows it passed on this specification before.
+    #
+    def resume(self):
+        self.fire_status(Test.State.HAS_RUN, Test.State.FAIL)
+        self.fire(ft.event.TestFinish,
+                obj = self,
+                status = self.status,
+                resumed = True,
+                )
+
+    ## Decide whether to make another attempt and wait for the backoff.
+    #
+    # Tests on an invalid interface fail on their first attempt. A TestRetry
+    # event is fired before every retry.
+    #
+    # @return True if the caller should try again.
+    #
+    def _retry(self, attempt, reason, error, token, action=None):
+        stats = self.retrier.stats
+        if not self.status & Test.State.VALID:
+            stats.fail_fast = True
+            stats.reason = "invalid interface"
+            return False
+
+        delay = self.retrier.next(attempt, reason, error)
+        if delay is None:
+            return False
+
+        self.fire(ft.event.TestRetry,
+                obj = self,
+                attempt = attempt,
+                reason = reason,
+                action = action.name if action else None,
+                delay = delay,
+                retries = stats.get_all(),
+                )
+        if delay:
+            token.sleep(delay)
+        return True
+
+    ## Call an action, retrying it on its own when the test's retry scope is
+    # Scope.ACTION.
+    #
+    # @param failed Optional function of the action's output returning True
+    # if the action ran but failed; such actions are retried only if the
+    # policy has "on_fail" set. Broken actions, whose call raised, are always
+    # candidates for a retry.
+    #
+    def _call_action(self, action, token, value=None, failed=None):
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            output = action.call(value, token)
+            if not policy.scope == Scope.ACTION:
+                return output
+            if output is not None:
+                if not (policy.on_fail and failed and failed(output)):
+                    return output
+                reason = "fail"
+            else:
+                reason = "broken"
+            if not self._retry(attempt, reason, action.error, token, action):
+                return output
+
     ## Runs the test
     #
     # Raises a NotImplementedError, indicating that the child Test class (either
@@ -195,8 +299,9 @@ class Test(TestDB, EventGenerator):
     # type of test.
     #
     # @param self The object pointer
+    # @param token Cancellation token of the running operation.
     #
-    def _run(self,):
+    def _run(self, token):
         raise NotImplementedError
 
     ## Retrieves a given attribute if it exists
@@ -211,6 +316,7 @@ class Test(TestDB, EventGenerator):
 
     def destroy(self):
         self._destroy()
+        address_registry.unregister(self)
         self.fire( ft.event.DestroyEvent,
                 obj = self,
                 )
@@ -226,7 +332,7 @@ class Test(TestDB, EventGenerator):
     class CommandsAsync:
         @staticmethod
         def run(test, data):
-            test.run()
+            test.run(test.operation)
 
 ## Method that adds xmlrpc_client object to the action_dict provided
 #
@@ -276,11 +382,12 @@ class SingleTest(Test,):
     #
     # @param self The object pointer
     #
-    def _run(self,):
+    def _run(self, token):
         output_list = list()
 
         for action in self.actions:
-            output = action.call()
+            output = self._call_action(action, token,
+                    failed = lambda output: not output[0] in ("0", 0))
 
             if output == None:
                 action.status != Action.State.BROKEN
@@ -399,21 +506,21 @@ class ExpectTest(Test,):
     #
     # @param self The object pointer
     #
-    def _run(self,):
+    def _run(self, token):
         for i in range(self.num_values):
             # run statechanger actions
             for statechanger in self.statechangers:
                 action = statechanger["action"]
-                action.call(statechanger["values"][i])
+                self._call_action(action, token, statechanger["values"][i])
 
             if self.timeout > 0:
-                time.sleep(self.timeout)
+                token.sleep(self.timeout)
         
             # run statechecker 
             for statechecker in self.statecheckers:
                 action = statechecker["action"]
                 action.status &= ~Action.State.FAIL
-                output = action.call()
+                output = self._call_action(action, token)
 
                 test_value, exit_status = output
 
@@ -437,7 +544,7 @@ class ExpectTest(Test,):
                         "test_value"        : test_value,
                         } ) )
     
-                action.set_status(expected_value, test_value, tolerance)
+                action.set_status(expected_value, test_value, tolerance, i)
 
                 if action.status & Action.State.FAIL:
                     return False
@@ -483,7 +590,7 @@ class InteractTest(Test):
     #
     # Fires an InteractTest event 
     #
-    def _run(self):
+    def _run(self, token):
         self.fire( ft.event.TestInteract,
                 obj = self,
                 prompt = self.test_dict["message"],
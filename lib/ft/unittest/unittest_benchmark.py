@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, os, tempfile, shutil
+
+from benchmark import results, fixture, micro
+from benchmark.load import LoadBenchmark
+from benchmark.startup import StartupBenchmark
+from ft.test.specification import Specification
+from ft.device.emac_devices import BinaryCall
+
+class ResultsTest(unittest.TestCase):
+
+    def test_summary(self,):
+        summary = results.get_summary(range(1, 101))
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["mean"], 50.5)
+        self.assertEqual(summary["p50"], 50)
+        self.assertEqual(summary["p95"], 95)
+        self.assertEqual(summary["p99"], 99)
+        self.assertEqual(results.get_summary([]), {"count": 0})
+
+        metrics = dict()
+        results.add_summary(metrics, "stage.boot", {"p50": 1.0, "max": None})
+        self.assertEqual(metrics, {"stage.boot.p50": 1.0})
+
+    def test_compare(self,):
+        baseline = results.make_result("test", {}, {
+            "units_per_hour": 100.0,
+            "stage.boot.p95": 10.0,
+            "errors": 0,
+            })
+        current = results.make_result("test", {}, {
+            "units_per_hour": 90.0,
+            "stage.boot.p95": 10.4,
+            "errors": 3,
+            })
+        comparison = results.compare(baseline, current, 0.05)
+        self.assertEqual([(entry[0], entry[4]) for entry in comparison], [
+            ("stage.boot.p95", False),
+            ("units_per_hour", True),
+            ])
+        self.assertFalse(any(entry[4] for entry in results.compare(
+            baseline, current, 0.2)))
+
+        # saved results compare the same
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_path = os.path.join(directory, "result.json")
+        results.save(current, file_path)
+        self.assertEqual(results.compare(baseline, results.load(file_path)),
+                comparison)
+
+class FixtureTest(unittest.TestCase):
+
+    def test_specification(self,):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_path = os.path.join(directory, "spec.yaml")
+        fixture._dump(file_path, fixture.get_specification(tests=3))
+
+        spec = Specification(file_path).test_spec
+        self.assertEqual(spec["name"], fixture.SPECIFICATION_NAME)
+        self.assertEqual(len(spec["testlist"]), 3)
+        self.assertTrue(spec["testlist"][0]["actionlist"][0]["class"] is
+                BinaryCall)
+
+class MicroTest(unittest.TestCase):
+
+    def test_run(self,):
+        result = micro.run(count=10, repeat=2, sizes=[64], handlers=[2])
+        self.assertEqual(result["suite"], "micro")
+        names = set(benchmark.get_name() for benchmark in
+                micro.get_benchmarks([64], [2]))
+        self.assertEqual(len(result["metrics"]), 4 * len(names))
+        for name in names:
+            self.assertTrue(result["metrics"][name + ".ops_per_second"] > 0)
+
+        result = micro.run(count=10, repeat=1, names=["header"])
+        self.assertEqual(len(result["metrics"]), 4 * len(micro.DEFAULT_SIZES))
+        self.assertTrue(all(name.startswith("header.") for name in
+            result["metrics"]))
+
+class LoadTest(unittest.TestCase):
+
+    def test_run(self,):
+        # the first client disconnecting leaves the server running for the
+        # other
+        result = LoadBenchmark(clients=2, bursts=2, burst_size=20,
+                burst_interval=0.1, command_rate=20, timeout=30).run()
+        metrics = result["metrics"]
+        self.assertEqual(metrics["events_fired"], 40)
+        self.assertEqual(metrics["event_lag_seconds.count"], 80)
+        self.assertEqual(metrics["events_dropped"], 0)
+        self.assertEqual(metrics["command_errors"], 0)
+        self.assertEqual(metrics["clients_unfinished"], 0)
+        self.assertTrue(metrics["commands"] > 0)
+
+class StartupTest(unittest.TestCase):
+
+    def test_run(self,):
+        result = StartupBenchmark(repeat=1, timeout=30).run()
+        metrics = result["metrics"]
+        self.assertEqual(metrics["server_ready_seconds.count"], 1)
+        self.assertTrue(metrics["server_ready_seconds.max"] > 0)
+        # only the server loads the platform
+        for name in ("server", "client", "target", "command"):
+            self.assertTrue(metrics["import.{0}.modules".format(name)] <
+                    metrics["import.platform.modules"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, sys, os, time, threading, tempfile, shutil, subprocess
+from glob import glob
+
+import ft.event
+from ft.device.emac_devices import BinaryCall, TestLibrary
+from ft.test.action import Action
+from ft.util.locker import OperationToken, OperationCancelled
+from interfaces.xmlrpc import ThreadLocalServerProxy
+from simulator import SimulatedRPCServer
+
+class _EventHandler(object):
+
+    def __init__(self):
+        self.events = list()
+
+    def fire(self, event, **kwargs):
+        self.events.append((event, kwargs))
+
+class _Test(object):
+
+    def __init__(self):
+        self.event_handler = _EventHandler()
+
+def _shell(script, **kwargs):
+    kwargs["argslist"] = ["-c", script]
+    return kwargs
+
+class BinaryCallTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.binary = BinaryCall({"binary_full_path": "/bin/sh",
+            "instance_name": "shell"})
+
+    def wait(self, job, timeout=5):
+        output = ""
+        offset = 0
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            state = self.binary.poll({"job": job, "offset": offset})
+            output += state["output"]
+            offset = state["offset"]
+            if not state["status"] == None:
+                state["output"] = output
+                return state
+        self.fail("job {0} did not finish".format(job))
+
+    def test_exit_status(self,):
+        state = self.wait(self.binary.start(_shell("echo one; exit 3")))
+        self.assertEqual(state["output"], "one\n")
+        self.assertEqual((state["status"], state["result"]), (3, "fail"))
+
+        state = self.wait(self.binary.start(_shell("echo two")))
+        self.assertEqual((state["status"], state["result"]), (0, "pass"))
+
+    def test_streaming(self,):
+        # stdio is line buffered, as on a terminal
+        self.binary.bincmd = sys.executable
+        job = self.binary.start({"argslist": ["-c",
+            "import time; print 'started'; time.sleep(0.5)"]})
+        start = time.time()
+        state = self.binary.poll({"job": job, "wait": 2})
+        self.assertEqual(state["output"], "started\n")
+        self.assertEqual(state["status"], None)
+        self.assertTrue(time.time() - start < 0.4)
+        self.assertEqual(self.wait(job)["result"], "pass")
+
+    def test_patterns(self,):
+        start = time.time()
+        state = self.wait(self.binary.start(_shell(
+            "echo 'Serial Device Test: FAIL (poll)'; sleep 10",
+            fail_patterns=["FAIL"])))
+        self.assertEqual(state["result"], "fail")
+        self.assertEqual(state["reason"], "found 'FAIL'")
+        self.assertTrue(time.time() - start < 2)
+
+        state = self.wait(self.binary.start(_shell(
+            "printf 'PWM:\\t'; sleep 0.1; echo PASS; sleep 10; exit 1",
+            pass_patterns=["^PWM:\\s+PASS$"], fail_patterns=["FAIL"])))
+        self.assertEqual((state["output"], state["result"]),
+                ("PWM:\tPASS\n", "pass"))
+
+    def test_timeout(self,):
+        start = time.time()
+        state = self.wait(self.binary.start(_shell(
+            "trap '' TERM; echo waiting; sleep 10", timeout=0.3)))
+        self.assertEqual(state["result"], "fail")
+        self.assertEqual(state["reason"], "timeout after 0.3 s")
+        self.assertTrue(state["status"] < 0)
+        self.assertTrue(time.time() - start < 3)
+
+class StreamingActionTest(unittest.TestCase):
+
+    def get_action(self, script, xmlrpc_client=None):
+        constructor_args = {"binary_full_path": "/bin/sh"}
+        if not xmlrpc_client is None:
+            constructor_args["xmlrpc_client"] = xmlrpc_client
+        return Action({
+            "name": "stream",
+            "method_name": "call",
+            "class": BinaryCall,
+            "remote": not xmlrpc_client is None,
+            "stream": True,
+            "constructor_args": constructor_args,
+            "kwargs": _shell(script, fail_patterns=["FAIL"]),
+            }, _Test())
+
+    def test_output_events(self,):
+        action = self.get_action("echo one; sleep 0.2; echo FAIL; sleep 10")
+        self.assertEqual(action.call(), (-15, "one\nFAIL\n"))
+        output = [kwargs["output"] for event, kwargs in
+                action.event_handler.events if event is ft.event.ActionOutput]
+        self.assertEqual(output, ["one\n", "FAIL\n"])
+
+    def test_remote(self,):
+        server = SimulatedRPCServer(("127.0.0.1", 0), [BinaryCall])
+        server.start()
+        self.addCleanup(server.stop)
+        client = ThreadLocalServerProxy("http://{0}:{1}".format(
+            *server.address), allow_none=True)
+        action = self.get_action("echo one; exit 2", client)
+        self.assertEqual(action.call(), (2, "one\n"))
+
+    def test_cancel(self,):
+        action = self.get_action("sleep 10")
+        token = OperationToken("test")
+        threading.Timer(0.2, token.cancel).start()
+        start = time.time()
+        self.assertRaises(OperationCancelled, action.call, None, token)
+        self.assertTrue(time.time() - start < 3)
+        self.assertEqual(action.instances["stream"].jobs, {})
+
+class TestLibraryTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        include = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+            "include")
+        library_path = os.path.join(self.directory, "libemac_tests.so")
+        try:
+            subprocess.check_call(["gcc", "-w", "-shared", "-fPIC",
+                "-I" + include, "-o", library_path] +
+                glob(os.path.join(include, "*.c")))
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest("cannot build the test library")
+        self.library = TestLibrary({"instance_name": "library",
+            "library_path": library_path})
+
+    def test_call(self,):
+        # not a mount point of its own
+        stdout = os.fstat(1)
+        self.assertEqual(self.library.call({"function": "test_block",
+            "argslist": [self.directory]}), (65, "Block Device Test({0}):"
+                "\t\t\tFAIL: block device not mounted at {0}\n".format(
+                    self.directory)))
+        self.assertEqual(os.fstat(1), stdout)
+        status, output = self.library.call({"function": "test_rtc",
+            "argslist": [os.path.join(self.directory, "rtc")]})
+        self.assertTrue(output.startswith("Testing communication with the "
+            "RTC:"))
+        self.assertFalse(status == 0)
+
+        self.assertRaises(KeyError, self.library.call, {"function": "main"})
+        self.assertRaises(ValueError, self.library.call, {"function":
+            "test_rtc", "argslist": ["a", "b"]})
+        # arguments the C code does not check for NULL are required
+        self.assertRaises(ValueError, self.library.call, {"function":
+            "test_serial", "argslist": ["/dev/null"]})
+        # interactive tests would wait for a key on the agent's stdin
+        self.assertRaises(KeyError, self.library.call, {"function":
+            "test_gpi", "argslist": ["/dev/null", "0"]})
+
+if __name__ == "__main__":
+    unittest.main()
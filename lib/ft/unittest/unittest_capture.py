@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, time, os, pty, tempfile, shutil
+
+from eserial import EnhancedSerial
+from eserial.capture import CaptureStore, ConsoleReader, INDEX_NAME
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.directory = tempfile.mkdtemp()
+        self.store = CaptureStore(self.directory, max_bytes=None,
+                max_age=None)
+
+    def tearDown(self,):
+        shutil.rmtree(self.directory)
+
+    def test_marks(self,):
+        capture = self.store.open("SN 0001")
+        capture.write("U-Boot 2013.04\n")
+        capture.mark("stage:nfs_test_boot")
+        capture.write("Starting kernel ...\n")
+        capture.write("sh-3.2# ")
+        capture.mark("test:Audio loopback")
+        capture.write("FAIL: no signal\n")
+        self.assertTrue(capture.sync(5))
+
+        # readable while it is written
+        reader = self.store.get_reader("SN 0001")
+        self.assertEqual(reader.path, os.path.join(self.directory, "SN_0001"))
+        self.assertEqual([label for t, label in reader.get_marks()],
+                ["stage:nfs_test_boot", "test:Audio loopback"])
+        self.assertEqual(reader.read_mark("stage:nfs_test_boot"),
+                "Starting kernel ...\nsh-3.2# ")
+        self.assertEqual(reader.read_mark("test:Audio loopback"),
+                "FAIL: no signal\n")
+        self.assertRaises(KeyError, reader.read_mark, "stage:clear_uut")
+        capture.close()
+
+        # reopening continues in a new segment; the latest mark is found
+        capture = self.store.open("SN 0001")
+        capture.mark("test:Audio loopback")
+        capture.write("PASS\n")
+        capture.close()
+        capture.write("dropped")
+        capture.sync(5)
+        self.assertEqual(sorted(os.listdir(reader.path)),
+                ["000001.gz", "000002.gz", INDEX_NAME])
+        self.assertEqual(reader.read_mark("test:Audio loopback"), "PASS\n")
+        self.assertEqual(reader.read(), "U-Boot 2013.04\nStarting kernel "
+                "...\nsh-3.2# FAIL: no signal\nPASS\n")
+        self.assertEqual(self.store.active, {})
+
+    def test_segments(self,):
+        store = CaptureStore(self.directory, segment_bytes=100)
+        capture = store.open("0002")
+        lines = ["line {0:04d} {1}\n".format(i, "x" * 20) for i in range(40)]
+        start = time.time()
+        for line in lines:
+            capture.write(line)
+        capture.close()
+        capture.sync(5)
+
+        reader = ConsoleReader(os.path.join(self.directory, "0002"))
+        segments = [name for name in os.listdir(reader.path)
+                if name.endswith(".gz")]
+        self.assertTrue(len(segments) > 5)
+        self.assertEqual(reader.read(), "".join(lines))
+        self.assertEqual(reader.read(end=start), "")
+        self.assertEqual(reader.read(start=time.time() + 1),
+                reader.read(start=reader.get_entries()[-1][0]))
+
+        # a line cut short in the index is ignored
+        with open(os.path.join(reader.path, INDEX_NAME), "ab") as f:
+            f.write("12")
+        self.assertEqual(reader.read(), "".join(lines))
+
+    def test_prune(self,):
+        now = time.time()
+        for name, age, size in (("old", 40, 10), ("a", 3, 600),
+                ("b", 2, 600), ("c", 1, 600)):
+            directory = os.path.join(self.directory, name)
+            os.mkdir(directory)
+            file_path = os.path.join(directory, "000001.gz")
+            with open(file_path, "wb") as f:
+                f.write("x" * size)
+            mtime = now - age * 24 * 3600
+            os.utime(file_path, (mtime, mtime))
+            os.utime(directory, (mtime, mtime))
+
+        # the open capture counts, but is kept
+        store = CaptureStore(self.directory, max_bytes=1000,
+                max_age=30 * 24 * 3600)
+        capture = store.open("b")
+        removed = store.prune(now)
+        self.assertEqual(sorted(os.path.basename(d) for d in removed),
+                ["a", "c", "old"])
+        self.assertEqual(os.listdir(self.directory), ["b"])
+        capture.close()
+        capture.sync(5)
+        store.max_bytes = 500
+        store.prune(now)
+        self.assertEqual(os.listdir(self.directory), [])
+
+class SerialCaptureTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.master, self.slave = pty.openpty()
+        self.serial = EnhancedSerial(os.ttyname(self.slave), 115200)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self,):
+        os.close(self.master)
+        os.close(self.slave)
+        shutil.rmtree(self.directory)
+
+    def test_read_until(self,):
+        store = CaptureStore(self.directory)
+        self.serial.capture = store.open("0003")
+        threading.Timer(0.1, os.write, (self.master,
+            "booting\nU-Boot> ")).start()
+        result, before = self.serial.read_until("U-Boot>", timeout=5)
+        self.assertTrue(result)
+        self.serial.capture.close()
+        self.serial.capture.sync(5)
+        self.assertEqual(store.get_reader("0003").read(), "booting\nU-Boot> ")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, time, gc, pickle
+
+from ft.command import (CommandExecutor, Command, Commandable, AddressRegistry,
+        RecipientType, address_registry, CommandRecord, CommandError, Mode)
+import ft.event
+from ft.util.locker import RWLock, query, preempt, idempotent
+
+class Recipient(object):
+
+    def __init__(self, name, calls):
+        self.address = (None, name)
+        self.lock = RWLock()
+        self.name = name
+        self.calls = calls
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def fire(self, *args, **kwargs):
+        pass
+
+    class CommandsAsync:
+        @staticmethod
+        @idempotent
+        def run(recipient, data):
+            recipient.gate.wait(10)
+            recipient.calls.append((recipient.name, data))
+
+        @staticmethod
+        def toggle(recipient, data):
+            recipient.gate.wait(10)
+            recipient.calls.append((recipient.name, data))
+
+def command(name, data=None):
+    return (name, None, None, data, False)
+
+class CommandExecutorTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.calls = []
+        self.executor = CommandExecutor(max_workers=2)
+
+    def tearDown(self,):
+        self.executor.shutdown()
+
+    def wait_idle(self,):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            stats = self.executor.get_stats()
+            if stats["queue_depth"] == 0 and stats["running"] == 0:
+                return stats
+            time.sleep(0.01)
+        self.fail("executor did not become idle")
+
+    def test_fifo_per_recipient(self,):
+        # Commands for one recipient run one at a time in submission order.
+        recipient = Recipient("uut", self.calls)
+        for i in range(5):
+            self.executor.submit(recipient, command("run", i))
+        self.wait_idle()
+        self.assertEqual(self.calls, [("uut", i) for i in range(5)])
+
+    def test_bounded_pool(self,):
+        # Queued commands for busy recipients do not take up threads.
+        recipients = [Recipient(i, self.calls) for i in range(6)]
+        for recipient in recipients:
+            recipient.gate.clear()
+            for i in range(3):
+                self.executor.submit(recipient, command("run", i))
+        time.sleep(0.1)
+        self.assertEqual(self.executor.get_stats()["workers"], 2)
+        for recipient in recipients:
+            recipient.gate.set()
+        stats = self.wait_idle()
+        self.assertEqual(len(self.calls), 18)
+        self.assertEqual(stats["completed"], 18)
+        self.assertEqual(stats["workers"], 2)
+
+    def test_deduplication(self,):
+        # Repeating the last queued idempotent command, or the running one
+        # while nothing is queued, is a no-op.
+        recipient = Recipient("uut", self.calls)
+        recipient.gate.clear()
+        self.assertTrue(self.executor.submit(recipient, command("run")))
+        time.sleep(0.05)
+        self.assertFalse(self.executor.submit(recipient, command("run")))
+        self.assertTrue(self.executor.submit(recipient, command("run", 1)))
+        self.assertFalse(self.executor.submit(recipient, command("run", 1)))
+        self.assertTrue(self.executor.submit(recipient, command("run")))
+        recipient.gate.set()
+        stats = self.wait_idle()
+        self.assertEqual(self.calls,
+                [("uut", None), ("uut", 1), ("uut", None)])
+        self.assertEqual(stats["deduplicated"], 2)
+
+    def test_order_preserved(self,):
+        # A, B, A runs all three: the second A must not be folded into the
+        # first, nor are commands that are not idempotent collapsed.
+        recipient = Recipient("uut", self.calls)
+        recipient.gate.clear()
+        self.executor.submit(recipient, command("toggle", "up"))
+        time.sleep(0.05)
+        for data in ("down", "up", "up"):
+            self.assertTrue(self.executor.submit(recipient,
+                command("toggle", data)))
+        recipient.gate.set()
+        self.wait_idle()
+        self.assertEqual(self.calls, [("uut", "up"), ("uut", "down"),
+            ("uut", "up"), ("uut", "up")])
+
+        self.calls[:] = []
+        recipient.gate.clear()
+        for data in (None, 1, None):
+            self.assertTrue(self.executor.submit(recipient,
+                command("run", data)))
+        recipient.gate.set()
+        self.wait_idle()
+        self.assertEqual(self.calls, [("uut", None), ("uut", 1),
+            ("uut", None)])
+
+    def test_cancel(self,):
+        # Cancelling drops queued commands but not the running one.
+        recipient = Recipient("uut", self.calls)
+        recipient.gate.clear()
+        for i in range(3):
+            self.executor.submit(recipient, command("run", i))
+        time.sleep(0.05)
+        self.assertEqual(self.executor.cancel(recipient), 2)
+        self.assertEqual(self.executor.cancel(recipient), 0)
+        recipient.gate.set()
+        self.wait_idle()
+        self.assertEqual(self.calls, [("uut", 0)])
+
+class Slot(Commandable):
+
+    recipient_type = RecipientType.SLOT
+
+    def __init__(self, index):
+        self.lock = RWLock()
+        self.address = (None, index)
+        self.events = []
+        address_registry.register(self)
+
+    def fire(self, event, **kwargs):
+        self.events.append((event, kwargs))
+
+    class CommandsSync:
+        @staticmethod
+        @query
+        def acknowledge(slot, data):
+            return (slot.address, data), ""
+
+        @staticmethod
+        def configure(slot, data):
+            return True, ""
+
+        @staticmethod
+        @preempt
+        def abort(slot, data):
+            slot.operation.cancel()
+            return True, ""
+
+    class CommandsAsync:
+        @staticmethod
+        def power_up(slot, data):
+            return "on", ""
+
+        @staticmethod
+        def power_down(slot, data):
+            data.wait(10)
+
+        @staticmethod
+        def run_all_tests(slot, data):
+            slot.operation.sleep(10)
+
+class Platform(object):
+
+    options = None
+
+    def __init__(self,):
+        self.errors = []
+
+    def fire(self, event, **kwargs):
+        self.errors.append(kwargs["traceback"])
+
+class AddressRegistryTest(unittest.TestCase):
+
+    def test_weak_references(self,):
+        # Objects drop out of the index once they are garbage collected.
+        registry = AddressRegistry()
+        slot = Slot(0)
+        registry.register(slot)
+        self.assertTrue(registry.get((None, 0)) is slot)
+        del slot
+        gc.collect()
+        self.assertEqual(registry.get((None, 0)), None)
+
+    def test_unregister(self,):
+        # Unregistering a stale object keeps its replacement.
+        registry = AddressRegistry()
+        old, new = Slot(0), Slot(0)
+        registry.register(old)
+        registry.register(new)
+        registry.unregister(old)
+        self.assertTrue(registry.get((None, 0)) is new)
+        registry.unregister(new)
+        self.assertEqual(len(registry), 0)
+
+class CommandTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.platform = Platform()
+        self.command = Command(self.platform)
+        self.slots = [Slot(i) for i in range(2)]
+
+    def tearDown(self,):
+        self.command.executor.shutdown()
+
+    def test_v2(self,):
+        result = self.command.run_command(((None, 1), RecipientType.SLOT,
+            ("acknowledge", "data", True)))
+        self.assertEqual(result, (((None, 1), "data"), ""))
+
+    def test_v1(self,):
+        result = self.command.run_command(("acknowledge", RecipientType.SLOT,
+            (None, 0), "data", True))
+        self.assertEqual(result, (((None, 0), "data"), ""))
+
+    def test_record(self,):
+        record = CommandRecord("acknowledge", RecipientType.SLOT, (None, 1),
+                "data")
+        self.assertEqual(self.command.run_command(record),
+                (((None, 1), "data"), ""))
+
+    def test_record_encoding(self,):
+        # Encoded records are smaller than v1 tuples and run the same way.
+        record = CommandRecord("run_all_tests", RecipientType.UUT,
+                ((None, 0), "SN12345"), mode=Mode.ASYNC)
+        encoded = pickle.dumps(record.encode(), pickle.HIGHEST_PROTOCOL)
+        self.assertTrue(len(encoded) < len(pickle.dumps(
+            record.to_tuple(record.addresses[0]), pickle.HIGHEST_PROTOCOL)))
+        decoded = CommandRecord.decode(pickle.loads(encoded))
+        self.assertEqual(decoded.name, "run_all_tests")
+        self.assertEqual(decoded.addresses, [((None, 0), "SN12345")])
+        self.assertEqual(decoded.mode, Mode.ASYNC)
+
+        decoded = pickle.loads(pickle.dumps(record))
+        self.assertEqual(decoded.addresses, record.addresses)
+
+        encoded = CommandRecord("acknowledge", RecipientType.SLOT, (None, 0),
+                "data").encode()
+        self.assertEqual(self.command.run_command(encoded),
+                (((None, 0), "data"), ""))
+        self.assertRaises(CommandError, CommandRecord, "bogus",
+                RecipientType.SLOT, None)
+
+    def test_bulk(self,):
+        # One record addresses every slot; results come back in order.
+        record = CommandRecord("acknowledge", RecipientType.SLOT,
+                [(None, 0), (None, 1), (None, 5)], "data")
+        results, msg = self.command.run_command(record)
+        self.assertEqual(results[0], (((None, 0), "data"), ""))
+        self.assertEqual(results[1], (((None, 1), "data"), ""))
+        self.assertFalse(results[2][0])
+
+    def test_stream(self,):
+        # Streamed commands report their result through an event.
+        record = CommandRecord("power_up", RecipientType.SLOT,
+                [(None, 0), (None, 1)], mode=Mode.STREAM)
+        self.assertEqual(self.command.run_command(record),
+                ([(None, ""), (None, "")], ""))
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if all(slot.events for slot in self.slots):
+                break
+            time.sleep(0.01)
+        for slot in self.slots:
+            event, kwargs = slot.events[0]
+            self.assertTrue(event is ft.event.CommandResult)
+            self.assertEqual(kwargs["result"], "on")
+            self.assertEqual(kwargs["command_address"], slot.address)
+
+    def test_queries_during_operation(self,):
+        # Queries are answered while an asynchronous command is running;
+        # other synchronous commands wait for it to finish.
+        slot = self.slots[0]
+        done = threading.Event()
+        self.command.run_command(CommandRecord("power_down",
+            RecipientType.SLOT, slot.address, done, Mode.ASYNC))
+        deadline = time.time() + 10
+        while slot.operation is None and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.command.run_command(CommandRecord("acknowledge",
+            RecipientType.SLOT, slot.address, 1)), ((slot.address, 1), ""))
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self.command.run_command(CommandRecord("configure",
+                RecipientType.SLOT, slot.address))))
+        thread.start()
+        time.sleep(0.1)
+        self.assertEqual(results, [])
+
+        done.set()
+        thread.join(10)
+        self.assertEqual(results, [(True, "")])
+        self.assertEqual(slot.operation, None)
+
+    def test_abort(self,):
+        # Preempting commands run during an operation and cancel it promptly.
+        slot = self.slots[0]
+        self.command.run_command(CommandRecord("run_all_tests",
+            RecipientType.SLOT, slot.address, mode=Mode.ASYNC))
+        deadline = time.time() + 10
+        while slot.operation is None and time.time() < deadline:
+            time.sleep(0.01)
+
+        start = time.time()
+        self.assertEqual(self.command.run_command(CommandRecord("abort",
+            RecipientType.SLOT, slot.address)), (True, ""))
+        while slot.operation is not None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(time.time() - start < 1)
+        event, kwargs = slot.events[-1]
+        self.assertTrue(event is ft.event.UpdateStatus)
+        self.assertTrue("cancelled" in kwargs["message"])
+
+    def test_invalid_recipient(self,):
+        ok, msg = self.command.run_command(((None, 5), RecipientType.SLOT,
+            ("acknowledge", "data", True)))
+        self.assertFalse(ok)
+        ok, msg = self.command.run_command(((None, 0), RecipientType.UUT,
+            ("acknowledge", "data", True)))
+        self.assertFalse(ok)
+        self.assertEqual(len(self.platform.errors), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, os, tempfile, shutil, tarfile
+
+from ft.platform.deploy import DeploymentCache
+
+class DeploymentCacheTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.testing_dir = tempfile.mkdtemp()
+        self.nfs_dir = os.path.join(self.testing_dir, "nfs", "som9g20")
+        self.cache = DeploymentCache(os.path.join(self.testing_dir, "nfs",
+            ".deploy_cache"), sudo=False, max_entries=1)
+
+    def tearDown(self,):
+        shutil.rmtree(self.testing_dir)
+
+    def make_archive(self, name, content):
+        source = os.path.join(self.testing_dir, "rootfs")
+        if not os.path.isdir(source):
+            os.makedirs(source)
+        with open(os.path.join(source, "version"), 'w') as f:
+            f.write(content)
+        archive = os.path.join(self.testing_dir, name)
+        with tarfile.open(archive, "w:gz") as tar:
+            tar.add(source, arcname=".")
+        return archive
+
+    def read_version(self,):
+        with open(os.path.join(self.nfs_dir, "version"), 'r') as f:
+            return f.read()
+
+    def test_reuse(self,):
+        # Switching back to an archive deployed before reuses its entry.
+        first = self.make_archive("first.tar.gz", "1")
+        second = self.make_archive("second.tar.gz", "2")
+        install = ["touch {nfs_dir}/installed"]
+
+        first_entry = self.cache.deploy_nfs(first, self.nfs_dir, "abc", install)
+        self.assertEqual(self.read_version(), "1")
+        self.assertTrue(os.path.exists(os.path.join(self.nfs_dir,
+            "installed")))
+        self.cache.deploy_nfs(second, self.nfs_dir, "abc", install)
+        self.assertEqual(self.read_version(), "2")
+
+        os.unlink(os.path.join(first_entry, "installed"))
+        self.assertEqual(self.cache.deploy_nfs(first, self.nfs_dir, "abc",
+            install), first_entry)
+        self.assertEqual(self.read_version(), "1")
+        self.assertFalse(os.path.exists(os.path.join(self.nfs_dir,
+            "installed")))
+
+    def test_revision(self,):
+        # Another metadata revision or an unknown one needs a fresh entry.
+        archive = self.make_archive("first.tar.gz", "1")
+        entry = self.cache.deploy_nfs(archive, self.nfs_dir, "abc")
+        self.assertNotEqual(self.cache.deploy_nfs(archive, self.nfs_dir,
+            "def"), entry)
+        self.assertNotEqual(self.cache.deploy_nfs(archive, self.nfs_dir),
+            self.cache.deploy_nfs(archive, self.nfs_dir))
+
+    def test_collect(self,):
+        # Only "max_entries" unlinked entries are kept.
+        for i in range(3):
+            archive = self.make_archive("{0}.tar.gz".format(i), str(i))
+            self.cache.deploy_nfs(archive, self.nfs_dir, "abc")
+        self.assertEqual(len([name for name in os.listdir(
+            self.cache.cache_dir) if not name.startswith(".")]), 2)
+        self.assertEqual(self.read_version(), "2")
+
+    def test_collect_after_restart(self,):
+        # Entries linked by an earlier process are not collected.
+        archive = self.make_archive("first.tar.gz", "1")
+        entry = self.cache.deploy_nfs(archive, self.nfs_dir, "abc")
+        DeploymentCache(self.cache.cache_dir, sudo=False,
+                max_entries=0).collect()
+        self.assertTrue(os.path.isdir(entry))
+        self.assertEqual(self.read_version(), "1")
+
+    def test_async(self,):
+        archive = self.make_archive("first.tar.gz", "1")
+        deployment = self.cache.deploy_nfs_async(archive, self.nfs_dir, "abc")
+        self.assertTrue(deployment.wait(10))
+        self.assertEqual(self.read_version(), "1")
+
+    def test_tftp(self,):
+        # Files are only copied when their content changes.
+        tftp_dir = os.path.join(self.testing_dir, "tftp")
+        source = os.path.join(self.testing_dir, "uImage")
+        with open(source, 'w') as f:
+            f.write("kernel")
+        self.assertTrue(self.cache.deploy_tftp(tftp_dir, source))
+        self.assertFalse(self.cache.deploy_tftp(tftp_dir, source))
+        with open(source, 'w') as f:
+            f.write("kernel2")
+        self.assertTrue(self.cache.deploy_tftp(tftp_dir, source))
+
+if __name__ == "__main__":
+    unittest.main()
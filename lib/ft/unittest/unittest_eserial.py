@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, time, os, pty
+
+from eserial import EnhancedSerial
+from ft.util.locker import OperationToken, OperationCancelled
+
+class ReadUntilTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.master, self.slave = pty.openpty()
+        self.serial = EnhancedSerial(os.ttyname(self.slave), 115200)
+
+    def tearDown(self,):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def write_later(self, data):
+        # Opening the port flushes pending input, so write once it is open.
+        threading.Timer(0.1, os.write, (self.master, data)).start()
+
+    def test_match(self,):
+        self.write_later("booting\nU-Boot> ")
+        token = OperationToken("chk")
+        result, before = self.serial.read_until("U-Boot>", timeout=5,
+                token=token)
+        self.assertTrue(result)
+        self.assertTrue("booting" in before)
+
+    def test_cancel(self,):
+        # A cancelled read gives up the port well before its timeout.
+        token = OperationToken("nfs_test_boot")
+        threading.Timer(0.1, token.cancel).start()
+        start = time.time()
+        self.assertRaises(OperationCancelled, self.serial.read_until,
+                "sh-3.2#", timeout=40, token=token)
+        self.assertTrue(time.time() - start < 2)
+
+        # The port lock was released.
+        self.write_later("sh-3.2# ")
+        result, before = self.serial.read_until("sh-3.2#", timeout=5)
+        self.assertTrue(result)
+
+if __name__ == "__main__":
+    unittest.main()
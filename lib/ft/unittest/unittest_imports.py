@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, sys
+
+from telemetry.imports import LazyModule
+
+class LazyModuleTest(unittest.TestCase):
+
+    def test_first_use(self,):
+        sys.modules.pop("colorsys", None)
+        colorsys = LazyModule("colorsys")
+        self.assertFalse(sys.modules.has_key("colorsys"))
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertTrue(sys.modules.has_key("colorsys"))
+        self.assertRaises(AttributeError, getattr, colorsys, "missing")
+
+class LazyPackageTest(unittest.TestCase):
+
+    def test_attributes(self,):
+        import ft, ft.orm
+        self.assertTrue(ft.Base is ft.orm.Base)
+        self.assertTrue(ft.platform is sys.modules["ft.platform"])
+        self.assertTrue("Base" in ft.__all__)
+        self.assertTrue("LogDBSession" in dir(ft))
+        self.assertRaises(AttributeError, getattr, ft, "missing")
+        from ft import setup_logdb_engine
+
+        import interfaces
+        from interfaces import ADAM_4068
+        self.assertTrue(ADAM_4068 is interfaces.adam.ADAM_4068)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, tempfile, shutil, os.path as path
+
+from ft.test import journal
+from ft.test.journal import TestJournal, get_spec_hash
+from ft.test.scheduler import TestScheduler
+from ft.util.locker import OperationToken
+from ft.platform.unit import UnitUnderTest
+
+class Action(object):
+    pass
+
+class FakeTest(object):
+
+    def __init__(self, name, log, depends=()):
+        self.name = name
+        self.type = "single"
+        self.log = log
+        self.test_dict = {"resources": [], "depends": list(depends)}
+
+    def run(self, token):
+        self.log.append(self.name)
+
+class FakeUUT(object):
+
+    def __init__(self):
+        self.tests = [None]
+        self.operation = None
+        self.resume = []
+
+    def fire(self, *args, **kwargs):
+        pass
+
+    def _run_all_tests(self, token, resume):
+        self.resume.append(resume)
+
+class TestJournalTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.directory = tempfile.mkdtemp()
+        self.journal = TestJournal(path.join(self.directory, "SN1.journal"))
+
+    def tearDown(self,):
+        shutil.rmtree(self.directory)
+        journal.set_journal_dir(None)
+
+    def test_latest_result_wins(self,):
+        self.journal.record("audio", "a", 0x104, False)
+        self.journal.record("audio", "a", 0x004, True)
+        self.journal.record("gpio", "b", 0x004, True)
+        self.journal.record("gpio", "b", 0x104, False)
+        self.journal.record("pwm", "c", 0x004, True)
+        self.assertEqual(self.journal.get_passed(),
+                set([("audio", "a"), ("pwm", "c")]))
+
+    def test_truncated_entry(self,):
+        # A line cut short by a crash does not hide the earlier entries.
+        self.journal.record("audio", "a", 0x004, True)
+        with open(self.journal.file_path, "ab") as f:
+            f.write('{"test": "gpio", "sp')
+        self.assertEqual(self.journal.get_passed(), set([("audio", "a")]))
+        self.journal.record("pwm", "c", 0x004, True)
+        self.assertEqual(len(self.journal.get_passed()), 2)
+
+    def test_spec_hash(self,):
+        test_dict = {"name": "audio", "actionlist": [{"class": Action}]}
+        spec_hash = get_spec_hash(test_dict, "abc123")
+        self.assertEqual(spec_hash, get_spec_hash(dict(test_dict), "abc123"))
+        self.assertNotEqual(spec_hash, get_spec_hash(test_dict, "def456"))
+        self.assertNotEqual(spec_hash, get_spec_hash({"name": "audio",
+            "actionlist": []}, "abc123"))
+
+        # keys set on the shared entry at run time do not change the hash
+        remote = {"name": "audio", "actionlist": [{"remote": True,
+            "constructor_args": {"device": "/dev/dsp"}}]}
+        spec_hash = get_spec_hash(remote)
+        remote["actionlist"][0]["constructor_args"].update(
+                xmlrpc_client=object(), instance_name="play")
+        self.assertEqual(spec_hash, get_spec_hash(remote))
+
+    def test_get_journal(self,):
+        self.assertEqual(journal.get_journal("SN1"), None)
+        journal.set_journal_dir(self.directory)
+        self.assertEqual(journal.get_journal("SN/1").file_path,
+                path.join(self.directory, "SN_1.journal"))
+
+    def test_scheduler_skip(self,):
+        # Skipped tests satisfy the dependencies of the tests that run.
+        log = []
+        tests = [FakeTest("driver", log), FakeTest("audio", log, ["driver"]),
+                FakeTest("gpio", log)]
+        TestScheduler(tests).run(OperationToken("run_all_tests"), [0, 2])
+        self.assertEqual(log, ["audio"])
+
+    def test_resume_opt_in(self,):
+        # A plain run_all_tests, as sent by the UI, retests everything.
+        uut = FakeUUT()
+        for data in (None, {}, {"resume": False}, {"resume": 1},
+                {"resume": True}):
+            UnitUnderTest.CommandsAsync.run_all_tests(uut, data)
+        self.assertEqual(uut.resume, [False] * 4 + [True])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, time
+
+from ft.util.locker import (RWLock, get_lock_stats, OperationToken,
+        OperationCancelled)
+
+def start(target):
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+class RWLockTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.lock = RWLock("test")
+
+    def test_shared_readers(self,):
+        # A second reader gets in while the first still holds the lock.
+        acquired = threading.Event()
+        def reader():
+            with self.lock.read():
+                acquired.set()
+        with self.lock.read():
+            start(reader)
+            self.assertTrue(acquired.wait(5))
+
+    def test_exclusive_writer(self,):
+        # Readers wait for the writer and the writer for readers.
+        events = []
+        def reader():
+            with self.lock.read():
+                events.append("read")
+        with self.lock.write():
+            thread = start(reader)
+            time.sleep(0.1)
+            events.append("write")
+        thread.join(5)
+        self.assertEqual(events, ["write", "read"])
+
+    def test_reentrancy(self,):
+        with self.lock:
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                self.assertRaises(RuntimeError, self.lock.acquire_write)
+
+        # Fully released: another thread can write.
+        acquired = threading.Event()
+        def writer():
+            with self.lock.write():
+                acquired.set()
+        start(writer)
+        self.assertTrue(acquired.wait(5))
+
+    def test_reader_reentry_with_waiting_writer(self,):
+        # A reader re-entering must not wait behind a queued writer.
+        with self.lock.read():
+            writer = start(self.lock.acquire_write)
+            time.sleep(0.1)
+            with self.lock.read():
+                pass
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+
+    def test_stats(self,):
+        lock = RWLock("test_stats")
+        with lock.write():
+            time.sleep(0.05)
+        with lock.read():
+            pass
+        stats = get_lock_stats()["test_stats"]
+        self.assertEqual(stats["writes"], 1)
+        self.assertEqual(stats["reads"], 1)
+        self.assertTrue(stats["max_hold"] >= 0.05)
+
+class OperationTokenTest(unittest.TestCase):
+
+    def test_cancel_wakes_sleep(self,):
+        token = OperationToken("run_all_tests")
+        token.check()
+        timer = threading.Timer(0.05, token.cancel)
+        timer.start()
+        start = time.time()
+        self.assertRaises(OperationCancelled, token.sleep, 10)
+        self.assertTrue(time.time() - start < 1)
+        self.assertRaises(OperationCancelled, token.check)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, logging, threading, os, tempfile, shutil
+
+from telemetry import logs
+
+class _Message(object):
+
+    def __init__(self):
+        self.threads = list()
+
+    def __str__(self):
+        self.threads.append(threading.current_thread().name)
+        return "deferred"
+
+class LogsTest(unittest.TestCase):
+
+    def setUp(self,):
+        root = logging.getLogger()
+        self.handlers = root.handlers[:]
+        self.level = root.level
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, "log")
+
+    def tearDown(self,):
+        logs.shutdown()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in self.handlers:
+            root.addHandler(handler)
+        root.setLevel(self.level)
+        for name in ("logs_test", "logs_test.quiet"):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        shutil.rmtree(self.directory)
+
+    def read(self,):
+        with open(self.file_path) as f:
+            return f.read()
+
+    def test_setup(self,):
+        logs.setup(self.file_path, {"logs_test.quiet": logging.WARNING})
+        message = _Message()
+        logging.getLogger("logs_test").debug("message %s", message)
+        logging.getLogger("logs_test.quiet").info("hidden")
+        logging.getLogger("logs_test.quiet").warning("shown")
+        try:
+            raise ValueError("failure")
+        except ValueError:
+            logging.getLogger("logs_test").exception("caught")
+        logs.shutdown()
+
+        text = self.read()
+        self.assertTrue("message deferred" in text)
+        self.assertFalse("hidden" in text)
+        self.assertTrue("shown" in text)
+        self.assertTrue("ValueError: failure" in text)
+        # formatted by the writer, not the thread that logged
+        self.assertEqual(set(message.threads), set(["LogWriter"]))
+
+    def test_rotation(self,):
+        logs.setup(self.file_path, max_bytes=1024, backup_count=2)
+        log = logging.getLogger("logs_test")
+        for i in range(100):
+            log.info("record %d %s", i, "x" * 64)
+        logs.shutdown()
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                ["log", "log.1", "log.2"])
+        self.assertTrue("record 99 " in self.read())
+        self.assertTrue(os.path.getsize(self.file_path) <= 1024)
+
+    def test_dropped(self,):
+        handler = logs.QueueHandler(capacity=2)
+        log = logging.getLogger("logs_test")
+        for i in range(5):
+            handler.handle(log.makeRecord(log.name, logging.INFO, __file__,
+                0, "record %d", (i,), None))
+        records, dropped = handler.get(0)
+        self.assertEqual([record.getMessage() for record in records],
+                ["record 0", "record 1"])
+        self.assertEqual(dropped, 3)
+        self.assertEqual(handler.get(0), ([], 0))
+
+    def test_parse_levels(self,):
+        self.assertEqual(logs.parse_levels(["info",
+            "interfaces.adam = DEBUG"]), {
+                "": logging.INFO,
+                "interfaces.adam": logging.DEBUG,
+                })
+        self.assertRaises(ValueError, logs.parse_levels, ["ft=LOUD"])
+
+if __name__ == "__main__":
+    unittest.main()
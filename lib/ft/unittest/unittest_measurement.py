@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, tempfile, shutil, math
+
+from ft.test.measurement import MeasurementSink, MeasurementReader
+
+class MeasurementSinkTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.testing_dir = tempfile.mkdtemp()
+        self.sink = MeasurementSink(self.testing_dir, chunk_size=3)
+
+    def tearDown(self,):
+        shutil.rmtree(self.testing_dir)
+
+    def append(self, serial_number, point, expected, actual, passed=True):
+        self.sink.append("SOM-9G20", "default", serial_number, "ADC", "read",
+                point, expected, actual, 0.1, passed, metadata_version="v1.0")
+
+    def test_round_trip(self,):
+        # Rows written across several chunks must be read back in order with
+        # dictionary encoded columns resolved to their string values.
+        for i in range(5):
+            self.append("SN{0}".format(i % 2), i, 1.5 * i, 1.5 * i + 0.01,
+                    passed = i != 3)
+        self.sink.flush()
+
+        reader = MeasurementReader(self.sink.get_file_path("SOM-9G20",
+            "default"))
+        columns = reader.columns()
+        self.assertEqual(columns["point"], [0, 1, 2, 3, 4])
+        self.assertEqual(columns["serial_number"],
+                ["SN0", "SN1", "SN0", "SN1", "SN0"])
+        self.assertEqual(columns["metadata_version"], ["v1.0"] * 5)
+        self.assertEqual(columns["passed"], [1, 1, 1, 0, 1])
+        self.assertAlmostEqual(columns["expected"][4], 6.0)
+        self.assertAlmostEqual(columns["actual"][2], 3.01)
+
+    def test_non_numeric_values(self,):
+        # Hex strings and other non-numeric values are stored as NaN.
+        self.append("SN0", 0, "ff", "fe", passed=False)
+        self.sink.flush()
+
+        rows = list(MeasurementReader(self.sink.get_file_path("SOM-9G20",
+            "default")))
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(math.isnan(rows[0]["expected"]))
+        self.assertEqual(rows[0]["passed"], 0)
+
+    def test_projection(self,):
+        # Only the requested columns are decoded.
+        self.append("SN0", 0, 1, 1)
+        self.sink.close()
+
+        columns = MeasurementReader(self.sink.get_file_path("SOM-9G20",
+            "default")).columns(["actual"])
+        self.assertEqual(columns.keys(), ["actual"])
+        self.assertEqual(columns["actual"], [1.0])
+
+if __name__ == "__main__":
+    unittest.main()
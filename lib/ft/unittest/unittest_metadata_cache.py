@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, os, tempfile, shutil, subprocess
+
+from ft.util.metadata_cache import MetadataCache, get_head_commit
+
+def git(work_tree, *args):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(["git", "-C", work_tree,
+            "-c", "user.name=ft", "-c", "user.email=ft@localhost"] +
+            list(args), stdout=devnull, stderr=devnull)
+
+class MetadataCacheTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.testing_dir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.testing_dir, "repo")
+        self.cache_dir = os.path.join(self.testing_dir, "cache")
+        os.makedirs(self.repo)
+        git(self.repo, "init", "-q")
+        self.file_name = os.path.join(self.repo, "config.yaml")
+        self.commit("first")
+        self.loads = []
+
+    def tearDown(self,):
+        shutil.rmtree(self.testing_dir)
+
+    def commit(self, content):
+        with open(self.file_name, 'w') as f:
+            f.write(content)
+        git(self.repo, "add", "config.yaml")
+        git(self.repo, "commit", "-q", "-m", content)
+
+    def loader(self, file_name):
+        self.loads.append(file_name)
+        with open(file_name, 'r') as f:
+            return {"content": f.read()}
+
+    def test_head_commit(self,):
+        head = subprocess.check_output(["git", "-C", self.repo, "rev-parse",
+            "HEAD"]).strip()
+        self.assertEqual(get_head_commit(self.repo), head)
+        git(self.repo, "pack-refs", "--all")
+        self.assertEqual(get_head_commit(self.repo), head)
+
+    def test_memory_cache(self,):
+        # The same file at the same commit is only parsed once and every
+        # caller gets its own copy.
+        cache = MetadataCache()
+        first = cache.load(self.file_name, self.loader)
+        first["content"] = "modified"
+        second = cache.load(self.file_name, self.loader)
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(second["content"], "first")
+
+    def test_new_commit(self,):
+        # A checkout of another commit must never serve the old parse.
+        cache = MetadataCache()
+        cache.load(self.file_name, self.loader)
+        self.commit("second")
+        cache.invalidate(self.repo)
+        self.assertEqual(cache.load(self.file_name, self.loader)["content"],
+                "second")
+        self.assertEqual(len(self.loads), 2)
+
+    def test_disk_cache(self,):
+        # A fresh cache using the same directory picks up the pickled entry.
+        MetadataCache(self.cache_dir).load(self.file_name, self.loader)
+        result = MetadataCache(self.cache_dir).load(self.file_name,
+                self.loader)
+        self.assertEqual(result["content"], "first")
+        self.assertEqual(len(self.loads), 1)
+
+    def test_uncommitted_edit(self,):
+        # Editing a tracked file without committing is never masked by the
+        # disk cache.
+        MetadataCache(self.cache_dir).load(self.file_name, self.loader)
+        with open(self.file_name, 'w') as f:
+            f.write("edited")
+        result = MetadataCache(self.cache_dir).load(self.file_name,
+                self.loader)
+        self.assertEqual(result["content"], "edited")
+        self.assertEqual(len(self.loads), 2)
+
+    def test_none(self,):
+        # A file parsing to None is cached like any other, and no per-key
+        # locks are left behind.
+        cache = MetadataCache()
+        loads = []
+        def loader(file_name):
+            loads.append(file_name)
+        cache.load(self.file_name, loader)
+        self.assertEqual(cache.load(self.file_name, loader), None)
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(cache._MetadataCache__key_locks, {})
+
+    def test_namespaces(self,):
+        cache = MetadataCache()
+        cache.load(self.file_name, self.loader, "one")
+        cache.load(self.file_name, self.loader, "two")
+        self.assertEqual(len(self.loads), 2)
+
+    def test_untracked_file(self,):
+        # Files outside a git repository are keyed by mtime and size.
+        file_name = os.path.join(self.testing_dir, "manifest.yaml")
+        with open(file_name, 'w') as f:
+            f.write("a")
+        cache = MetadataCache(self.cache_dir)
+        cache.load(file_name, self.loader)
+        cache.load(file_name, self.loader)
+        self.assertEqual(len(self.loads), 1)
+        with open(file_name, 'w') as f:
+            f.write("ab")
+        self.assertEqual(cache.load(file_name, self.loader)["content"], "ab")
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+if __name__ == "__main__":
+    unittest.main()
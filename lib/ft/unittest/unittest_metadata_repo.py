@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, os, tempfile, shutil, subprocess, time, threading
+
+from ft.platform.configuration import GitMetaDataRepoPool
+from ft.platform.worktree import WorktreeManager
+
+def git(work_tree, *args):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(["git", "-C", work_tree,
+            "-c", "user.name=ft", "-c", "user.email=ft@localhost"] +
+            list(args), stdout=devnull, stderr=devnull)
+
+## Uses a local bare repository in place of the remote metadata server.
+#
+class RepoPoolTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.testing_dir = tempfile.mkdtemp()
+        self.remote_dir = os.path.join(self.testing_dir, "remote")
+        self.work_tree = os.path.join(self.testing_dir, "work")
+        self.base_path = os.path.join(self.testing_dir, "resources")
+
+        os.makedirs(self.work_tree)
+        git(self.work_tree, "init", "-q")
+        git(self.work_tree, "symbolic-ref", "HEAD", "refs/heads/master")
+        with open(os.path.join(self.work_tree, "config.yaml"), 'w') as f:
+            f.write("name: product\n")
+        git(self.work_tree, "add", "config.yaml")
+        git(self.work_tree, "commit", "-q", "-m", "initial")
+        git(self.work_tree, "tag", "-a", "v1.0", "-m", "release 1.0")
+        git(self.testing_dir, "clone", "-q", "--bare", self.work_tree,
+                os.path.join(self.remote_dir, "product.git"))
+
+        self.pools = []
+        self.repo_dict = {
+                "url": "file://" + self.remote_dir + "/",
+                "basepath": "",
+                }
+
+    def tearDown(self,):
+        for pool in self.pools:
+            pool.close()
+        shutil.rmtree(self.testing_dir)
+
+    def get_pool(self, **kwargs):
+        pool = GitMetaDataRepoPool(base_path=self.base_path, **kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def push_tag(self, name):
+        git(self.work_tree, "tag", name)
+        git(self.work_tree, "push", "-q", "--tags",
+                os.path.join(self.remote_dir, "product.git"))
+
+    def get_ref_names(self, repo):
+        return sorted(ref["name"] for ref in repo.get_refs())
+
+    def test_shared_clone(self,):
+        # Every user of the same URL gets the same repository object.
+        pool = self.get_pool()
+        first = pool.get(self.repo_dict, "product", "products")
+        second = pool.get(self.repo_dict, "product", "products")
+        self.assertTrue(first is second)
+        self.assertTrue(os.path.isdir(os.path.join(self.base_path,
+            "products", "product", ".git")))
+        self.assertEqual(self.get_ref_names(first), ["master", "v1.0"])
+
+    def test_cached_refs(self,):
+        # Refs are served from the cache until the next fetch.
+        pool = self.get_pool(ttl=3600)
+        repo = pool.get(self.repo_dict, "product", "products")
+        self.get_ref_names(repo)
+        self.push_tag("v2.0")
+        self.assertEqual(self.get_ref_names(repo), ["master", "v1.0"])
+        repo.fetch()
+        self.assertEqual(self.get_ref_names(repo), ["master", "v1.0", "v2.0"])
+
+    def test_slow_fetch(self,):
+        # A fetch waiting on the remote does not hold up the cached refs.
+        pool = self.get_pool(ttl=3600)
+        repo = pool.get(self.repo_dict, "product", "products")
+        self.get_ref_names(repo)
+        started, gate = threading.Event(), threading.Event()
+        class SlowRemote(object):
+            def fetch(self):
+                started.set()
+                gate.wait(10)
+        clone = repo.repo
+        repo.repo = SlowRemote()
+        repo.repo.remotes = repo.repo
+        repo.repo.origin = repo.repo
+        thread = threading.Thread(target=repo.fetch)
+        thread.start()
+        try:
+            started.wait(10)
+            self.assertEqual(self.get_ref_names(repo), ["master", "v1.0"])
+        finally:
+            gate.set()
+            thread.join()
+            repo.repo = clone
+
+    def test_background_refresh(self,):
+        # Stale repositories are fetched by the refresh thread while get()
+        # returns immediately.
+        pool = self.get_pool(ttl=0.1)
+        repo = pool.get(self.repo_dict, "product", "products")
+        self.push_tag("v2.0")
+        time.sleep(0.2)
+        pool.get(self.repo_dict, "product", "products")
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if "v2.0" in self.get_ref_names(repo):
+                break
+            time.sleep(0.05)
+        self.assertTrue("v2.0" in self.get_ref_names(repo))
+
+    def read_config(self, work_tree):
+        with open(os.path.join(work_tree, "config.yaml"), 'r') as f:
+            return f.read()
+
+    def test_worktrees(self,):
+        # Slots on different versions get separate working trees and a slot
+        # coming back to a version reuses its worktree.
+        with open(os.path.join(self.work_tree, "config.yaml"), 'w') as f:
+            f.write("name: product 2\n")
+        git(self.work_tree, "commit", "-q", "-a", "-m", "second")
+        self.push_tag("v2.0")
+
+        repo = self.get_pool().get(self.repo_dict, "product", "products")
+        manager = WorktreeManager()
+        first = manager.acquire(repo, "v1.0", "slot0")
+        second = manager.acquire(repo, "v2.0", "slot1")
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.read_config(first), "name: product\n")
+        self.assertEqual(self.read_config(second), "name: product 2\n")
+
+        manager.acquire(repo, "v2.0", "slot0")
+        self.assertEqual(manager.acquire(repo, "v1.0", "slot0"), first)
+
+    def test_worktree_collection(self,):
+        # Idle worktrees beyond capacity are removed, held ones are kept.
+        repo = self.get_pool().get(self.repo_dict, "product", "products")
+        manager = WorktreeManager(capacity=1)
+        first = manager.acquire(repo, "v1.0", "slot0")
+        second = manager.acquire(repo, "master", "slot1")
+        self.assertTrue(os.path.isdir(first))
+        self.assertTrue(os.path.isdir(second))
+
+        manager.release("slot0")
+        manager.collect()
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.isdir(second))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, urllib2, gc
+
+from telemetry import metrics
+from telemetry.metrics import Registry, Histogram, MetricsServer
+
+class Owner(object):
+
+    def get_depth(self):
+        return 3
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.registry = Registry()
+
+    def test_histogram(self,):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(0.5), None)
+        for i in range(1, 1001):
+            histogram.observe(i / 1000.0)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.min, 0.001)
+        self.assertEqual(histogram.max, 1.0)
+        # log-linear buckets keep the relative error within a few per cent
+        for p in (0.5, 0.95, 0.99):
+            self.assertTrue(abs(histogram.percentile(p) - p) / p < 0.04)
+        self.assertEqual(histogram.percentile(1), 1.0)
+
+    def test_histogram_zero(self,):
+        histogram = Histogram()
+        histogram.observe(0)
+        histogram.observe(0)
+        histogram.observe(2.0)
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+        self.assertEqual(histogram.percentile(0.99), 2.0)
+
+    def test_labels(self,):
+        self.registry.counter("events", event="A").inc()
+        self.registry.counter("events", event="A").inc(2)
+        self.registry.counter("events", event="B").inc()
+        self.assertEqual(self.registry.counter("events", event="A").get(), 3)
+        self.assertRaises(ValueError, self.registry.gauge, "events",
+                event="A")
+
+    def test_function_gauge(self,):
+        owner = Owner()
+        self.registry.function_gauge("depth", owner.get_depth)
+        self.assertEqual(self.registry.snapshot()["depth"], [({}, 3)])
+        # the gauge does not keep its owner alive
+        del owner
+        gc.collect()
+        self.assertFalse("depth" in self.registry.snapshot())
+
+    def test_render_text(self,):
+        self.registry.counter("ft_events_total", event="TestFinish").inc()
+        self.registry.gauge("ft_server_clients").set(2)
+        self.registry.histogram("ft_uut_stage_seconds",
+                stage="uboot_prep").observe(1.5)
+        lines = self.registry.render_text().splitlines()
+        self.assertTrue("# TYPE ft_events_total counter" in lines)
+        self.assertTrue('ft_events_total{event="TestFinish"} 1' in lines)
+        self.assertTrue("ft_server_clients 2" in lines)
+        self.assertTrue("# TYPE ft_uut_stage_seconds summary" in lines)
+        self.assertTrue('ft_uut_stage_seconds{stage="uboot_prep",'
+                'quantile="0.95"} 1.5' in lines)
+        self.assertTrue('ft_uut_stage_seconds_count{stage="uboot_prep"} 1'
+                in lines)
+
+    def test_server(self,):
+        self.registry.counter("ft_server_requests_total").inc()
+        server = MetricsServer(("127.0.0.1", 0), self.registry)
+        server.start()
+        try:
+            url = "http://127.0.0.1:{0}".format(server.address[1])
+            body = urllib2.urlopen(url + "/metrics").read()
+            self.assertTrue("ft_server_requests_total 1" in body)
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                    url + "/other")
+        finally:
+            server.stop()
+
+    def test_timer(self,):
+        @metrics.timed("unittest_timed_seconds")
+        def f():
+            return 1
+        self.assertEqual(f(), 1)
+        self.assertEqual(metrics.registry.histogram(
+            "unittest_timed_seconds").count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
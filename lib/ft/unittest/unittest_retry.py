@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, socket
+
+import ft.event
+from ft.test import Test, SpecificationError
+from ft.test.retry import RetryPolicy, RetryBudget, Retrier, Scope
+
+class EventHandler(object):
+
+    def __init__(self,):
+        self.events = []
+
+    def fire(self, event, **kwargs):
+        self.events.append((event, kwargs))
+
+    def get(self, event_type):
+        return [kwargs for event, kwargs in self.events
+                if event is event_type]
+
+class UUT(object):
+
+    def __init__(self, budget=None):
+        self.serial_number = "0000000001"
+        self.address = ((None, 0), self.serial_number)
+        self.event_handler = EventHandler()
+        self.retry_budget = budget
+
+## Action class whose results are scripted per call; an exception instance
+#  in the script is raised instead of returned.
+#
+class Scripted(object):
+
+    def __init__(self, kwargs):
+        self.results = kwargs["results"]
+
+    def call(self, kwargs):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def single_test(actions, retry=None, valid=True):
+    test_dict = {
+            "name": "Retry",
+            "type": "single",
+            "shortdesc": "",
+            "refdes": [],
+            "valid": valid,
+            "actionlist": [{
+                "class": Scripted,
+                "constructor_args": {"results": results},
+                "kwargs": {},
+                "method_name": "call",
+                "name": "action{0}".format(i),
+                "remote": False,
+                } for i, results in enumerate(actions)],
+            }
+    if retry is not None:
+        test_dict["retry"] = retry
+    return test_dict
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_from_test_dict(self,):
+        policy = RetryPolicy.from_test_dict({"max_retry": 2})
+        self.assertEqual((policy.attempts, policy.scope), (2, Scope.TEST))
+        policy = RetryPolicy.from_test_dict({"retry": {"scope": "action",
+            "attempts": 3, "backoff": 1}})
+        self.assertEqual((policy.attempts, policy.scope), (3, Scope.ACTION))
+        self.assertEqual([policy.get_delay(i) for i in (1, 2, 3)], [1, 2, 4])
+        self.assertRaises(SpecificationError, RetryPolicy.from_test_dict,
+                {"retry": {"scope": "bogus"}})
+
+    def test_budget(self,):
+        budget = RetryBudget(1)
+        retrier = Retrier(RetryPolicy(5), budget)
+        self.assertEqual(retrier.next(1, "broken"), 0)
+        self.assertEqual(retrier.next(2, "broken"), None)
+        self.assertTrue(retrier.stats.exhausted)
+        self.assertEqual(budget.get_remaining(), 0)
+
+class TestRetryTest(unittest.TestCase):
+
+    def run_test(self, test_dict, uut):
+        test = Test(test_dict, uut)
+        test.set_address(0)
+        test.initialize_actions()
+        test.run()
+        return test
+
+    def test_action_scope(self,):
+        # Only the broken action is called again.
+        uut = UUT()
+        test = self.run_test(single_test([
+            [(0, "ok")],
+            [ValueError("flaky"), (0, "ok")],
+            ], retry={"scope": "action"}), uut)
+        self.assertFalse(test.status & Test.State.FAIL)
+        retries = uut.event_handler.get(ft.event.TestRetry)
+        self.assertEqual(len(retries), 1)
+        self.assertEqual(retries[0]["action"], "action1")
+        finish = uut.event_handler.get(ft.event.TestFinish)[0]
+        self.assertEqual(finish["retries"]["retries"], 1)
+
+    def test_on_fail(self,):
+        uut = UUT()
+        test = self.run_test(single_test([[(1, "bad"), (0, "ok")]],
+            retry={"scope": "action", "on_fail": True}), uut)
+        self.assertFalse(test.status & Test.State.FAIL)
+        test = self.run_test(single_test([[(1, "bad"), (0, "ok")]],
+            retry={"scope": "action"}), uut)
+        self.assertTrue(test.status & Test.State.FAIL)
+
+    def test_fail_fast(self,):
+        # Unreachable interfaces and invalid tests are not retried.
+        uut = UUT()
+        test = self.run_test(single_test([[socket.error("refused"),
+            (0, "ok")]], retry={"scope": "action"}), uut)
+        self.assertTrue(test.status & Test.State.FAIL)
+        self.assertTrue(test.retrier.stats.fail_fast)
+
+        test = self.run_test(single_test([[ValueError(), (0, "ok")]],
+            retry={"scope": "action"}, valid=False), uut)
+        self.assertEqual(test.retrier.stats.retries, 0)
+        self.assertEqual(uut.event_handler.get(ft.event.TestRetry), [])
+
+    def test_unit_budget(self,):
+        # Retries stop once the UUT's budget is spent.
+        uut = UUT(RetryBudget(2))
+        for i in range(2):
+            self.run_test(single_test([[ValueError()] * 5],
+                retry={"scope": "action"}), uut)
+        self.assertEqual(len(uut.event_handler.get(ft.event.TestRetry)), 2)
+
+if __name__ == "__main__":
+    unittest.main()
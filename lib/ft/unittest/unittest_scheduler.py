@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, time
+
+from ft.test import SpecificationError
+from ft.test.scheduler import TestScheduler, EventSequencer
+from ft.util.locker import OperationToken, OperationCancelled
+
+class EventHandler(object):
+
+    def __init__(self,):
+        self.events = []
+
+    def fire(self, event, **kwargs):
+        self.events.append((event, kwargs["name"]))
+
+class FakeTest(object):
+
+    def __init__(self, name, duration, log, resources=None, depends=()):
+        self.name = name
+        self.type = "single"
+        self.duration = duration
+        self.log = log
+        self.test_dict = {"depends": list(depends)}
+        if resources is not None:
+            self.test_dict["resources"] = resources
+        self.event_handler = None
+
+    def run(self, token):
+        self.event_handler.fire("start", name=self.name)
+        self.log.append(("start", self.name, time.time()))
+        token.sleep(self.duration)
+        self.log.append(("end", self.name, time.time()))
+        self.event_handler.fire("finish", name=self.name)
+
+class TestSchedulerTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.log = []
+        self.handler = EventHandler()
+
+    def run_tests(self, tests, max_workers=4, token=None):
+        sequencer = EventSequencer(self.handler)
+        for i, test in enumerate(tests):
+            test.event_handler = sequencer.get_channel(i)
+        TestScheduler(tests, sequencer, max_workers).run(
+                token or OperationToken("run_all_tests"))
+
+    def get_times(self, name):
+        start, end = [t for event, test, t in self.log if test == name]
+        return start, end
+
+    def overlap(self, a, b):
+        a_start, a_end = self.get_times(a)
+        b_start, b_end = self.get_times(b)
+        return a_start < b_end and b_start < a_end
+
+    def test_parallel(self,):
+        # Tests on different resources overlap, shared resources do not, and
+        # events still reach the handler in specification order.
+        tests = [
+                FakeTest("gpio", 0.2, self.log, ["gpio"]),
+                FakeTest("audio", 0.1, self.log, ["audio"]),
+                FakeTest("gpio2", 0.1, self.log, ["gpio"]),
+                FakeTest("pwm", 0.1, self.log, ["pwm"]),
+                ]
+        self.run_tests(tests)
+        self.assertTrue(self.overlap("gpio", "audio"))
+        self.assertTrue(self.overlap("gpio", "pwm"))
+        self.assertFalse(self.overlap("gpio", "gpio2"))
+        self.assertEqual(self.handler.events, [(event, test.name)
+            for test in tests for event in ("start", "finish")])
+
+    def test_dependencies(self,):
+        tests = [
+                FakeTest("audio", 0.05, self.log, ["audio"],
+                    depends=["driver"]),
+                FakeTest("driver", 0.1, self.log, []),
+                FakeTest("pwm", 0.1, self.log, ["pwm"]),
+                ]
+        self.run_tests(tests)
+        self.assertTrue(self.get_times("driver")[1] <=
+                self.get_times("audio")[0])
+        self.assertTrue(self.overlap("driver", "pwm"))
+
+    def test_exclusive(self,):
+        # Tests without resources keep the old sequential behaviour.
+        tests = [FakeTest(str(i), 0.02, self.log, None) for i in range(3)]
+        tests.insert(1, FakeTest("gpio", 0.02, self.log, ["gpio"]))
+        self.run_tests(tests)
+        names = [test for event, test, t in self.log]
+        self.assertEqual(names, ["0", "0", "gpio", "gpio", "1", "1", "2",
+            "2"])
+
+    def test_max_workers(self,):
+        tests = [FakeTest(str(i), 0.05, self.log, []) for i in range(3)]
+        self.run_tests(tests, max_workers=1)
+        self.assertFalse(self.overlap("0", "1"))
+        self.assertFalse(self.overlap("1", "2"))
+
+    def test_cancel(self,):
+        token = OperationToken("run_all_tests")
+        tests = [FakeTest(str(i), 10, self.log, []) for i in range(6)]
+        threading.Timer(0.1, token.cancel).start()
+        start = time.time()
+        self.assertRaises(OperationCancelled, self.run_tests, tests, 4, token)
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual(len(self.log), 4)
+
+    def test_invalid_dependencies(self,):
+        tests = [FakeTest("a", 0, self.log, [], depends=["b"]),
+                FakeTest("b", 0, self.log, [], depends=["a"])]
+        self.assertRaises(SpecificationError, TestScheduler, tests)
+        tests = [FakeTest("a", 0, self.log, [], depends=["c"])]
+        self.assertRaises(SpecificationError, TestScheduler, tests)
+
+if __name__ == "__main__":
+    unittest.main()
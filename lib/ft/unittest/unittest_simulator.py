@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, socket, xmlrpclib, threading, time
+
+from eserial import EnhancedSerial, OldEnhancedSerial
+from interfaces import (
+        UBootTerminalInterface,
+        LinuxTerminalInterface,
+        ADAMInterface,
+        adam,
+        )
+from interfaces.xmlrpc import EMACXMLRPCInterface, AGENT_PORT, READY_MARKER
+from simulator import (
+        SimulatedTarget,
+        SimulatedRack,
+        ADAMBus,
+        Latency,
+        SimulatedADAM_4017P,
+        SimulatedADAM_4024,
+        SimulatedADAM_4050,
+        SimulatedADAM_4051,
+        )
+from simulator.target import DEFAULT_LATENCY
+
+def get_free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+class SimulatedTargetTest(unittest.TestCase):
+
+    def start_target(self, ip_address="127.0.0.1", **kwargs):
+        target = SimulatedTarget(ip_address=ip_address,
+                latency=Latency(scale=0, defaults=DEFAULT_LATENCY), **kwargs)
+        target.start()
+        self.addCleanup(target.stop)
+        serial = EnhancedSerial(target.path, 115200)
+        uboot = UBootTerminalInterface(enhanced_serial=serial)
+        linux = LinuxTerminalInterface("sh-3.2#", enhanced_serial=serial)
+        return target, uboot, linux
+
+    def test_boot(self,):
+        target, uboot, linux = self.start_target()
+        self.assertTrue(uboot.chk(5))
+        self.assertEqual(uboot.get_var("ipaddr"), "127.0.0.1")
+        self.assertTrue(uboot.set_var("bootargs", "console=ttyS0,115200"))
+        self.assertTrue(uboot.cmd("run boot-test", prompt="sh-3.2#",
+            timeout=5)[0])
+
+        # the shell starts the target's XML-RPC server
+        port = get_free_port()
+        self.assertTrue(linux.cmd("./bin/xmlrpcserver.py -p {0} 127.0.0.1 "
+            "&".format(port), prompt=READY_MARKER, timeout=5)[0])
+        client = xmlrpclib.ServerProxy("http://127.0.0.1:{0}".format(port),
+                allow_none=True)
+        self.assertTrue("BinaryCall" in client.get_interfaces())
+        client.create_instance("test", "BinaryCall",
+                {"binary_full_path": "/bin/true"})
+        self.assertEqual(client.call_method("test", "call", {"argslist": []}),
+                [0, ""])
+
+        # power loss takes the target back to U-Boot
+        target.set_power(False)
+        self.assertFalse(target.rpc_servers)
+        target.set_power(True)
+        self.assertTrue(uboot.chk(5))
+
+    def test_agent(self,):
+        target, uboot, linux = self.start_target(agent=True,
+                ip_address="127.0.0.2")
+        self.assertTrue(uboot.cmd("run boot-test", prompt=READY_MARKER,
+            timeout=5)[0])
+        socket.create_connection(("127.0.0.2", AGENT_PORT), 1).close()
+        # the agent is already running
+        self.assertTrue(linux.cmd("./bin/xmlrpcserver.py &",
+            prompt="Address already in use", timeout=5)[0])
+
+    def test_login(self,):
+        target, uboot, linux = self.start_target(login=True)
+        target.latency.delays["login_banner"] = 0.2
+        self.assertTrue(uboot.cmd("run boot-test", prompt="login:",
+            timeout=5)[0])
+        self.assertTrue(linux.login())
+
+class XMLRPCInterfaceTest(unittest.TestCase):
+
+    def test_module(self,):
+        interface = EMACXMLRPCInterface(module="ft.device.emac_devices")
+        self.assertEqual(interface.interfaces, {})
+        interface.create_instance("test", "BinaryCall",
+                {"binary_full_path": "/bin/true", "instance_name": "test"})
+        self.assertEqual(interface.call_method("test", "call",
+            {"argslist": []}), (0, ""))
+        self.assertTrue("GPIO" in interface.get_interfaces())
+        self.assertRaises(ValueError, EMACXMLRPCInterface)
+
+class ADAMBusTest(unittest.TestCase):
+
+    def setUp(self,):
+        self.bus = ADAMBus(latency=Latency(scale=0))
+        self.bus.start()
+        serial = OldEnhancedSerial(port=self.bus.path, baudrate=9600,
+                timeout=0.01)
+        self.interface = ADAMInterface(serial)
+
+    def tearDown(self,):
+        self.interface.serial.close()
+        self.bus.stop()
+
+    def test_digital(self,):
+        dio = self.bus.add_module(SimulatedADAM_4050("02"))
+        di = self.bus.add_module(SimulatedADAM_4051("03"))
+        dio.set_inputs(0x05)
+        di.set_inputs(0x8001)
+
+        module = adam.ADAM_4050(self.interface, "02")
+        module.set_digital([0, 2], 1)
+        self.assertEqual(dio.outputs, 0x05)
+        self.assertEqual(module.get_hex("inputs"), "05")
+        self.assertEqual(adam.ADAM_4051(self.interface, "03").get_hex(
+            "inputs"), "8001")
+
+    def test_analog(self,):
+        ao = self.bus.add_module(SimulatedADAM_4024("04"))
+        ai = self.bus.add_module(SimulatedADAM_4017P("05"))
+        ai.set_analog_input(1, 2.5)
+
+        module = adam.ADAM_4024(self.interface, "04")
+        module.set_analog([1], 5.25)
+        self.assertEqual(ao.analog_outputs[1], 5.25)
+        self.assertEqual(module.get_analog()["analog_outputs"][1], 5.25)
+        self.assertEqual(adam.ADAM_4017P(self.interface, "05").get_analog()[
+            "analog_inputs"][1], 2.5)
+
+    def test_missing_module(self,):
+        self.assertRaises(NameError, adam.ADAM_4068, self.interface, "09")
+
+    def test_concurrent_queries(self,):
+        # Slots sharing the bus never read each other's responses, even when
+        # a thread is preempted between sending a command and reading it.
+        cmd = self.interface.cmd
+        def slow_cmd(**kwargs):
+            result = cmd(**kwargs)
+            time.sleep(0.05)
+            return result
+        self.interface.cmd = slow_cmd
+        errors = []
+        def query(address, inputs):
+            self.bus.add_module(SimulatedADAM_4051(address)).set_inputs(
+                    inputs)
+            module = adam.ADAM_4051(self.interface, address)
+            for i in range(5):
+                value = module.get_hex("inputs")
+                if value != "{0:04X}".format(inputs):
+                    errors.append((address, value))
+        threads = [threading.Thread(target=query, args=args)
+                for args in (("06", 0x1234), ("07", 0x4321))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+class SimulatedRackTest(unittest.TestCase):
+
+    def test_power(self,):
+        with SimulatedRack(2, Latency(scale=0, defaults=DEFAULT_LATENCY)) \
+                as rack:
+            serial = OldEnhancedSerial(port=rack.get_adam_config()["serial"],
+                    baudrate=9600, timeout=0.01)
+            self.addCleanup(serial.close)
+            control = rack.get_slot_control(1)["adam"]
+            relay = adam.ADAM_4068(ADAMInterface(serial), control["address"])
+            relay.set_digital(control["pins"]["power"], 1)
+            self.assertFalse(rack.targets[0].is_powered())
+            self.assertTrue(rack.targets[1].is_powered())
+            relay.set_digital(control["pins"]["power"], 0)
+            self.assertFalse(rack.targets[1].is_powered())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+import unittest, threading, json, csv, StringIO
+
+from telemetry import trace
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self,):
+        trace.clear()
+
+    def tearDown(self,):
+        trace.disable()
+        trace.clear()
+
+    def test_disabled(self,):
+        # Nothing is recorded and the no-op span is shared.
+        self.assertTrue(trace.span("a") is trace.span("b"))
+        with trace.span("a"):
+            pass
+        self.assertEqual(trace.get_spans(), [])
+
+    def test_nesting(self,):
+        trace.enable()
+
+        @trace.traced(category="test")
+        def inner():
+            with trace.span("leaf", "serial", command="printenv"):
+                pass
+
+        with trace.span("outer", "uut"):
+            inner()
+        spans = dict((s.name, s) for s in trace.get_spans())
+        self.assertEqual(spans["outer"].depth, 0)
+        self.assertEqual(spans["inner"].depth, 1)
+        self.assertEqual(spans["leaf"].depth, 2)
+        self.assertEqual(spans["leaf"].args, {"command": "printenv"})
+        self.assertTrue(spans["outer"].duration >= spans["inner"].duration)
+
+    def test_ring_buffer(self,):
+        # Each thread keeps only its most recent spans.
+        trace.enable(buffer_size=4)
+        def record():
+            for i in range(10):
+                with trace.span(str(i)):
+                    pass
+        thread = threading.Thread(target=record, name="Recorder")
+        thread.start()
+        thread.join()
+        names = [s.name for s in trace.get_spans() if s.thread == "Recorder"]
+        self.assertEqual(names, ["6", "7", "8", "9"])
+
+    def test_exited_threads(self,):
+        # Buffers of exited threads are merged and share one ring buffer.
+        trace.enable(buffer_size=4)
+        def record(thread_number):
+            for i in range(3):
+                with trace.span("{0}.{1}".format(thread_number, i)):
+                    pass
+        for thread_number in range(5):
+            thread = threading.Thread(target=record, args=(thread_number,))
+            thread.start()
+            thread.join()
+        names = [s.name for s in trace.get_spans()]
+        self.assertEqual(names, ["3.2", "4.0", "4.1", "4.2"])
+        self.assertFalse(any(buf.thread.ident == thread.ident
+            for buf in trace._buffers))
+
+    def test_export(self,):
+        trace.enable()
+        with trace.span("nfs_test_boot", "uut", serial="SN1"):
+            pass
+
+        f = StringIO.StringIO()
+        trace.export_chrome(f)
+        events = json.loads(f.getvalue())["traceEvents"]
+        span = [e for e in events if e["ph"] == "X"][0]
+        self.assertEqual((span["name"], span["cat"]), ("nfs_test_boot", "uut"))
+        self.assertEqual(span["args"], {"serial": "SN1"})
+        self.assertTrue([e for e in events if e["ph"] == "M"])
+
+        f = StringIO.StringIO()
+        trace.export_csv(f)
+        rows = list(csv.reader(StringIO.StringIO(f.getvalue())))
+        self.assertEqual(rows[0][0], "start")
+        self.assertEqual(rows[1][4:], ["uut", "nfs_test_boot", "serial=SN1"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 # vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
 
 # standard libraries
+import logging, time, threading, weakref
 from functools import wraps
 from threading import (
         RLock,
@@ -21,13 +22,8 @@ def acquire_and_release(f, o_type="instance"):
         else:
             condition   = self.cls_condition
 
-        condition.acquire()
-        #print("Condition Lock acquired.")
-        result  = f(self, *args, **kwargs)
-        condition.release()
-        #print("Condition Lock released.")
-
-        return result
+        with condition:
+            return f(self, *args, **kwargs)
 
     return wrapper
 
@@ -78,3 +74,267 @@ def cls_locker_all(cls):
         setattr(cls, key, acquire_and_release(val, o_type="class"))
     
     return cls
+
+## Waits longer than this many seconds are logged.
+#
+SLOW_WAIT = 1.0
+
+_locks = weakref.WeakValueDictionary()
+_locks_lock = threading.Lock()
+
+## Return the statistics of every live RWLock keyed by lock name.
+#
+def get_lock_stats():
+    with _locks_lock:
+        locks = _locks.values()
+    return dict((lock.name, lock.get_stats()) for lock in locks)
+
+##
+# @brief Wait and hold time statistics of a lock.
+#
+class LockStats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquisitions = {"read": 0, "write": 0}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_hold = 0.0
+        self.max_hold = 0.0
+
+    def add_wait(self, mode, wait):
+        with self.lock:
+            self.acquisitions[mode] += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def add_hold(self, hold):
+        with self.lock:
+            self.total_hold += hold
+            self.max_hold = max(self.max_hold, hold)
+
+    def get(self):
+        with self.lock:
+            return {
+                    "reads": self.acquisitions["read"],
+                    "writes": self.acquisitions["write"],
+                    "total_wait": self.total_wait,
+                    "max_wait": self.max_wait,
+                    "total_hold": self.total_hold,
+                    "max_hold": self.max_hold,
+                    }
+
+##
+# @brief Read/write lock for Platform objects.
+#
+# Any number of threads may hold the read lock while no thread holds the write
+# lock. Both are reentrant and the writer may also take the read lock; a reader
+# may not upgrade to the write lock. Waiting writers block new readers, except
+# readers that already hold the lock. Plain acquire()/release() and the "with"
+# statement take the write lock, so an RWLock can replace an RLock.
+#
+class RWLock(object):
+
+    def __init__(self, name=None):
+        self.name = name or "RWLock-{0:x}".format(id(self))
+        self.stats = LockStats()
+
+        self.__condition = Condition(threading.Lock())
+        self.__readers = dict()
+        self.__writer = None
+        self.__writer_count = 0
+        self.__writers_waiting = 0
+        self.__local = threading.local()
+
+        with _locks_lock:
+            _locks[id(self)] = self
+
+    def acquire_read(self):
+        me = threading.current_thread()
+        start = time.time()
+        with self.__condition:
+            if self.__writer is not me and not self.__readers.has_key(me):
+                while self.__writer is not None or self.__writers_waiting:
+                    self.__condition.wait()
+            self.__readers[me] = self.__readers.get(me, 0) + 1
+        self.__acquired("read", start)
+
+    def release_read(self):
+        me = threading.current_thread()
+        with self.__condition:
+            count = self.__readers[me] - 1
+            if count:
+                self.__readers[me] = count
+            else:
+                del self.__readers[me]
+                self.__condition.notify_all()
+        self.__released()
+
+    def acquire_write(self):
+        me = threading.current_thread()
+        start = time.time()
+        with self.__condition:
+            if self.__writer is not me:
+                if self.__readers.has_key(me):
+                    raise RuntimeError("Cannot upgrade read lock of {0} to "
+                            "write lock".format(self.name))
+                self.__writers_waiting += 1
+                try:
+                    while self.__writer is not None or self.__readers:
+                        self.__condition.wait()
+                finally:
+                    self.__writers_waiting -= 1
+                self.__writer = me
+            self.__writer_count += 1
+        self.__acquired("write", start)
+
+    def release_write(self):
+        with self.__condition:
+            if self.__writer is not threading.current_thread():
+                raise RuntimeError("Cannot release un-acquired lock")
+            self.__writer_count -= 1
+            if self.__writer_count == 0:
+                self.__writer = None
+                self.__condition.notify_all()
+        self.__released()
+
+    acquire = acquire_write
+    release = release_write
+
+    def __enter__(self):
+        self.acquire_write()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.release_write()
+
+    ## Return a context manager holding the read lock.
+    #
+    def read(self):
+        return _Holder(self.acquire_read, self.release_read)
+
+    ## Return a context manager holding the write lock.
+    #
+    def write(self):
+        return _Holder(self.acquire_write, self.release_write)
+
+    def get_stats(self):
+        return self.stats.get()
+
+    # Hold times are measured from the outermost acquisition of each thread.
+    def __acquired(self, mode, start):
+        now = time.time()
+        wait = now - start
+        self.stats.add_wait(mode, wait)
+        if wait > SLOW_WAIT:
+            logging.debug("Waited {0:.3f}s for {1} lock {2}".format(wait, mode,
+                self.name))
+        depth = getattr(self.__local, "depth", 0)
+        if depth == 0:
+            self.__local.since = now
+        self.__local.depth = depth + 1
+
+    def __released(self):
+        self.__local.depth -= 1
+        if self.__local.depth == 0:
+            self.stats.add_hold(time.time() - self.__local.since)
+
+class _Holder(object):
+
+    def __init__(self, acquire, release):
+        self.__acquire = acquire
+        self.__release = release
+
+    def __enter__(self):
+        self.__acquire()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.__release()
+
+##
+# @brief Mark a CommandsSync method as a read-only query.
+#
+# Queries run under the recipient's read lock so they are served concurrently
+# and are never held up by each other.
+#
+def query(f):
+    f.is_query = True
+    return f
+
+##
+# @brief Mark a CommandsSync method as allowed to run while an asynchronous
+# command is in progress, typically to cancel it.
+#
+def preempt(f):
+    f.preempts = True
+    return f
+
+##
+# @brief Mark a CommandsAsync method as safe to collapse: sending it again
+# while an identical request is last in the recipient's queue is a no-op.
+#
+def idempotent(f):
+    f.idempotent = True
+    return f
+
+##
+# @brief Raised by OperationToken.check() and OperationToken.sleep() once the
+# operation has been cancelled.
+#
+class OperationCancelled(Exception):
+
+    def __init__(self, name):
+        self.message = "Operation cancelled: {0}".format(name)
+
+    def __str__(self):
+        return repr(self.message)
+
+##
+# @brief Represents a long running operation on a Platform object.
+#
+# Asynchronous commands run under an operation token instead of holding the
+# object's lock for their whole duration. The token records what is running
+# and doubles as its cancellation token: it is passed down to everything the
+# operation calls, which use check() and sleep() at convenient points so that
+# cancel() stops the operation within a bounded time.
+#
+class OperationToken(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.thread = threading.current_thread()
+        self.__cancelled = threading.Event()
+        self.__finished = threading.Event()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    ## Mark the operation as over, waking up everything blocked in wait().
+    #
+    def finish(self):
+        self.__finished.set()
+
+    ## Block until finish() is called.
+    #
+    def wait(self):
+        # a timeout keeps the wait interruptible
+        while not self.__finished.wait(1):
+            pass
+
+    def is_cancelled(self):
+        return self.__cancelled.is_set()
+
+    ## Raise OperationCancelled if the operation has been cancelled.
+    #
+    def check(self):
+        if self.__cancelled.is_set():
+            raise OperationCancelled(self.name)
+
+    ## Sleep for "seconds", raising OperationCancelled as soon as the
+    #  operation is cancelled.
+    #
+    def sleep(self, seconds):
+        self.__cancelled.wait(seconds)
+        self.check()
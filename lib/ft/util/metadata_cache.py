@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package metadata_cache
+#
+#  Cache for parsed (and validated) metadata files such as manifests,
+#  config.yaml and test specifications.
+#
+#  Files inside a git working tree are keyed by (repository, HEAD commit, path
+#  relative to the working tree, digest of the file's contents) and are kept
+#  both in memory and as pickles on disk, so that every PlatformSlot selecting
+#  the same product version shares a single parse even across restarts, while
+#  uncommitted edits are still picked up. The repository is identified by its
+#  common git directory, which means that worktrees of one clone share cache
+#  entries. Files outside of a git repository are cached in memory only and
+#  keyed by their modification time and size.
+#
+
+import os, os.path as path, threading, hashlib, copy, logging
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+## Bump whenever the structure of cached objects changes.
+#
+CACHE_VERSION = 2
+
+# marks a missing entry, since a file may parse to None
+_MISSING = object()
+
+def _read_file(file_name):
+    with open(file_name, 'r') as f:
+        return f.read().strip()
+
+## Locate the git directory of the working tree rooted at "work_tree".
+#
+#  Returns a (git_dir, common_dir) tuple; both are the same for ordinary
+#  clones while worktrees keep HEAD in their own git_dir and refs in the
+#  common_dir of the main repository.
+#
+def get_git_dirs(work_tree):
+    git_path = path.join(work_tree, ".git")
+    if path.isdir(git_path):
+        git_dir = git_path
+    elif path.isfile(git_path):
+        git_dir = _read_file(git_path)
+        if not git_dir.startswith("gitdir:"):
+            return None, None
+        git_dir = path.join(work_tree, git_dir[len("gitdir:"):].strip())
+    else:
+        return None, None
+
+    common_dir = git_dir
+    commondir_file = path.join(git_dir, "commondir")
+    if path.isfile(commondir_file):
+        common_dir = path.join(git_dir, _read_file(commondir_file))
+
+    return path.realpath(git_dir), path.realpath(common_dir)
+
+## Resolve the commit currently checked out in "work_tree" without spawning
+#  git; returns None if it cannot be determined.
+#
+def get_head_commit(work_tree):
+    git_dir, common_dir = get_git_dirs(work_tree)
+    if not git_dir:
+        return None
+    try:
+        head = _read_file(path.join(git_dir, "HEAD"))
+        if not head.startswith("ref:"):
+            return head
+        ref = head[len("ref:"):].strip()
+        ref_file = path.join(common_dir, ref)
+        if path.isfile(ref_file):
+            return _read_file(ref_file)
+        packed_refs = path.join(common_dir, "packed-refs")
+        if path.isfile(packed_refs):
+            with open(packed_refs, 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 2 and fields[1] == ref:
+                        return fields[0]
+    except (IOError, OSError):
+        pass
+    return None
+
+class MetadataCache(object):
+
+    ## @param cache_dir Directory in which to store pickled entries; if None
+    #  entries are only cached in memory.
+    #
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.__entries = {}
+        self.__key_locks = {}
+        self.__work_trees = {}
+
+    ## Load "file_name" through "loader", serving the result from the cache
+    #  whenever the file is known to be unchanged.
+    #
+    #  @param file_name Path of the metadata file.
+    #  @param loader Callable that takes the file name and returns the parsed
+    #  (and validated) object. Exceptions are passed on and never cached.
+    #  @param namespace Distinguishes results of different loaders for the
+    #  same file.
+    #
+    #  @return A private copy of the cached object which the caller is free to
+    #  modify.
+    #
+    def load(self, file_name, loader, namespace="yaml"):
+        key, repo = self.__get_key(file_name, namespace)
+
+        lock = self.__acquire_key_lock(key)
+        try:
+            with lock:
+                with self.lock:
+                    value = self.__entries.get(key, _MISSING)
+                if value is _MISSING and repo:
+                    value = self.__load_pickle(key)
+                if value is _MISSING:
+                    value = loader(file_name)
+                    if repo:
+                        self.__store_pickle(key, value)
+                with self.lock:
+                    self.__entries[key] = value
+        finally:
+            self.__release_key_lock(key)
+
+        return copy.deepcopy(value)
+
+    ## Drop memory entries belonging to the repository containing
+    #  "work_tree"; typically called after a checkout. Disk entries are keyed
+    #  by commit and so never go stale.
+    #
+    def invalidate(self, work_tree=None):
+        with self.lock:
+            if work_tree is None:
+                self.__entries.clear()
+                self.__work_trees.clear()
+                return
+            git_dir, common_dir = get_git_dirs(work_tree)
+            for key in self.__entries.keys():
+                if key[1] == common_dir:
+                    del self.__entries[key]
+            self.__work_trees.clear()
+
+    ## Return the lock serializing loads of "key"; every call is paired with
+    #  __release_key_lock(), which drops the lock once nobody uses it.
+    #
+    def __acquire_key_lock(self, key):
+        with self.lock:
+            entry = self.__key_locks.get(key)
+            if entry is None:
+                entry = self.__key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def __release_key_lock(self, key):
+        with self.lock:
+            entry = self.__key_locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.__key_locks[key]
+
+    ## Return the cache key for the given file and whether it belongs to a git
+    #  repository.
+    #
+    def __get_key(self, file_name, namespace):
+        file_name = path.realpath(file_name)
+        work_tree = self.__find_work_tree(path.dirname(file_name))
+        if work_tree:
+            commit = get_head_commit(work_tree)
+            if commit:
+                git_dir, common_dir = get_git_dirs(work_tree)
+                with open(file_name, 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+                return (CACHE_VERSION, common_dir, commit,
+                        path.relpath(file_name, work_tree), digest,
+                        namespace), True
+
+        stat = os.stat(file_name)
+        return (CACHE_VERSION, None, file_name, stat.st_mtime, stat.st_size,
+                namespace), False
+
+    def __find_work_tree(self, directory):
+        with self.lock:
+            if directory in self.__work_trees:
+                return self.__work_trees[directory]
+
+        work_tree = directory
+        while not path.exists(path.join(work_tree, ".git")):
+            parent = path.dirname(work_tree)
+            if parent == work_tree:
+                work_tree = None
+                break
+            work_tree = parent
+
+        with self.lock:
+            self.__work_trees[directory] = work_tree
+        return work_tree
+
+    def __get_pickle_path(self, key):
+        digest = hashlib.sha1(repr(key)).hexdigest()
+        return path.join(self.cache_dir, digest + ".pickle")
+
+    def __load_pickle(self, key):
+        if not self.cache_dir:
+            return _MISSING
+        pickle_path = self.__get_pickle_path(key)
+        try:
+            with open(pickle_path, 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (IOError, OSError):
+            return _MISSING
+        except Exception:
+            logging.warning("Discarding unreadable metadata cache entry: "
+                    "{0}".format(pickle_path))
+            return _MISSING
+        if stored_key != key:
+            return _MISSING
+        return value
+
+    def __store_pickle(self, key, value):
+        if not self.cache_dir:
+            return
+        pickle_path = self.__get_pickle_path(key)
+        tmp_path = "{0}.{1}.tmp".format(pickle_path, os.getpid())
+        try:
+            if not path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, value), f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, pickle_path)
+        except (IOError, OSError, pickle.PicklingError, TypeError):
+            logging.warning("Could not store metadata cache entry: "
+                    "{0}".format(key[3]))
+            if path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+metadata_cache = MetadataCache(path.join("resources", ".metadata_cache"))
+
+## Set the directory used for pickled cache entries; None disables the disk
+#  cache.
+#
+def set_cache_dir(cache_dir):
+    metadata_cache.cache_dir = cache_dir
@@ -8,7 +8,17 @@ try:
 except ImportError:
         from yaml import Loader, Dumper
 
-def load_manifest(manifest_file):
-    with file(manifest_file, 'r+') as f:
+from ft.util.metadata_cache import metadata_cache
+
+def _parse_yaml(file_name):
+    with file(file_name, 'r+') as f:
         return yaml.load(f, Loader=Loader)
 
+## Load a yaml file through the metadata cache.
+#
+def load_yaml(file_name):
+    return metadata_cache.load(file_name, _parse_yaml, "yaml")
+
+def load_manifest(manifest_file):
+    return load_yaml(manifest_file)
+
@@ -1,18 +1,20 @@
 #!/usr/bin/env python
 
-from adam.interface import ADAMInterface 
-from adam.modules import ADAM_4068
-import adam
+## @package interfaces
+#
+#  The interfaces are imported on first access, so that a user of one of them,
+#  such as the target's xmlrpcserver.py, does not load the ADAM stack and
+#  pyserial; see telemetry.imports.
+#
 
-from uboot import UBootTerminalInterface
-from linux import LinuxTerminalInterface
+from telemetry.imports import lazy_package
 
-__all__ = [ 
-    ADAMInterface,
+lazy_package(__name__, {
+    "ADAMInterface": "interfaces.adam.interface:ADAMInterface",
 
-    ADAM_4068,
-    adam,
+    "ADAM_4068": "interfaces.adam.modules:ADAM_4068",
+    "adam": "interfaces.adam",
 
-    UBootTerminalInterface,
-    LinuxTerminalInterface,
-    ]
+    "UBootTerminalInterface": "interfaces.uboot:UBootTerminalInterface",
+    "LinuxTerminalInterface": "interfaces.linux:LinuxTerminalInterface",
+    })
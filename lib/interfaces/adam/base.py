@@ -47,15 +47,13 @@ class ADAMModule(object):
         adam_interface  = self.interface
 
         # run query
-        adam_interface.cmd(
+        # TODO error-check response
+        return adam_interface.request(cut_address,
                 delimiter   = "#",
                 address     = self.address,
                 options     = command,
                 )
 
-        # TODO error-check response
-        return adam_interface.response(cut_address)
-
     def query(self, command, cut_address=False):
         # TODO error-check command
         #  * check against a list of possible valid commands?
@@ -66,14 +64,12 @@ class ADAMModule(object):
         adam_interface  = self.interface
 
         # run query
-        adam_interface.cmd(
+        return adam_interface.request(cut_address,
                 delimiter   = "$",
                 address     = self.address,
                 options     = command,
                 )
 
-        return adam_interface.response(cut_address)
-
     def firmware_version(self):
         return self.query("F", True)[0]
 
@@ -98,14 +94,12 @@ class ADAMModule(object):
         type_code   = kwargs["type_code"]
         extra       = kwargs["extra"]
 
-        adam_interface.cmd(
+        return adam_interface.request(True,
                 delimiter   = "%",
                 address     = self.address,
                 options     = new + type_code + baud + extra,
                 )
 
-        return adam_interface.response(True)
-
 def convert_float2data(float_value):
     t           = type(float_value)
     valid_types = [
@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 
 # standard modules
-import sys, re, time, logging
+import sys, re, time, logging, threading
 
 # installed modules
 from eserial import OldEnhancedSerial
 
+from telemetry import trace, metrics
+
 # local modules
 import util
 
+log = logging.getLogger(__name__)
+
 adam_interface = None
 
 def get_adam_interface(dev=None, baud=None, timeout=0.01):
@@ -32,6 +36,9 @@ class ADAMInterface(object):
                 }
 
         self.serial = eserial
+        # the modules share one bus; a command and its response must not
+        # interleave with another slot's
+        self.lock = threading.RLock()
 
     def debug(self, debug=False):
         self.dbg = debug
@@ -40,9 +47,9 @@ class ADAMInterface(object):
         response    = self.response(False)
         if response != '':
             address, data = response
-            logging.debug (address + " " + data)
+            log.debug("%s %s", address, data)
         else:
-            logging.debug ("No response!")
+            log.debug("No response!")
 
     ## Send a command to the ADAM module
     # @method 
@@ -52,33 +59,43 @@ class ADAMInterface(object):
         delimiter   = kwargs['delimiter']
 
         if not util.isDelimiter(delimiter):
-            logging.debug("'{0}' is not a proper delimiter character. " \
-                    "Please use only \ one of the following characters: $%#@"
-                    .format(delimiter))
+            log.debug("'%s' is not a proper delimiter character. "
+                    "Please use only one of the following characters: $%%#@",
+                    delimiter)
             return None
 
         address     = kwargs['address']
 
         if not util.isAddress(address) and not address == "**":
-            logging.debug("{0} must be a two-digit hexadecimal value.".format(
-                address))
+            log.debug("%s must be a two-digit hexadecimal value.", address)
             return None
 
         options     = kwargs.get('options', "")
         data        = kwargs.get('data', "")
 
         command = delimiter + address + options + data
-        logging.debug(command)
+        log.debug("%s", command)
         self.current["command"] = command
 
-        # clear input buffer of junk
-        serial.flushInput()
+        with trace.span("cmd", "adam", command=command), self.lock:
+            start = time.time()
+
+            # clear input buffer of junk
+            serial.flushInput()
 
-        # send command
-        serial.write(command + "\r")
+            # send command
+            serial.write(command + "\r")
 
-        # read input buffer for response:
-        test, data  = serial.read_until("\r")
+            # read input buffer for response:
+            test, data  = serial.read_until("\r")
+
+            # time the RS-485 bus was held, for bus utilisation
+            busy = time.time() - start
+        port = getattr(serial, "port", None)
+        metrics.registry.histogram("adam_command_seconds",
+                port=port).observe(busy)
+        metrics.registry.counter("adam_bus_busy_seconds_total",
+                port=port).inc(busy)
 
         # wait a little...
 
@@ -96,6 +113,14 @@ class ADAMInterface(object):
 
         return delimiter, data
 
+    ## Send a command, as cmd(), and return its response, as response(),
+    #  without another thread's command getting in between.
+    #
+    def request(self, cut_address=True, **kwargs):
+        with self.lock:
+            self.cmd(**kwargs)
+            return self.response(cut_address)
+
     def response(self, cut_address=True):
         # for some reason, not all commands return an address so we have to give
         # modules the option of cutting the address out and moving it to the
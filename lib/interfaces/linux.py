@@ -15,27 +15,26 @@ class LinuxTerminalInterface(SerialInterface):
         SerialInterface.__init__(self, *args, **kwargs)
         self.prompt = prompt
 
-    def login(self, user = "root", password = "emac_inc"):
+    def login(self, user = "root", password = "emac_inc", token = None):
         serial  = self.serial
 
         # make sure we have the "login" prompt
 
         prompt  = self.__prompt["username"]
-        test, tmp = serial.read_until(prompt, timeout = 120)
-
-        if test:
-            serial.write(user)
-            serial.write("\n")
+        test, tmp = serial.read_until(prompt, timeout = 120,
+                token = token)
 
+        # EnhancedSerial only writes through read_until, so each answer is
+        # sent as the command of the read waiting for the next prompt
         prompt  = self.__prompt["password"]
-        test, tmp = serial.read_until(prompt, timeout = 2)
-
-        if test:
-            serial.write(password)
-            serial.write("\n")
+        test, tmp = serial.read_until(prompt,
+                command = user + "\n" if test else None, timeout = 2,
+                token = token)
 
         prompt  = self.prompt
-        test, tmp = serial.read_until(prompt, timeout = 20)
+        test, tmp = serial.read_until(prompt,
+                command = password + "\n" if test else None, timeout = 20,
+                token = token)
 
         if test:
             return True
@@ -6,6 +6,9 @@ import sys, logging
 from util.locker import (
         locker_all
         )
+from telemetry import trace
+
+log = logging.getLogger(__name__)
 
 @locker_all
 class SerialInterface(object):
@@ -34,28 +37,33 @@ class SerialInterface(object):
     # @param timeout This is the amount of time that the function should wait to
     # see the next prompt; if the timeout is exceeded, then return False to
     # indicate lack of success.
+    # @param token Optional cancellation token checked while waiting for the
+    # prompt; see EnhancedSerial.read_until.
     #
     def cmd(self, 
             command     = "printenv", 
             prompt      = None,
-            timeout     = 50):
+            timeout     = 50,
+            token       = None):
 
         if prompt == None:
             prompt  = self.prompt
 
         serial  = self.serial
 
-        test, self.buf_new = serial.read_until(
-                prompt,
-                command = command + '\n',
-                timeout = timeout
-                )
+        with trace.span("cmd", "serial", command=command):
+            test, self.buf_new = serial.read_until(
+                    prompt,
+                    command = command + '\n',
+                    timeout = timeout,
+                    token   = token,
+                    )
 
         if test:
-            logging.debug("Command Succeeded: {0}".format(command))
+            log.debug("Command Succeeded: %s", command)
             return True, self.buf_new
 
-        logging.debug("Command Failed: {0}".format(command))
+        log.debug("Command Failed: %s", command)
 
         return False, self.buf_new
 
@@ -77,7 +85,7 @@ class SerialInterface(object):
         if test:
             return True
 
-        logging.warning("Abort failed, no prompt found afterward.")
+        log.warning("Abort failed, no prompt found afterward.")
         return False
 
 class SerialInterfaceError(Exception):
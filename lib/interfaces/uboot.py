@@ -4,7 +4,7 @@
 import re, logging, time, os
 
 # installed libraries
-import fdpexpect
+import fdpexpect, pexpect
 
 # local libraries
 from serial import SerialInterface, SerialInterfaceError
@@ -38,7 +38,7 @@ class UBootTerminalInterface(SerialInterface):
         
         return test
 
-    def cmd(self, command, prompt=None, timeout=10):
+    def cmd(self, command, prompt=None, timeout=10, token=None):
         if not prompt:
             prompt = self.prompt
 
@@ -46,6 +46,7 @@ class UBootTerminalInterface(SerialInterface):
                 command = command,
                 prompt  = prompt,
                 timeout = timeout,
+                token   = token,
                 )
         
     ##
@@ -120,8 +121,9 @@ class UBootTerminalInterface(SerialInterface):
     # This function will stop U-Boot from booting during the power-up sequence
     # and verify that a "U-Boot>" prompt is available before returning True.
     # Returns false if no "U-Boot>" prompt is available after hitting "Enter".
+    # An optional cancellation "token" is checked while waiting.
     #
-    def chk(self, timeout=10):
+    def chk(self, timeout=10, token=None):
 
         def debug(result, before, after):
             print("result: " + str(result))
@@ -133,13 +135,17 @@ class UBootTerminalInterface(SerialInterface):
         with self.serial.fdpexpect(self.serial.serial_port,
                 self.serial.baud_rate) as m:
             try:
-                time.sleep(1)
+                if token:
+                    token.sleep(1)
+                else:
+                    time.sleep(1)
                 m.send("\n")
-                result = m.expect(["U-Boot>","Autonegotiation timed out"], timeout)
-            except fdpexpect.TIMEOUT:
+                result = self.serial.expect(m,
+                        ["U-Boot>","Autonegotiation timed out"], timeout, token)
+            except pexpect.TIMEOUT:
                 debug("N/A", m.before, m.after)
                 return False
-            except fdpexpect.EOF:
+            except pexpect.EOF:
                 debug("N/A", m.before, m.after)
                 return False
     
@@ -20,13 +20,8 @@ def acquire_and_release(f, o_type="instance"):
         else:
             condition   = self.cls_condition
 
-        condition.acquire()
-        #print("Condition Lock acquired.")
-        result  = f(self, *args, **kwargs)
-        condition.release()
-        #print("Condition Lock released.")
-
-        return result
+        with condition:
+            return f(self, *args, **kwargs)
 
     return wrapper
 
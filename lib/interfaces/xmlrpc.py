@@ -1,9 +1,20 @@
 #!/usr/bin/env python
 
 # standard libs
-import copy, xmlrpclib, sys, logging
+import copy, xmlrpclib, sys, logging, threading, inspect, importlib
 from functools import wraps
 
+log = logging.getLogger(__name__)
+
+## Port of the test agent, bin/xmlrpcserver.py, on the UUT.
+#
+AGENT_PORT = 8001
+
+## Console line the agent prints once it accepts connections, followed by
+#  " on <address>:<port>".
+#
+READY_MARKER = "XMLRPC agent ready"
+
 ##
 # @brief Check to see if there is an XML RPC client interface available to
 # connect to a remote instance of the interface in question
@@ -42,6 +53,27 @@ def xmlrpc_all(cls):
 
     return cls
 
+##
+# @brief ServerProxy giving every thread its own connection.
+#
+# xmlrpclib.ServerProxy keeps one HTTP connection that cannot be shared by
+# concurrent requests; tests running in parallel on one UUT each get a proxy
+# of their own, created on first use.
+#
+class ThreadLocalServerProxy(xmlrpclib.ServerProxy):
+    def __init__(self, uri, **kwargs):
+        xmlrpclib.ServerProxy.__init__(self, uri, **kwargs)
+        self.__uri      = uri
+        self.__kwargs   = kwargs
+        self.__local    = threading.local()
+
+    def _ServerProxy__request(self, methodname, params):
+        proxy   = getattr(self.__local, "proxy", None)
+        if proxy is None:
+            proxy   = xmlrpclib.ServerProxy(self.__uri, **self.__kwargs)
+            self.__local.proxy  = proxy
+        return getattr(proxy, methodname)(*params)
+
 @xmlrpc_all
 class ServerInterface(object):
     def __init__(self, instance_name=None, xmlrpc_client=None, kwargs={}):
@@ -62,15 +94,22 @@ class ServerInterface(object):
             return True
 
 ## Provide an interface to tests using a XMLRPC Server
+#
+#  The interfaces are the classes of "interface_list", or the classes of the
+#  module named "module", imported when the first instance is created so that
+#  the server answers as soon as it listens.
+#
 class EMACXMLRPCInterface(object):
-    def __init__(self, interface_list=None):
+    def __init__(self, interface_list=None, module=None):
         self.interfaces = dict()
         self.instances  = dict()
+        self.module     = module
+        self.lock       = threading.Lock()
 
-        if interface_list == None:
+        if interface_list == None and module == None:
             raise ValueError("Must pass a list of tests!")
 
-        self.__create_interface_dict(interface_list)
+        self.__create_interface_dict(interface_list or [])
 
     def __create_interface_dict(self, interface_list):
         for interface in interface_list:
@@ -78,16 +117,29 @@ class EMACXMLRPCInterface(object):
 
     def __add_interface(self, interface):
         name = interface.__name__
-        logging.debug(name)
+        log.debug("%s", name)
         if not self.interfaces.has_key(name):
             self.interfaces[name] = interface
 
+    def __load_module(self):
+        with self.lock:
+            if self.module == None:
+                return
+            module = importlib.import_module(self.module)
+            for name, obj in inspect.getmembers(module, inspect.isclass):
+                if not name.startswith("_"):
+                    self.__add_interface(obj)
+            self.module = None
+
     def create_instance(self, instance_name, interface_name, kwargs):
         if self.instances.has_key(instance_name):
             return False
+        if not self.interfaces.has_key(interface_name):
+            self.__load_module()
         self.instances[instance_name] = self.interfaces[interface_name](kwargs)
 
     def get_interfaces(self):
+        self.__load_module()
         return self.interfaces.keys()
 
     def get_instances(self):
@@ -96,7 +148,7 @@ class EMACXMLRPCInterface(object):
     def call_method(self, instance_name, method_name, kwargs):
         instance    = self.instances[instance_name]
 
-        logging.debug("Call method: {0} from: {1}".format(method_name, instance_name))
+        log.debug("Call method: %s from: %s", method_name, instance_name)
         method      = getattr(instance, method_name)
         result      = method(kwargs=kwargs)
 
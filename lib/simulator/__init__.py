@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package simulator
+#
+#  Hardware-free stand-ins for a test rack, so the platform can be driven
+#  end to end and load-tested on a single Linux machine:
+#
+#   - SimulatedTarget: a UUT serial console on a pty, emulating U-Boot
+#     (printenv, setenv, run boot-test) and a Linux login and shell, which
+#     starts a local XML-RPC server when told to run bin/xmlrpcserver.py.
+#   - ADAMBus: ADAM 4050/4051/4068/4024/4017P modules answering on a pty.
+#   - SimulatedRPCServer: the real EMACXMLRPCInterface serving stub devices.
+#   - SimulatedRack: N targets with their power relays on one ADAM bus.
+#
+#  Response times come from a Latency object, so the simulated hardware can
+#  be as slow as the real thing or as fast as possible.
+#
+
+from simulator.device import PtyDevice, Latency
+from simulator.target import SimulatedTarget, DEFAULT_LATENCY
+from simulator.adam import (
+        ADAMBus,
+        SimulatedModule,
+        SimulatedADAM_4017P,
+        SimulatedADAM_4024,
+        SimulatedADAM_4050,
+        SimulatedADAM_4051,
+        SimulatedADAM_4068,
+        )
+from simulator.rpc import SimulatedRPCServer, StubDevice, get_stub_devices
+from simulator.rack import SimulatedRack
+
+__all__ = [
+        PtyDevice,
+        Latency,
+
+        SimulatedTarget,
+        DEFAULT_LATENCY,
+
+        ADAMBus,
+        SimulatedModule,
+        SimulatedADAM_4017P,
+        SimulatedADAM_4024,
+        SimulatedADAM_4050,
+        SimulatedADAM_4051,
+        SimulatedADAM_4068,
+
+        SimulatedRPCServer,
+        StubDevice,
+        get_stub_devices,
+
+        SimulatedRack,
+        ]
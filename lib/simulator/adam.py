@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package adam
+#
+#  ADAM-4000 modules answering on a simulated RS-485 bus. Commands are ASCII
+#  lines ended by a carriage return: a delimiter ($ # %), the two digit hex
+#  address of the module and the command. Modules without the addressed
+#  module stay silent, as on a real bus.
+#
+#  Responses follow what interfaces.adam parses. In particular the analog
+#  input read "#AAN" answers with the module address before the value,
+#  since ADAMAnalogModule strips two characters from it.
+#
+
+import re
+
+from simulator.device import PtyDevice, Latency
+
+## Default response times, in seconds.
+#
+DEFAULT_LATENCY = {
+        # module processing time before it starts to answer
+        "turnaround": 0.002,
+        }
+
+class SimulatedModule(object):
+
+    name = None
+    firmware = "A1.00"
+
+    ## @param address Two digit hex address.
+    #
+    def __init__(self, address="01"):
+        self.address = address.upper()
+        self.type_code = "00"
+        self.baud_code = "06"
+        self.data_format = "00"
+
+    ## Return the response to "command" (without the delimiter, address and
+    #  carriage return), or None for no response.
+    #
+    def handle(self, delimiter, command):
+        if delimiter == "$" and command == "M":
+            return "!" + self.address + self.name
+        if delimiter == "$" and command == "F":
+            return "!" + self.address + self.firmware
+        if delimiter == "$" and command == "2":
+            return "!{0}{1}{2}{3}".format(self.address, self.type_code,
+                    self.baud_code, self.data_format)
+        if delimiter == "%" and len(command) == 8:
+            self.address = command[0:2].upper()
+            self.type_code = command[2:4]
+            self.baud_code = command[4:6]
+            self.data_format = command[6:8]
+            return "!" + self.address
+        return self.handle_io(delimiter, command)
+
+    def handle_io(self, delimiter, command):
+        return "?" + self.address
+
+## Module with digital outputs and/or inputs; bit n of "outputs" and
+#  "inputs" is channel n.
+#
+class SimulatedDigitalModule(SimulatedModule):
+
+    digital_outs = 0
+    digital_ins = 0
+
+    def __init__(self, address="01"):
+        SimulatedModule.__init__(self, address)
+        self.outputs = 0
+        self.inputs = 0
+        ## Called with the module and its new outputs whenever they are set.
+        self.on_output = None
+
+    def set_inputs(self, inputs):
+        self.inputs = inputs
+
+    def get_status(self):
+        if self.digital_outs and self.digital_ins:
+            return "{0:02X}{1:02X}".format(self.outputs, self.inputs)
+        if self.digital_outs:
+            return "{0:02X}00".format(self.outputs)
+        return "{0:04X}".format(self.inputs)
+
+    def handle_io(self, delimiter, command):
+        if delimiter == "$" and command == "6":
+            return "!" + self.get_status() + "00"
+        if delimiter == "#" and self.digital_outs and len(command) == 4:
+            mask = (1 << self.digital_outs) - 1
+            value = int(command[2:4], 16)
+            if command[0:2] == "00":
+                outputs = value & mask
+            elif command[0] == "1":
+                bit = 1 << int(command[1], 16)
+                outputs = self.outputs | bit if value else self.outputs & ~bit
+            else:
+                return "?" + self.address
+            self.outputs = outputs
+            if self.on_output:
+                self.on_output(self, outputs)
+            return ">"
+        return SimulatedModule.handle_io(self, delimiter, command)
+
+class SimulatedADAM_4050(SimulatedDigitalModule):
+    name = "4050"
+    digital_outs = 8
+    digital_ins = 7
+
+class SimulatedADAM_4051(SimulatedDigitalModule):
+    name = "4051"
+    digital_ins = 16
+
+class SimulatedADAM_4068(SimulatedDigitalModule):
+    name = "4068"
+    digital_outs = 8
+
+def _format_analog(value):
+    return "{0:+07.3f}".format(value)
+
+class SimulatedADAM_4024(SimulatedModule):
+    name = "4024"
+    analog_outs = 4
+
+    def __init__(self, address="01"):
+        SimulatedModule.__init__(self, address)
+        self.analog_outputs = [0.0] * self.analog_outs
+        self.output_types = ["30"] * self.analog_outs
+        self.inputs = 0
+
+    def handle_io(self, delimiter, command):
+        match = re.match(r"7C(\d)R(\w\w)$", command)
+        if delimiter == "$" and match:
+            self.output_types[int(match.group(1))] = match.group(2)
+            return "!" + self.address
+        match = re.match(r"6C(\d)$", command)
+        if delimiter == "$" and match:
+            return "!" + self.address + _format_analog(
+                    self.analog_outputs[int(match.group(1))])
+        if delimiter == "$" and command == "I":
+            return "!{0}{1:X}".format(self.address, self.inputs)
+        match = re.match(r"C(\d)([+-]\d\d\.\d\d\d)$", command)
+        if delimiter == "#" and match:
+            channel = int(match.group(1))
+            if channel >= self.analog_outs:
+                return "?" + self.address
+            self.analog_outputs[channel] = float(match.group(2))
+            return ">"
+        return SimulatedModule.handle_io(self, delimiter, command)
+
+class SimulatedADAM_4017P(SimulatedModule):
+    name = "4017P"
+    analog_ins = 8
+
+    def __init__(self, address="01"):
+        SimulatedModule.__init__(self, address)
+        self.analog_inputs = [0.0] * self.analog_ins
+
+    def set_analog_input(self, channel, value):
+        self.analog_inputs[channel] = value
+
+    def handle_io(self, delimiter, command):
+        if delimiter == "#" and re.match(r"\d$", command):
+            channel = int(command)
+            if channel < self.analog_ins:
+                return ">" + self.address + _format_analog(
+                        self.analog_inputs[channel])
+        return SimulatedModule.handle_io(self, delimiter, command)
+
+## RS-485 bus of ADAM modules on one pty.
+#
+#  Every exchange takes the module's turnaround time plus the time the
+#  command and the response take on the wire at "baud", so the simulated bus
+#  saturates like the real one.
+#
+class ADAMBus(PtyDevice):
+
+    def __init__(self, modules=(), baud=9600, latency=None, name="adam"):
+        if latency is None:
+            latency = Latency(defaults=DEFAULT_LATENCY)
+        PtyDevice.__init__(self, name, "\r", latency)
+        self.baud = baud
+        self.modules = list(modules)
+        self.exchanges = 0
+
+    def add_module(self, module):
+        self.modules.append(module)
+        return module
+
+    def get_module(self, address):
+        address = address.upper()
+        for module in self.modules:
+            if module.address == address:
+                return module
+        return None
+
+    ## Time "characters" take on the wire: start, 8 data and stop bits each.
+    #
+    def get_wire_time(self, characters):
+        return characters * 10.0 / self.baud * self.latency.scale
+
+    def handle_line(self, line):
+        self.exchanges += 1
+        wire_time = self.get_wire_time(len(line) + 1)
+        if len(line) < 3 or not line[0] in "$#%":
+            self.delay(wire_time)
+            return
+        module = self.get_module(line[1:3])
+        response = None
+        if module:
+            response = module.handle(line[0], line[3:])
+        if response is None:
+            self.delay(wire_time)
+            return
+        self.delay(wire_time + self.latency.get("turnaround") +
+                self.get_wire_time(len(response) + 1))
+        self.write(response + "\r")
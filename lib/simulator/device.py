@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package device
+#
+#  Base class of the simulated serial devices: a pty pair whose slave end is
+#  opened by the platform like a real serial port while a thread answers on
+#  the master end.
+#
+
+import os, tty, errno, fcntl, select, threading, random, logging
+
+## Response times of a simulated device, in seconds, by name.
+#
+#  @param scale Multiplies every delay; 0 makes the device answer at once.
+#  @param jitter Spreads every delay uniformly by this fraction either way.
+#  @param defaults Delays used for names not given in "delays".
+#
+class Latency(object):
+
+    def __init__(self, scale=1.0, jitter=0.0, defaults=None, **delays):
+        self.scale = scale
+        self.jitter = jitter
+        self.delays = dict(defaults or {})
+        self.delays.update(delays)
+
+    def get(self, name):
+        delay = self.delays.get(name, 0.0) * self.scale
+        if self.jitter and delay:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+class PtyDevice(object):
+
+    ## @param name Used to name the device's thread.
+    #  @param terminator Character ending a line of input.
+    #  @param latency Latency of the device's responses.
+    #
+    def __init__(self, name, terminator="\n", latency=None):
+        self.name = name
+        self.terminator = terminator
+        self.latency = latency or Latency()
+
+        self.master, self.slave = os.openpty()
+        # The slave end stays open so that the port keeps working between
+        # the platform's opens and closes of it.
+        tty.setraw(self.slave)
+        flags = fcntl.fcntl(self.master, fcntl.F_GETFL)
+        fcntl.fcntl(self.master, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self.path = os.ttyname(self.slave)
+
+        self.buffer = ""
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run,
+                name="Simulator-{0}".format(name))
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    ## Write "data" to the port. Output nobody reads is dropped once the pty
+    #  buffer is full, as it would be on a real line.
+    #
+    def write(self, data):
+        while data:
+            try:
+                written = os.write(self.master, data)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    logging.debug("{0}: output dropped".format(self.name))
+                    return
+                raise
+            data = data[written:]
+
+    ## Wait "seconds", returning early if the device is stopped.
+    #
+    def delay(self, seconds):
+        if seconds > 0:
+            self.stopped.wait(seconds)
+
+    ## Called with every line received, without its terminator.
+    #
+    def handle_line(self, line):
+        raise NotImplementedError()
+
+    ## Called with every chunk of input as it arrives; returns the part to
+    #  be split into lines.
+    #
+    def handle_data(self, data):
+        return data
+
+    ## Called every "poll_interval" seconds while no input arrives.
+    #
+    def idle(self):
+        pass
+
+    poll_interval = 0.1
+
+    def __run(self):
+        while not self.stopped.is_set():
+            readable, writable, exceptional = select.select([self.master],
+                    [], [], self.poll_interval)
+            if not readable:
+                self.idle()
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EIO):
+                    continue
+                raise
+
+            self.buffer += self.handle_data(data)
+            while self.terminator in self.buffer:
+                line, self.buffer = self.buffer.split(self.terminator, 1)
+                try:
+                    self.handle_line(line.strip("\r\n"))
+                except Exception:
+                    logging.exception("{0}: error handling {1!r}".format(
+                        self.name, line))
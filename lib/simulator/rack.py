@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package rack
+#
+#  A test rack of simulated slots: one SimulatedTarget per slot, each powered
+#  through relay 0 of its own ADAM-4068 on a shared ADAM bus. The
+#  get_adam_config() and get_slot_control() dictionaries take the place of
+#  the "adam" entry of a platform's config.yaml and the "control" entry of
+#  its slots.
+#
+
+from simulator.device import Latency
+from simulator.target import SimulatedTarget, DEFAULT_LATENCY
+from simulator.adam import ADAMBus, SimulatedADAM_4068
+
+## Relay of a slot's ADAM-4068 switching the target's power.
+#
+POWER_PIN = 0
+
+class SimulatedRack(object):
+
+    ## @param slots Number of slots.
+    #  @param latency Latency of the targets; see DEFAULT_LATENCY.
+    #  @param network Targets get the addresses <network>1, <network>2...
+    #  @param target_args Further SimulatedTarget arguments.
+    #
+    def __init__(self, slots=1, latency=None, baud=9600, network="127.0.1.",
+            **target_args):
+        if latency is None:
+            latency = Latency(defaults=DEFAULT_LATENCY)
+        self.baud = baud
+        self.bus = ADAMBus(baud=baud, latency=Latency(scale=latency.scale))
+        self.targets = list()
+        for i in range(slots):
+            target = SimulatedTarget("slot{0}".format(i),
+                    "{0}{1}".format(network, i + 1), latency, powered=False,
+                    **target_args)
+            relay = self.bus.add_module(SimulatedADAM_4068(
+                self.get_adam_address(i)))
+            relay.on_output = self.__get_power_switch(target)
+            self.targets.append(target)
+
+    @staticmethod
+    def __get_power_switch(target):
+        def switch(module, outputs):
+            target.set_power(bool(outputs & (1 << POWER_PIN)))
+        return switch
+
+    @staticmethod
+    def get_adam_address(slot):
+        return "{0:02X}".format(slot + 1)
+
+    def get_adam_config(self):
+        return {"serial": self.bus.path, "baud": self.baud}
+
+    def get_slot_control(self, slot):
+        return {
+                "com": {"serial": self.targets[slot].path},
+                "adam": {
+                    "address": self.get_adam_address(slot),
+                    "pins": {"power": [POWER_PIN]},
+                    },
+                }
+
+    def start(self):
+        self.bus.start()
+        for target in self.targets:
+            target.start()
+
+    def stop(self):
+        for target in self.targets:
+            target.stop()
+        self.bus.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+        return False
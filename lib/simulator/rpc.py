@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package rpc
+#
+#  The target's XML-RPC server, run locally: the real EMACXMLRPCInterface of
+#  bin/xmlrpcserver.py serving stub devices instead of ft.device.emac_devices.
+#
+
+import threading, time, logging
+from SocketServer import ThreadingMixIn
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from interfaces.xmlrpc import EMACXMLRPCInterface
+
+## Names of the device classes bin/xmlrpcserver.py serves.
+#
+DEVICE_NAMES = (
+        "BinaryCall",
+        "Audio",
+        "GPIO",
+        "IndexedAtoD",
+        "PWM",
+        "EMACSerial",
+        )
+
+## Result of stub methods without an entry in "results": a successful
+#  BinaryCall.call, (exit status, output).
+#
+DEFAULT_RESULT = (0, "")
+
+## Device answering every public method call with a canned result after
+#  "latency" seconds.
+#
+class StubDevice(object):
+
+    latency = 0.0
+    results = {}
+
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+        self.calls = list()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def method(kwargs=None):
+            self.calls.append((name, kwargs))
+            if self.latency:
+                time.sleep(self.latency)
+            return self.results.get(name, DEFAULT_RESULT)
+        return method
+
+## Return stub classes named after "names".
+#
+#  @param latency Time every method call takes.
+#  @param results Dictionary of {method name: result}, shared by all stubs.
+#
+def get_stub_devices(names=DEVICE_NAMES, latency=0.0, results=None):
+    return [type(name, (StubDevice,), {
+        "latency": latency,
+        "results": dict(results or {}),
+        }) for name in names]
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ("/RPC2",)
+
+    def log_message(self, format, *args):
+        logging.debug("xmlrpc: " + format % args)
+
+class _ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+class SimulatedRPCServer(object):
+
+    ## @param address (host, port) to serve on.
+    #  @param devices Device classes to serve; stubs of DEVICE_NAMES by
+    #  default.
+    #
+    def __init__(self, address, devices=None):
+        if devices is None:
+            devices = get_stub_devices()
+        self.server = _ThreadedXMLRPCServer(address,
+                requestHandler=_RequestHandler, allow_none=True,
+                logRequests=False)
+        self.address = self.server.server_address
+        self.interface = EMACXMLRPCInterface(interface_list=devices)
+        self.server.register_instance(self.interface)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                name="SimulatedRPCServer-{0}:{1}".format(*self.address))
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
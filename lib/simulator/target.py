@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package target
+#
+#  Serial console of a simulated UUT. After power-on the target sits at the
+#  U-Boot prompt; "run boot-test" boots it to a root shell, or to a login
+#  prompt when "login" is set. In the shell, "bin/xmlrpcserver.py -p <port>
+#  <address>" starts a SimulatedRPCServer on that address, so every target
+#  needs an address of its own; any 127.x.y.z address works on Linux. With
+#  "agent" set, the target starts it on AGENT_PORT at boot instead, as
+#  scripts/autotest_init.sh does.
+#
+
+import re, shlex, socket, time, logging
+
+from simulator.device import PtyDevice, Latency
+from simulator.rpc import SimulatedRPCServer
+from interfaces.xmlrpc import AGENT_PORT, READY_MARKER
+
+## Default response times, in seconds.
+#
+DEFAULT_LATENCY = {
+        # power-on until U-Boot answers
+        "power_on": 0.5,
+        # any U-Boot or shell command
+        "command": 0.01,
+        "printenv": 0.05,
+        # "run boot-test" until the shell or login prompt
+        "boot": 5.0,
+        # password accepted until the shell prompt
+        "login": 0.2,
+        # period at which an unanswered login prompt is printed again
+        "login_banner": 1.0,
+        }
+
+DEFAULT_ENV = {
+        "baudrate": "115200",
+        "bootdelay": "3",
+        "ethaddr": "00:00:00:00:00:00",
+        "netmask": "255.0.0.0",
+        "serverip": "127.0.0.1",
+        "gatewayip": "127.0.0.1",
+        "boot-test": "run nfsargs addip; bootm",
+        }
+
+class SimulatedTarget(PtyDevice):
+
+    class State:
+        OFF         = 0
+        UBOOT       = 1
+        LOGIN       = 2
+        PASSWORD    = 3
+        SHELL       = 4
+
+    ## @param ip_address Value of the "ipaddr" U-Boot variable.
+    #  @param latency Latency using DEFAULT_LATENCY for missing names.
+    #  @param login Boot to a login prompt rather than straight to a shell.
+    #  @param echo Echo received lines, as a real console does.
+    #  @param powered Start powered on; otherwise wait for set_power().
+    #  @param rpc_devices Device classes served by the target's XML-RPC
+    #  server; see SimulatedRPCServer.
+    #  @param agent Start the XML-RPC server at boot.
+    #
+    def __init__(self, name="target", ip_address="127.0.0.1", latency=None,
+            uboot_prompt="U-Boot> ", shell_prompt="sh-3.2# ", login=False,
+            user="root", password="emac_inc", echo=True, powered=True,
+            rpc_devices=None, agent=False):
+        if latency is None:
+            latency = Latency(defaults=DEFAULT_LATENCY)
+        PtyDevice.__init__(self, name, "\n", latency)
+
+        self.ip_address = ip_address
+        self.uboot_prompt = uboot_prompt
+        self.shell_prompt = shell_prompt
+        self.login = login
+        self.user = user
+        self.password = password
+        self.echo = echo
+        self.rpc_devices = rpc_devices
+        self.agent = agent
+
+        self.env = dict(DEFAULT_ENV)
+        self.env["ipaddr"] = ip_address
+        self.rpc_servers = dict()
+        self.boots = 0
+
+        ## Output of background jobs, written after the prompt of the
+        #  command that started them.
+        #
+        self.background_output = ""
+
+        ## Shell commands, as (regex, handler) pairs; the handler of the first
+        #  regex found in a command line is called with the target, the line
+        #  and the match, and returns the command's output.
+        #
+        self.commands = [
+                (r"xmlrpcserver\.py", SimulatedTarget.__start_rpc_server),
+                ]
+
+        self.state = SimulatedTarget.State.OFF
+        self.ready = 0
+        self.banner = 0
+        if powered:
+            self.set_power(True)
+
+    def stop(self):
+        self.set_power(False)
+        PtyDevice.stop(self)
+
+    ## Switch the target's power; called by the rack when the slot's relay
+    #  changes.
+    #
+    def set_power(self, on):
+        if on and self.state == SimulatedTarget.State.OFF:
+            self.boots += 1
+            self.ready = time.time() + self.latency.get("power_on")
+            self.state = SimulatedTarget.State.UBOOT
+            self.write("\r\nU-Boot (simulated {0})\r\n\r\n{1}".format(
+                self.name, self.uboot_prompt))
+        elif not on and not self.state == SimulatedTarget.State.OFF:
+            self.state = SimulatedTarget.State.OFF
+            for server in self.rpc_servers.values():
+                server.stop()
+            self.rpc_servers.clear()
+
+    def is_powered(self):
+        return not self.state == SimulatedTarget.State.OFF
+
+    def handle_data(self, data):
+        # Ctrl-C drops the line being typed
+        if "\x03" in data and self.state in (SimulatedTarget.State.UBOOT,
+                SimulatedTarget.State.SHELL):
+            self.buffer = ""
+            data = data[data.rindex("\x03") + 1:]
+            self.write("^C\r\n" + self.__get_prompt())
+        return data
+
+    def idle(self):
+        if (self.state == SimulatedTarget.State.LOGIN and
+                time.time() - self.banner > self.latency.get("login_banner")):
+            self.__write_login_prompt()
+
+    def handle_line(self, line):
+        state = self.state
+        if state == SimulatedTarget.State.OFF:
+            return
+        if self.echo and not state == SimulatedTarget.State.PASSWORD:
+            self.write(line + "\r\n")
+
+        if state == SimulatedTarget.State.UBOOT:
+            # input sent while U-Boot starts is answered once it is up
+            self.delay(self.ready - time.time())
+            self.__uboot(line)
+        elif state == SimulatedTarget.State.LOGIN:
+            self.__user = line
+            self.write("Password: ")
+            self.state = SimulatedTarget.State.PASSWORD
+        elif state == SimulatedTarget.State.PASSWORD:
+            self.__password(line)
+        elif state == SimulatedTarget.State.SHELL:
+            self.__shell(line)
+
+    def __get_prompt(self):
+        if self.state == SimulatedTarget.State.UBOOT:
+            return self.uboot_prompt
+        return self.shell_prompt
+
+    def __respond(self, output, latency="command"):
+        self.delay(self.latency.get(latency))
+        if self.state == SimulatedTarget.State.OFF:
+            return
+        self.write(output + self.__get_prompt())
+
+    def __uboot(self, line):
+        words = line.split()
+        if not words:
+            self.__respond("")
+        elif words[0] == "printenv":
+            if len(words) == 1:
+                output = "".join("{0}={1}\r\n".format(key, value)
+                        for key, value in sorted(self.env.items()))
+                output += "\r\nEnvironment size: {0}/131068 bytes\r\n".format(
+                        len(output))
+            elif self.env.has_key(words[1]):
+                output = "{0}={1}\r\n".format(words[1], self.env[words[1]])
+            else:
+                output = "## Error: \"{0}\" not defined\r\n".format(words[1])
+            self.__respond(output, "printenv")
+        elif words[0] == "setenv" and len(words) > 1:
+            value = line.split(None, 2)[2] if len(words) > 2 else None
+            if value is None:
+                self.env.pop(words[1], None)
+            else:
+                self.env[words[1]] = value
+            self.__respond("")
+        elif words[0] == "saveenv":
+            self.__respond("Saving Environment to NAND...\r\n")
+        elif words[0] == "reset":
+            self.set_power(False)
+            self.set_power(True)
+        elif words[0] in ("boot", "bootm") or (words[0] == "run" and
+                len(words) > 1 and words[1].startswith("boot")):
+            self.__boot()
+        elif words[0] == "run" and len(words) > 1:
+            if self.env.has_key(words[1]):
+                self.__respond("")
+            else:
+                self.__respond("## Error: \"{0}\" not defined\r\n".format(
+                    words[1]))
+        else:
+            self.__respond("Unknown command '{0}' - try 'help'\r\n".format(
+                words[0]))
+
+    def __boot(self):
+        self.write("## Booting kernel from Legacy Image ...\r\n"
+                "Starting kernel ...\r\n\r\n")
+        self.delay(self.latency.get("boot"))
+        if self.state == SimulatedTarget.State.OFF:
+            return
+        if self.login:
+            self.state = SimulatedTarget.State.LOGIN
+            self.__write_login_prompt()
+        else:
+            self.state = SimulatedTarget.State.SHELL
+            self.write(self.shell_prompt)
+        if self.agent:
+            self.write(self.__start_agent(self.ip_address, AGENT_PORT))
+
+    def __write_login_prompt(self):
+        self.banner = time.time()
+        self.write("\r\n{0} login: ".format(self.name))
+
+    def __password(self, line):
+        self.write("\r\n")
+        if self.__user == self.user and line == self.password:
+            self.state = SimulatedTarget.State.SHELL
+            self.__respond("", "login")
+        else:
+            self.delay(self.latency.get("login"))
+            self.write("Login incorrect\r\n")
+            self.state = SimulatedTarget.State.LOGIN
+            self.__write_login_prompt()
+
+    def __shell(self, line):
+        command = line.strip()
+        if command in ("exit", "logout") and self.login:
+            self.state = SimulatedTarget.State.LOGIN
+            self.__write_login_prompt()
+            return
+        if command == "reboot":
+            self.set_power(False)
+            self.set_power(True)
+            return
+
+        output = ""
+        for regex, handler in self.commands:
+            match = re.search(regex, command)
+            if match:
+                output = handler(self, command, match) or ""
+                break
+        if command.endswith("&"):
+            output = "[1] {0}\r\n".format(1000 + self.boots) + output
+        self.__respond(output)
+        if self.background_output:
+            self.write(self.background_output)
+            self.background_output = ""
+
+    ## Start the XML-RPC server for "bin/xmlrpcserver.py [-p port]
+    #  [address]".
+    #
+    def __start_rpc_server(self, command, match):
+        port = AGENT_PORT
+        address = self.ip_address
+        args = shlex.split(command[match.end():].rstrip("&"))
+        while args:
+            arg = args.pop(0)
+            if arg in ("-p", "--port") and args:
+                port = int(args.pop(0))
+            elif not arg.startswith("-"):
+                address = arg
+        output = self.__start_agent(address, port)
+        if command.endswith("&"):
+            self.background_output += output
+            return ""
+        return output
+
+    ## Start a SimulatedRPCServer and return what the agent prints.
+    #
+    def __start_agent(self, address, port):
+        if self.rpc_servers.has_key((address, port)):
+            return "socket.error: [Errno 98] Address already in use\r\n"
+        try:
+            server = SimulatedRPCServer((address, port), self.rpc_devices)
+        except socket.error as e:
+            logging.warning("{0}: {1}".format(self.name, e))
+            return "socket.error: {0}\r\n".format(e)
+        server.start()
+        self.rpc_servers[(address, port)] = server
+        return "{0} on {1}:{2}\r\n".format(READY_MARKER, address, port)
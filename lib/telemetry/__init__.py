@@ -0,0 +1,9 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package telemetry
+#
+#  Timing and throughput instrumentation, and the lazy import helpers, shared
+#  by the platform (ft) and the standalone interface packages; it does not
+#  depend on either of them.
+#
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package imports
+#
+#  Lazy imports, so that every entry point only loads what it uses: a UI
+#  client does not load the platform, the server does not load GTK and the
+#  target's xmlrpcserver.py loads neither sqlalchemy nor GitPython.
+#
+#  LazyModule stands for a module until one of its attributes is used:
+#
+#    platform = LazyModule("ft.platform")
+#
+#  and lazy_package() turns the attributes a package __init__ used to import
+#  eagerly into ones imported on first access:
+#
+#    lazy_package(__name__, {
+#            "test": "ft.test",
+#            "Base": "ft.orm:Base",
+#            })
+#
+#  Imports go through importlib, so they hold the interpreter's import lock
+#  and concurrent first uses are safe.
+#
+
+import sys, types, importlib
+
+## Module imported on first attribute access.
+#
+class LazyModule(types.ModuleType):
+
+    def __init__(self, name):
+        types.ModuleType.__init__(self, name)
+        self.__dict__["_LazyModule__module"] = None
+
+    def __load(self):
+        module = self.__dict__["_LazyModule__module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_LazyModule__module"] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self.__load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.__load(), name, value)
+
+    def __repr__(self):
+        return "<lazy module '{0}'>".format(self.__name__)
+
+## Stand-in for a package whose listed attributes are imported on first
+#  access; see lazy_package().
+#
+class LazyPackage(types.ModuleType):
+
+    def __init__(self, package, attributes):
+        types.ModuleType.__init__(self, package.__name__)
+        self.__dict__.update(package.__dict__)
+        # functions of the package keep using its globals, which Python 2
+        # clears once the module is collected
+        self.__dict__["_LazyPackage__package"] = package
+        self.__dict__["_LazyPackage__attributes"] = attributes
+
+    def __getattr__(self, name):
+        attributes = self.__dict__["_LazyPackage__attributes"]
+        if not attributes.has_key(name):
+            raise AttributeError("'{0}' package has no attribute '{1}'"
+                    .format(self.__name__, name))
+        module_name, separator, attribute = attributes[name].partition(":")
+        value = importlib.import_module(module_name)
+        if attribute:
+            value = getattr(value, attribute)
+        self.__dict__[name] = value
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) |
+                set(self.__dict__["_LazyPackage__attributes"]))
+
+## Make the package named "name" import its "attributes" on first access.
+#
+#  Call it at the end of the package's __init__.py.
+#
+#  @param attributes {attribute: "module"} for a module, or
+#  {attribute: "module:name"} for a name defined in a module.
+#
+def lazy_package(name, attributes):
+    package = LazyPackage(sys.modules[name], attributes)
+    package.__all__ = sorted(attributes)
+    sys.modules[name] = package
+    return package
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package logs
+#
+#  Asynchronous logging. setup() replaces the root logger's handlers with a
+#  QueueHandler, which only puts each record on a queue, and starts a
+#  QueueListener thread that formats the records and writes them to a
+#  size-rotated file. Threads that log never format a message or touch the
+#  disk, so code logs with the message arguments separate:
+#
+#    log = logging.getLogger(__name__)
+#    log.debug("Command %s waited %.3fs", name, wait)
+#
+#  and a disabled level costs one comparison. Loggers are named after their
+#  module, so levels can be set per subsystem ("interfaces.adam=INFO").
+#
+#  The queue is bounded; when the writer falls that far behind, records are
+#  dropped rather than blocking the caller, and the writer logs how many.
+#
+
+import logging, logging.handlers, threading, collections, atexit, sys
+
+DEFAULT_FORMAT = ("%(asctime)s %(threadName)-5s %(levelname)-5s "
+        "%(module)-5s %(funcName)-5s %(message)s")
+DEFAULT_DATEFMT = "%Y%m%d %H:%M:%S"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_CAPACITY = 100000
+
+_exception_formatter = logging.Formatter()
+
+## Handler putting records on a queue for a QueueListener.
+#
+#  The message is not formatted here: the record keeps "msg" and "args", so
+#  arguments must not be modified after they are logged. Exception
+#  information is rendered right away, since the traceback would otherwise
+#  keep every frame alive until the record is written.
+#
+class QueueHandler(logging.Handler):
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        logging.Handler.__init__(self)
+        self.capacity = capacity
+        self.queue = collections.deque()
+        self.condition = threading.Condition(threading.Lock())
+        self.dropped = 0
+
+    def emit(self, record):
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(
+                    record.exc_info)
+            record.exc_info = None
+        with self.condition:
+            if len(self.queue) >= self.capacity:
+                self.dropped += 1
+                return
+            self.queue.append(record)
+            self.condition.notify()
+
+    ## Return the queued records, waiting up to "timeout" seconds for one,
+    #  and the number of records dropped since the last call.
+    #
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.queue:
+                self.condition.wait(timeout)
+            records = list(self.queue)
+            self.queue.clear()
+            dropped, self.dropped = self.dropped, 0
+        return records, dropped
+
+    # records are handed over as they are; see emit()
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+## Thread writing the records of a QueueHandler to "handlers".
+#
+class QueueListener(object):
+
+    def __init__(self, queue_handler, *handlers):
+        self.queue_handler = queue_handler
+        self.handlers = handlers
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.__run,
+                name="LogWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    ## Write the records queued so far and stop.
+    #
+    def stop(self):
+        if self.thread is None:
+            return
+        # None marks the end of the queue, whatever its capacity
+        with self.queue_handler.condition:
+            self.queue_handler.queue.append(None)
+            self.queue_handler.condition.notify()
+        self.thread.join()
+        self.thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def __run(self):
+        running = True
+        while running:
+            records, dropped = self.queue_handler.get()
+            if dropped:
+                records.append(logging.makeLogRecord({
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "threadName": self.thread.name,
+                    "funcName": "",
+                    "msg": "Dropped %d log records",
+                    "args": (dropped,),
+                    }))
+            for record in records:
+                if record is None:
+                    running = False
+                else:
+                    self.handle(record)
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+
+_listener = None
+
+## Parse "LEVEL" or "SUBSYSTEM=LEVEL" strings into a {logger name: level}
+#  dictionary, where the root logger is "".
+#
+def parse_levels(specs):
+    levels = dict()
+    for spec in specs:
+        if "=" in spec:
+            name, level = spec.split("=", 1)
+        else:
+            name, level = "", spec
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError("Unknown log level '{0}'".format(level))
+        levels[name.strip()] = value
+    return levels
+
+## Send all logging through a background writer to "file_name".
+#
+#  @param levels {logger name: level}; the "" entry sets the root level,
+#  DEBUG by default.
+#  @param max_bytes The file is rotated once it reaches this size; 0 never
+#  rotates it.
+#  @param backup_count Number of rotated files kept.
+#  @param capacity Records queued before further ones are dropped.
+#
+#  @return The QueueListener, stopped on exit or by shutdown().
+#
+def setup(file_name, levels=None, max_bytes=DEFAULT_MAX_BYTES,
+        backup_count=DEFAULT_BACKUP_COUNT, fmt=DEFAULT_FORMAT,
+        datefmt=DEFAULT_DATEFMT, capacity=DEFAULT_CAPACITY):
+    global _listener
+    shutdown()
+
+    if file_name is None:
+        writer = logging.StreamHandler(sys.stderr)
+    else:
+        writer = logging.handlers.RotatingFileHandler(file_name, "a",
+                max_bytes, backup_count)
+    writer.setFormatter(logging.Formatter(fmt, datefmt))
+
+    # the format decides which record attributes are worth collecting
+    if not "%(process" in fmt:
+        logging.logProcesses = False
+
+    queue_handler = QueueHandler(capacity)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    levels = dict(levels or {})
+    root.setLevel(levels.pop("", logging.DEBUG))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(queue_handler, writer)
+    _listener.start()
+    return _listener
+
+## Write out the queued records and detach the background writer.
+#
+def shutdown():
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(listener.queue_handler)
+    for handler in listener.handlers:
+        handler.close()
+
+atexit.register(shutdown)
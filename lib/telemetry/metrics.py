@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package metrics
+#
+#  Live counters, gauges and histograms. Instrumented code asks the global
+#  registry for a metric by name and labels and updates it:
+#
+#    metrics.registry.counter("ft_events_total", event="TestFinish").inc()
+#    with metrics.timer("ft_uut_stage_seconds", stage="uboot_prep"):
+#        ...
+#
+#  Histograms keep HDR-style log-linear buckets: every power of two is split
+#  into SUB_BUCKETS equal buckets, so a percentile is accurate to a few per
+#  cent whatever the range of the values and memory grows only with the
+#  number of distinct magnitudes observed.
+#
+#  The registry renders as Prometheus-style text, served on a local HTTP
+#  endpoint by MetricsServer, or as a plain dictionary returned by the
+#  platform's get_metrics command.
+#
+
+import threading, time, math, weakref, logging
+from functools import wraps
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+SUB_BUCKETS = 32
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Counter(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+class Gauge(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def get(self):
+        return self.value
+
+## Gauge reading its value from a function when the registry is rendered.
+#  The function is held weakly when it is a bound method so that a metric
+#  does not keep its owner alive; it stops reporting once the owner is gone
+#  or while the function returns None.
+#
+class FunctionGauge(object):
+
+    def __init__(self, function):
+        if hasattr(function, "im_self") and function.im_self is not None:
+            self.function = _WeakMethod(function)
+        else:
+            self.function = lambda: function
+
+    def get(self):
+        function = self.function()
+        if function is None:
+            return None
+        try:
+            return function()
+        except Exception:
+            logging.exception("Metric function failed")
+            return None
+
+class _WeakMethod(object):
+
+    def __init__(self, method):
+        self.owner = weakref.ref(method.im_self)
+        self.function = method.im_func
+
+    def __call__(self):
+        owner = self.owner()
+        if owner is None:
+            return None
+        return self.function.__get__(owner, type(owner))
+
+class Histogram(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = dict()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _get_bucket(value):
+        if value <= 0:
+            return None
+        mantissa, exponent = math.frexp(value)
+        return exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+    @staticmethod
+    def _get_upper_bound(bucket):
+        exponent, sub = divmod(bucket, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2.0 * SUB_BUCKETS), exponent)
+
+    def observe(self, value):
+        bucket = self._get_bucket(value)
+        with self.lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    ## Return the value below which "p" (0 to 1) of the observations fall,
+    #  or None if nothing was observed.
+    #
+    def percentile(self, p):
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = max(1, int(math.ceil(p * self.count)))
+            seen = 0
+            # None (zero and negative values) sorts first
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    break
+            if bucket is None:
+                return min(self.max, 0.0)
+            return max(self.min, min(self.max, self._get_upper_bound(bucket)))
+
+    def get(self):
+        summary = {
+                "count": self.count,
+                "sum": self.sum,
+                "min": self.min,
+                "max": self.max,
+                }
+        for q in QUANTILES:
+            summary[_format_quantile(q)] = self.percentile(q)
+        return summary
+
+def _format_quantile(q):
+    return "p{0:g}".format(q * 100)
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(key,
+        str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in items) + "}"
+
+def _format_value(value):
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class Registry(object):
+
+    __types = {
+            Counter: "counter",
+            Gauge: "gauge",
+            FunctionGauge: "gauge",
+            Histogram: "summary",
+            }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.__metrics = dict()
+        self.started = time.time()
+
+    def __get(self, metric_class, name, labels, *args):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.__metrics.get(key)
+            if metric is None:
+                metric = self.__metrics[key] = metric_class(*args)
+            elif not isinstance(metric, metric_class):
+                raise ValueError("Metric {0} is a {1}".format(name,
+                    type(metric).__name__))
+            return metric
+
+    def counter(self, name, **labels):
+        return self.__get(Counter, name, labels)
+
+    def gauge(self, name, **labels):
+        return self.__get(Gauge, name, labels)
+
+    def histogram(self, name, **labels):
+        return self.__get(Histogram, name, labels)
+
+    ## Register "function" as the gauge "name", replacing any earlier one.
+    #
+    def function_gauge(self, name, function, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.__metrics[key] = FunctionGauge(function)
+
+    def clear(self):
+        with self.lock:
+            self.__metrics.clear()
+        self.started = time.time()
+
+    def __get_items(self):
+        with self.lock:
+            return sorted(self.__metrics.items(), key=lambda item: item[0])
+
+    ## Return {name: [(labels, value)]}, where the value of a histogram is a
+    #  dictionary of its count, sum, min, max and percentiles.
+    #
+    def snapshot(self):
+        result = {"uptime": time.time() - self.started}
+        for (name, labels), metric in self.__get_items():
+            value = metric.get()
+            if value is None:
+                continue
+            result.setdefault(name, list()).append((dict(labels), value))
+        return result
+
+    ## Return the metrics in Prometheus text exposition format.
+    #
+    def render_text(self):
+        lines = list()
+        typed = set()
+        for (name, labels), metric in self.__get_items():
+            value = metric.get()
+            if value is None:
+                continue
+            if not name in typed:
+                typed.add(name)
+                lines.append("# TYPE {0} {1}".format(name,
+                    self.__types[type(metric)]))
+            if isinstance(metric, Histogram):
+                for q in QUANTILES:
+                    if value["count"]:
+                        lines.append("{0}{1} {2}".format(name,
+                            _format_labels(labels, [("quantile", q)]),
+                            _format_value(value[_format_quantile(q)])))
+                lines.append("{0}_count{1} {2}".format(name,
+                    _format_labels(labels), value["count"]))
+                lines.append("{0}_sum{1} {2}".format(name,
+                    _format_labels(labels), _format_value(value["sum"])))
+            else:
+                lines.append("{0}{1} {2}".format(name, _format_labels(labels),
+                    _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+class _Timer(object):
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.histogram.observe(time.time() - self.start)
+        return False
+
+## Return a context manager observing the duration of the enclosed block in
+#  the histogram "name".
+#
+def timer(name, **labels):
+    return _Timer(registry.histogram(name, **labels))
+
+## Decorator observing the duration of every call in the histogram "name".
+#
+def timed(name, **labels):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if not self.path.split("?")[0] in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render_text()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("metrics: " + format % args)
+
+## Serve "registry" as text on http://<address>/metrics from a daemon thread.
+#
+class MetricsServer(object):
+
+    def __init__(self, address=("127.0.0.1", 0), registry=registry):
+        self.httpd = HTTPServer(address, _MetricsHandler)
+        self.httpd.registry = registry
+        self.address = self.httpd.server_address
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                name="MetricsServer")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
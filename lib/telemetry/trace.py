@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# vim:ts=4:sw=4:softtabstop=4:smarttab:expandtab
+
+## @package trace
+#
+#  Lightweight wall-clock tracing. Code marks a stage with
+#
+#    with trace.span("uboot_prep", "uut", serial=serial_number):
+#        ...
+#
+#  or decorates a function with @traced(). Finished spans go into a ring
+#  buffer owned by the thread that ran them, so recording takes no lock and
+#  a long run keeps only the most recent spans of every thread. Once a thread
+#  has exited its buffer is merged into one shared ring buffer of the same
+#  size, so short-lived command and request threads do not each leave spans
+#  behind. Spans nest; each records its depth on the thread's stack of open
+#  spans.
+#
+#  Tracing is off by default. While it is off span() returns a shared no-op
+#  context manager and traced() calls straight through, so the instrumented
+#  hot paths cost one global lookup. Recorded spans export as Chrome trace
+#  JSON (chrome://tracing, Perfetto) or as a flat CSV.
+#
+
+import threading, time, json, csv, os, collections
+from functools import wraps
+
+DEFAULT_CAPACITY = 4096
+
+enabled = False
+capacity = DEFAULT_CAPACITY
+
+_local = threading.local()
+_buffers = list()
+_buffers_lock = threading.Lock()
+# spans of threads that have exited
+_retired = collections.deque(maxlen=DEFAULT_CAPACITY)
+
+## Start recording spans, keeping at most "buffer_size" per running thread
+#  and "buffer_size" for all exited threads together.
+#
+def enable(buffer_size=DEFAULT_CAPACITY):
+    global enabled, capacity, _retired
+    with _buffers_lock:
+        capacity = buffer_size
+        _retired = collections.deque(_retired, maxlen=buffer_size)
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+## Drop every recorded span.
+#
+def clear():
+    with _buffers_lock:
+        _retire_buffers()
+        _retired.clear()
+        for buf in _buffers:
+            buf.spans.clear()
+
+class _ThreadBuffer(object):
+
+    def __init__(self):
+        thread = threading.current_thread()
+        self.thread = thread
+        self.tid = thread.ident
+        self.thread_name = thread.name
+        self.spans = collections.deque(maxlen=capacity)
+        self.depth = 0
+
+def _get_buffer():
+    buf = getattr(_local, "buffer", None)
+    if buf is None:
+        buf = _local.buffer = _ThreadBuffer()
+        with _buffers_lock:
+            _retire_buffers()
+            _buffers.append(buf)
+    return buf
+
+## Move the spans of exited threads into _retired, keeping the most recent,
+#  and drop their buffers; called with _buffers_lock held.
+#
+def _retire_buffers():
+    global _retired
+    retired = [buf for buf in _buffers if not buf.thread.is_alive()]
+    if not retired:
+        return
+    spans = list(_retired)
+    for buf in retired:
+        _buffers.remove(buf)
+        spans.extend(buf.spans)
+    spans.sort(key=lambda s: s.start)
+    _retired = collections.deque(spans, maxlen=capacity)
+
+## A finished span.
+#
+Span = collections.namedtuple("Span",
+        "name category start duration depth thread tid args")
+
+class _Span(object):
+
+    __slots__ = ("name", "category", "args", "start", "buffer")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.buffer = _get_buffer()
+        self.buffer.depth += 1
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        duration = time.time() - self.start
+        buf = self.buffer
+        buf.depth -= 1
+        buf.spans.append(Span(self.name, self.category, self.start, duration,
+            buf.depth, buf.thread_name, buf.tid, self.args))
+        return False
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+## Return a context manager timing the enclosed block.
+#
+#  @param name Stage name.
+#  @param category Coarse grouping, e.g. "uut", "test", "serial".
+#  @param args Extra values stored with the span.
+#
+def span(name, category="", **args):
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+## Decorator recording a span for every call of the decorated function.
+#
+def traced(name=None, category=""):
+    def decorator(f):
+        span_name = name or f.__name__
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            with _Span(span_name, category, {}):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+## Return every recorded span, oldest first.
+#
+def get_spans():
+    with _buffers_lock:
+        _retire_buffers()
+        spans = list(_retired)
+        spans.extend(s for buf in _buffers for s in list(buf.spans))
+    spans.sort(key=lambda s: s.start)
+    return spans
+
+def _jsonable(value):
+    if isinstance(value, (basestring, int, long, float, bool)) or \
+            value is None:
+        return value
+    return str(value)
+
+## Write the recorded spans as Chrome trace event JSON.
+#
+def export_chrome(f):
+    pid = os.getpid()
+    events = list()
+    threads = dict()
+    for s in get_spans():
+        threads[s.tid] = s.thread
+        events.append({
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": int(s.start * 1e6),
+            "dur": int(s.duration * 1e6),
+            "pid": pid,
+            "tid": s.tid,
+            "args": dict((key, _jsonable(value))
+                for key, value in s.args.items()),
+            })
+    for tid, thread_name in threads.items():
+        events.append({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {"name": thread_name},
+            })
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+## Write the recorded spans as CSV, one row per span.
+#
+def export_csv(f):
+    writer = csv.writer(f)
+    writer.writerow(["start", "duration", "depth", "thread", "category",
+        "name", "args"])
+    for s in get_spans():
+        writer.writerow(["{0:.6f}".format(s.start),
+            "{0:.6f}".format(s.duration), s.depth, s.thread, s.category,
+            s.name, " ".join("{0}={1}".format(key, value)
+                for key, value in sorted(s.args.items()))])
+
+## Export to "file_path", as CSV if it ends in ".csv" and as Chrome trace
+#  JSON otherwise.
+#
+def export(file_path):
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(file_path, "wb") as f:
+        if file_path.endswith(".csv"):
+            export_csv(f)
+        else:
+            export_chrome(f)
@@ -31,7 +31,7 @@ from ui.elements.adapters import (PlatformAdapter, PlatformSlotAdapter,
         UnitUnderTestAdapter, TestAdapter, ActionAdapter)
 from ui.elements.generic import GenericAdapter
 
-from ft.command import RecipientType
+from ft.command import RecipientType, CommandRecord, Mode
 
 class ftw:
     MAX_WIN_WIDTH = 1280
@@ -227,30 +227,33 @@ class FunctionalTestWindow(gtk.Window):
                 product_type = None,
                 name = event.name,
                 )
-        manifest, msg = self.__run_command( ("get_manifest", RecipientType.SLOT,
-            platformslot.address, "", True) )
+        manifest, msg = self.__run_command(
+                CommandRecord("get_manifest",
+                    RecipientType.SLOT, platformslot.address, ""))
         self.slotsmanagermodel.add(platformslot)
         self.slot_setup_page.add_slot(platformslot, ("Product", manifest),
             self.__get_product_version_cb,)
 
     def __get_product_version_cb(self, name, adapter):
         version_list, message = self.__run_command(
-                ("select_product", RecipientType.SLOT, adapter.address, name, True) )
+                CommandRecord("select_product",
+                    RecipientType.SLOT, adapter.address, name))
         return ("Version", version_list), self.__set_product_version_cb
 
     def __set_product_version_cb(self, name, adapter):
         spec_list, message = self.__run_command(
-                ("set_product_version", RecipientType.SLOT, adapter.address, name,
-                    True) )
+                CommandRecord("set_product_version",
+                    RecipientType.SLOT, adapter.address, name))
         return ("Specification", spec_list), self.__set_product_specification_cb
 
     def __set_product_specification_cb(self, name, adapter):
         result = self.__run_command(
-                ("set_product_specification", RecipientType.SLOT,
-                    adapter.address, name, True) )
+                CommandRecord("set_product_specification",
+                    RecipientType.SLOT, adapter.address, name))
         self.__run_command(
-                ("configure", RecipientType.SLOT,
-                    adapter.address, name, False) )
+                CommandRecord("configure",
+                    RecipientType.SLOT, adapter.address, name,
+                    mode=Mode.ASYNC))
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # Platform Callbacks
@@ -264,10 +267,12 @@ class FunctionalTestWindow(gtk.Window):
 
     def __setup_platform_cb(self, handler, event):
         result, msg = self.__run_command(
-                ("is_setup", RecipientType.PLATFORM, None, "", True) )
+                CommandRecord("is_setup",
+                    RecipientType.PLATFORM, None, ""))
         if not result:
             manifest, msg = self.__run_command(
-                    ("get_manifest", RecipientType.PLATFORM, None, "", True) )
+                    CommandRecord("get_manifest",
+                        RecipientType.PLATFORM, None, ""))
             dialog = AbstractSelectionDialog(
                     "Please select the test platform.",
                     "Test Platform Selection",
@@ -280,7 +285,8 @@ class FunctionalTestWindow(gtk.Window):
 
     def __configure_platform_cb(self):
         result, msg = self.__run_command(
-                ("configure", RecipientType.PLATFORM, None, "", False) )
+                CommandRecord("configure",
+                    RecipientType.PLATFORM, None, "", mode=Mode.ASYNC))
 
     def __dialog_response_cb(self, dialog, response_id,
             accept_callback=None):
@@ -296,13 +302,14 @@ class FunctionalTestWindow(gtk.Window):
 
     def __get_platform_versions_cb(self, name, adapter):
         version_list, message = self.__run_command(
-                ("select_platform", RecipientType.PLATFORM, None, name, True) )
+                CommandRecord("select_platform",
+                    RecipientType.PLATFORM, None, name))
         return ("Version", version_list), self.__set_platform_version_cb
 
     def __set_platform_version_cb(self, name, adapter):
         result = self.__run_command(
-                ("set_platform_version", RecipientType.PLATFORM, None, name,
-                    True) )
+                CommandRecord("set_platform_version",
+                    RecipientType.PLATFORM, None, name))
         return None
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
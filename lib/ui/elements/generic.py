@@ -22,6 +22,8 @@ import sys
 
 import gtk, gobject
 
+from ft.command import CommandRecord, Mode
+
 class FunctTreeStore(gtk.TreeStore):
 
     def __init__(self, *args):
@@ -134,14 +136,17 @@ class GenericAdapter(gobject.GObject):
     def _destroy(self, *args, **kwargs):
         self.emit('destroy')
 
+    ## Send a command to the represented Platform object.
+    #
+    #  @param command A (name, data, synchronous) tuple.
+    #
     def run_command(self, command):
-        # The future is commented out.
-        #self.handler.run_command(self.address, self.recipient_type, command)
-
-        # For now, stick to established convention. There will be time in the
-        # future to fix this.
-        return self.handler.run_command( (command[0], self.recipient_type,
-                self.address, command[1], command[2]) )
+        if command[2]:
+            mode = Mode.SYNC
+        else:
+            mode = Mode.ASYNC
+        return self.handler.run_command(CommandRecord(command[0],
+                self.recipient_type, self.address, command[1], mode))
 
     @staticmethod
     def get(address=None): 
@@ -29,6 +29,10 @@ ntpdate 192.168.2.1 0.pool.ntp.org
 # Call python script to choose test environment
 cd /root/pytest
 
+# Start the resident test agent, so that it is ready by the time the platform
+# runs the first test; it restarts itself if it dies
+./bin/xmlrpcserver.py --resident > /dev/console 2>&1 &
+
 # TODO: distinguish between tests that run primarily on the UUT and those that
 # only make xmlrpc calls and automated CLI commands to the UUT
 #python /root/pytest/pytest_setup.py
@@ -41,7 +45,8 @@ hwclock -w
 
 
 #-------------------------------------------------------------------------------
-# Run setup specific to the currently-selected testset
+# Run setup specific to the currently-selected testset; make install-tar
+# packages the deployed metadata's init.sh as current_test/init.sh
 
 if [ -f ./current_test/init.sh ] ;then
 	./current_test/init.sh